@@ -0,0 +1,124 @@
+"""Confronto tra il fetch con un Chromium lanciato per ogni URL e il BrowserPool persistente.
+
+I due effetti sono riportati separatamente: "browser pool" usa lo stesso profilo completo del lancio per URL
+(tutte le risorse, attesa di networkidle) e misura solo il riuso del browser; "pool lean" aggiunge il profilo
+lean di default (risorse pesanti bloccate, attesa di DOMContentLoaded e della stabilità del testo).
+
+Uso:
+    python benchmarks/bench_browser_pool.py url1 url2 ... [--workers 10] [--pool-size 4]
+
+Per ogni modalità riporta la latenza per URL (media, p50, p95) e il picco di RSS del processo
+più i processi figli (Chromium). Il campionamento della RSS dei figli richiede `psutil`;
+in sua assenza viene usato `resource.getrusage` (solo processo corrente).
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright.sync_api import sync_playwright
+
+from browser_pool import BrowserPool, DEFAULT_USER_AGENT, load_html
+
+
+class RssSampler:
+    def __init__(self, interval: float = 0.1):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self.peak_bytes = 0
+
+    def _current_rss(self) -> int:
+        try:
+            import psutil
+            proc = psutil.Process()
+            total = proc.memory_info().rss
+            for child in proc.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        except ImportError:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._current_rss())
+            time.sleep(self._interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+
+LOAD_TIMEOUT = 60
+
+
+def _load(page, url: str) -> int:
+    page.goto(url, wait_until="networkidle", timeout=LOAD_TIMEOUT * 1000)
+    return len(page.inner_html("body"))
+
+
+def fetch_launch_per_url(url: str) -> int:
+    # comportamento precedente: un Chromium per ogni URL
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        try:
+            context = browser.new_context(user_agent=DEFAULT_USER_AGENT, viewport={"width": 1280, "height": 800})
+            return _load(context.new_page(), url)
+        finally:
+            browser.close()
+
+
+def run_mode(name: str, fetch, urls, workers: int) -> None:
+    latencies = []
+
+    def timed(url):
+        start = time.perf_counter()
+        try:
+            fetch(url)
+        except Exception as e:
+            print(f"  [{name}] errore su {url}: {e}")
+        latencies.append(time.perf_counter() - start)
+
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(timed, urls))
+        total = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:>16}: totale {total:.2f}s | per URL media {statistics.mean(latencies):.2f}s "
+          f"p50 {statistics.median(latencies):.2f}s p95 {p95:.2f}s | "
+          f"picco RSS {sampler.peak_bytes / 2 ** 20:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    run_mode("launch per URL", fetch_launch_per_url, args.urls, args.workers)
+    with BrowserPool(size=args.pool_size, lean=False) as pool:
+        run_mode("browser pool", lambda url: pool.run(lambda page: _load(page, url)), args.urls, args.workers)
+    with BrowserPool(size=args.pool_size, lean=True) as pool:
+        run_mode("pool lean", lambda url: pool.run(lambda page: len(load_html(page, url, LOAD_TIMEOUT))),
+                 args.urls, args.workers)
+
+
+if __name__ == "__main__":
+    main()
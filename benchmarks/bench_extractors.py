@@ -0,0 +1,81 @@
+"""Confronto tra gli estrattori di contenuto HTML su un corpus di pagine salvate.
+
+Uso:
+    python benchmarks/bench_extractors.py cartella_html/ [--max-tokens 1000] [--repeat 3]
+
+La cartella contiene pagine salvate (*.html / *.htm), ad esempio con
+`curl -L -o pagina.html URL`. Per ogni estrattore riporta i ms per pagina (media, p50, p95) e la
+somiglianza del testo estratto con quello di readability: precisione, richiamo e F1 sulle parole.
+Con --max-tokens gli estrattori che lo supportano si fermano al budget di caratteri per fonte,
+come in SearchSystem; il confronto di somiglianza avviene sullo stesso prefisso di testo.
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_extraction import LxmlExtractor, ReadabilityExtractor
+
+# stesso budget di SearchSystem: 4 caratteri per token più il margine
+CHAR_BUDGET_MARGIN = 1.5
+
+
+def _words(text: str) -> Counter:
+    return Counter(word.strip(".,;:!?()[]*#\"'").lower() for word in text.split())
+
+
+def similarity(text: str, reference: str) -> tuple:
+    words, reference_words = _words(text), _words(reference)
+    common = sum((words & reference_words).values())
+    precision = common / max(1, sum(words.values()))
+    recall = common / max(1, sum(reference_words.values()))
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus")
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.corpus, "*.htm*")))
+    if not paths:
+        sys.exit(f"Nessuna pagina HTML in {args.corpus}")
+    pages = [open(path, "rb").read() for path in paths]
+    max_chars = int(args.max_tokens * 4 * CHAR_BUDGET_MARGIN) if args.max_tokens else None
+    print(f"{len(pages)} pagine, {sum(len(p) for p in pages) / 2 ** 20:.1f} MiB, budget {max_chars} caratteri")
+
+    baseline = ReadabilityExtractor()
+    references = [baseline.extract(page) for page in pages]
+
+    for extractor in (baseline, LxmlExtractor()):
+        timings = []
+        scores = []
+        for page, reference in zip(pages, references):
+            elapsed = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                text = extractor.extract(page, max_chars)
+                elapsed.append(time.perf_counter() - start)
+            timings.append(min(elapsed) * 1000)
+            # confronto sullo stesso prefisso che arriverebbe a format_sources
+            limit = max_chars or max(len(text), len(reference))
+            scores.append(similarity(text[:limit], reference[:limit]))
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        precision, recall, f1 = (statistics.mean(s[i] for s in scores) for i in range(3))
+        print(f"{extractor.name:>12}: ms/pagina media {statistics.mean(timings):.1f} "
+              f"p50 {statistics.median(timings):.1f} p95 {p95:.1f} | vs readability "
+              f"precisione {precision:.2f} richiamo {recall:.2f} F1 {f1:.2f}")
+
+
+if __name__ == "__main__":
+    main()
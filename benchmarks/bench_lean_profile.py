@@ -0,0 +1,98 @@
+"""Confronto tra il profilo Playwright "lean" (risorse pesanti bloccate, DOMContentLoaded + stabilità
+del contenuto) e il profilo precedente (tutte le risorse, networkidle).
+
+Uso:
+    # 1. registra le pagine in un archivio HAR (profilo completo, così l'archivio contiene tutto)
+    python benchmarks/bench_lean_profile.py url1 url2 ... --record pagine.har
+    # 2. confronta i due profili rigiocando le pagine registrate (nessun accesso alla rete)
+    python benchmarks/bench_lean_profile.py url1 url2 ... --har pagine.har
+
+Senza --har le pagine vengono caricate dal vivo. Per ogni profilo riporta il tempo di caricamento
+(media, p50, p95), il numero di parole estratte con readability + markdownify e gli errori.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright.sync_api import sync_playwright
+
+from browser_pool import DEFAULT_USER_AGENT, block_heavy_resources, load_html
+from search_system import SearchSystem
+
+PAGE_TIMEOUT = 60
+
+
+def record(urls, har_path: str) -> None:
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context(user_agent=DEFAULT_USER_AGENT, record_har_path=har_path)
+        for url in urls:
+            page = context.new_page()
+            try:
+                load_html(page, url, PAGE_TIMEOUT, lean=False)
+            except Exception as e:
+                print(f"  errore su {url}: {e}")
+            finally:
+                page.close()
+        # l'archivio HAR viene scritto alla chiusura del contesto
+        context.close()
+        browser.close()
+    print(f"Pagine registrate in {har_path}")
+
+
+def run_profile(name: str, urls, lean: bool, har_path=None) -> None:
+    latencies = []
+    words = []
+    errors = 0
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for url in urls:
+            # un contesto per pagina: nessuna cache del browser condivisa tra le misure
+            context = browser.new_context(user_agent=DEFAULT_USER_AGENT, viewport={"width": 1280, "height": 800})
+            if har_path:
+                context.route_from_har(har_path, not_found="abort")
+            if lean:
+                block_heavy_resources(context)
+            page = context.new_page()
+            start = time.perf_counter()
+            try:
+                html = load_html(page, url, PAGE_TIMEOUT, lean=lean)
+                latencies.append(time.perf_counter() - start)
+                words.append(len(SearchSystem._html_to_markdown(html).split()))
+            except Exception as e:
+                errors += 1
+                print(f"  [{name}] errore su {url}: {e}")
+            finally:
+                context.close()
+        browser.close()
+
+    if not latencies:
+        print(f"{name:>8}: nessuna pagina caricata ({errors} errori)")
+        return
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:>8}: caricamento media {statistics.mean(latencies):.2f}s p50 {statistics.median(latencies):.2f}s "
+          f"p95 {p95:.2f}s | parole estratte media {statistics.mean(words):.0f} totale {sum(words)} | "
+          f"errori {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--record", metavar="HAR", help="registra le pagine nel file HAR ed esce")
+    parser.add_argument("--har", help="rigioca le pagine dal file HAR invece di caricarle dalla rete")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.urls, args.record)
+        return
+    run_profile("current", args.urls, lean=False, har_path=args.har)
+    run_profile("lean", args.urls, lean=True, har_path=args.har)
+
+
+if __name__ == "__main__":
+    main()
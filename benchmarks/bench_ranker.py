@@ -0,0 +1,67 @@
+"""Microbenchmark del ranking dei risultati: ranking.rank_search_results contro il vecchio ranker pandas/sklearn.
+
+Uso:
+    python benchmarks/bench_ranker.py [--queries 3] [--per-query 8] [--repeat 2000]
+
+Riporta i µs per chiamata, con e senza contenuto completo, per le dimensioni tipiche di un passo di
+ricerca (20-40 righe); il ranker di riferimento richiede pandas e scikit-learn. Riporta anche il tempo
+di import delle due versioni, che pesa sull'avvio a freddo.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranking import rank_search_results
+from tests.test_search_system_ranking import legacy_rank_search_results, make_results
+
+
+def time_call(rank, results, include_raw_content: bool, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rank(results, 4, include_raw_content)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def import_time(statement: str) -> float:
+    # processo nuovo: misura l'import a freddo, non quello già in cache in questo interprete
+    code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+    return float(output.stdout.strip()) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--per-query", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = make_results(args.queries, args.per_query, num_urls=args.per_query * 2, seed=0)
+    print(f"{len(results)} righe, {len({r['url'] for r in results})} URL univoci")
+
+    try:
+        import pandas, sklearn  # noqa: F401
+        rankers = [("pandas/sklearn", legacy_rank_search_results), ("ranking", rank_search_results)]
+    except ImportError:
+        print("pandas o scikit-learn non installati: solo il nuovo ranker")
+        rankers = [("ranking", rank_search_results)]
+
+    for include_raw_content in (False, True):
+        for name, rank in rankers:
+            repeat = args.repeat if name == "ranking" else max(1, args.repeat // 20)
+            print(f"{name:>15} full_content={include_raw_content!s:5}: "
+                  f"{time_call(rank, results, include_raw_content, repeat):9.1f} µs/chiamata")
+
+    print(f"import ranking: {import_time('import ranking'):.0f} ms")
+    if len(rankers) > 1:
+        print(f"import pandas + sklearn: "
+              f"{import_time('import pandas; from sklearn.preprocessing import MinMaxScaler'):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark offline del segnale di pertinenza BM25 nel ranking, su insiemi di risultati registrati.
+
+Uso:
+    python benchmarks/bench_relevance.py cartella_json/ [--top-n 4] [--weights 0,0.15,0.3,0.5]
+
+Per registrare i candidati di ogni passo di ricerca si imposta `ranking_record_dir` nella Configuration:
+ogni file contiene research_query, include_raw_content, i risultati e una lista "relevant", da compilare
+a mano con gli URL pertinenti. Per ogni peso di relevance_weight il benchmark riporta precisione@top-n
+e MRR sui file etichettati, quanti URL del top-n cambiano rispetto al ranking senza pertinenza e i ms
+per chiamata del ranking.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranking import rank_search_results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recordings")
+    parser.add_argument("--top-n", type=int, default=4)
+    parser.add_argument("--weights", default="0,0.15,0.3,0.5")
+    parser.add_argument("--share", type=float, default=0.5, help="relevance_research_query_share")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.recordings, "*.json")))
+    if not paths:
+        sys.exit(f"Nessun file JSON in {args.recordings}")
+    recordings = [json.load(open(path, encoding="utf-8")) for path in paths]
+    labelled = sum(1 for r in recordings if r.get("relevant"))
+    print(f"{len(recordings)} insiemi di risultati, {labelled} con URL pertinenti etichettati")
+
+    def rank(recording, weight):
+        return rank_search_results(recording["results"], args.top_n, recording["include_raw_content"],
+                                   research_query=recording["research_query"], relevance_weight=weight,
+                                   research_query_share=args.share)
+
+    baselines = [[r["url"] for r in rank(recording, 0.0)] for recording in recordings]
+    for weight in (float(w) for w in args.weights.split(",")):
+        precisions, reciprocal_ranks, changed, timings = [], [], [], []
+        for recording, baseline in zip(recordings, baselines):
+            start = time.perf_counter()
+            urls = [r["url"] for r in rank(recording, weight)]
+            timings.append((time.perf_counter() - start) * 1000)
+            changed.append(len(set(urls) - set(baseline)))
+            relevant = set(recording.get("relevant") or [])
+            if relevant:
+                precisions.append(len(relevant.intersection(urls)) / len(urls))
+                reciprocal_ranks.append(next((1 / k for k, url in enumerate(urls, 1) if url in relevant), 0.0))
+
+        quality = (f"P@{args.top_n} {statistics.mean(precisions):.2f} MRR {statistics.mean(reciprocal_ranks):.2f}"
+                   if precisions else "nessuna etichetta")
+        print(f"relevance_weight {weight:4.2f}: {quality} | URL cambiati nel top-{args.top_n} "
+              f"{statistics.mean(changed):.2f} | {statistics.mean(timings):.2f} ms/ranking")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Awaitable, Callable, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+from playwright.async_api import async_playwright, BrowserContext as AsyncBrowserContext, Page as AsyncPage
+from playwright.async_api import Route as AsyncRoute
+from playwright.sync_api import sync_playwright, BrowserContext, Page, Route
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                      "(KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36")
+
+# profilo "lean": risorse non necessarie all'estrazione del testo
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "teads.tv",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "chartbeat.com",
+    "chartbeat.net",
+    "hotjar.com",
+    "facebook.net",
+    "connect.facebook.net",
+    "webads.it",
+    "seedtag.com",
+)
+# controllo di stabilità del contenuto dopo DOMContentLoaded
+STABILITY_POLL_MS = 250
+STABILITY_MAX_WAIT = 3.0
+# caratteri massimi di HTML letti dalla pagina
+BROWSER_MAX_HTML_CHARS = 2_000_000
+
+_BODY_TEXT_LENGTH_JS = "() => document.body ? document.body.innerText.length : 0"
+_BODY_HTML_JS = "(maxChars) => document.body ? document.body.innerHTML.slice(0, maxChars) : ''"
+
+
+def is_blocked_request(resource_type: str, url: str) -> bool:
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlsplit(url).hostname or ""
+    return any(host == domain or host.endswith("." + domain) for domain in TRACKER_DOMAINS)
+
+
+def _route_lean(route: Route) -> None:
+    # fallback (e non continue_) lascia gestire la richiesta alle altre route, es. un replay da HAR
+    if is_blocked_request(route.request.resource_type, route.request.url):
+        route.abort()
+    else:
+        route.fallback()
+
+
+async def _aroute_lean(route: AsyncRoute) -> None:
+    if is_blocked_request(route.request.resource_type, route.request.url):
+        await route.abort()
+    else:
+        await route.fallback()
+
+
+def block_heavy_resources(context: BrowserContext) -> None:
+    """Blocca immagini, media, font e tracker per tutte le pagine del contesto."""
+    context.route("**/*", _route_lean)
+
+
+async def ablock_heavy_resources(context: AsyncBrowserContext) -> None:
+    await context.route("**/*", _aroute_lean)
+
+
+def load_html(page: Page, url: str, timeout: float, lean: bool = True,
+              max_chars: int = BROWSER_MAX_HTML_CHARS) -> str:
+    """Carica `url` e restituisce l'HTML del body (al più `max_chars` caratteri).
+
+    Con il profilo lean si attende DOMContentLoaded e poi che il testo della pagina smetta di crescere,
+    invece di networkidle, che sui siti con molta pubblicità può non arrivare mai.
+    """
+    if not lean:
+        page.goto(url, wait_until="networkidle", timeout=timeout * 1000)
+        return page.inner_html("body")[:max_chars]
+    start = time.monotonic()
+    page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
+    stop = min(time.monotonic() + STABILITY_MAX_WAIT, start + timeout)
+    previous = -1
+    while time.monotonic() < stop:
+        length = page.evaluate(_BODY_TEXT_LENGTH_JS)
+        if length == previous and length > 0:
+            break
+        previous = length
+        page.wait_for_timeout(STABILITY_POLL_MS)
+    return page.evaluate(_BODY_HTML_JS, max_chars)
+
+
+async def aload_html(page: AsyncPage, url: str, timeout: float, lean: bool = True,
+                     max_chars: int = BROWSER_MAX_HTML_CHARS) -> str:
+    """Versione asyncio di `load_html`."""
+    if not lean:
+        await page.goto(url, wait_until="networkidle", timeout=timeout * 1000)
+        return (await page.inner_html("body"))[:max_chars]
+    start = time.monotonic()
+    await page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
+    stop = min(time.monotonic() + STABILITY_MAX_WAIT, start + timeout)
+    previous = -1
+    while time.monotonic() < stop:
+        length = await page.evaluate(_BODY_TEXT_LENGTH_JS)
+        if length == previous and length > 0:
+            break
+        previous = length
+        await page.wait_for_timeout(STABILITY_POLL_MS)
+    return await page.evaluate(_BODY_HTML_JS, max_chars)
+
+
+class BrowserPool:
+    """Pool limitato di browser Chromium persistenti.
+
+    L'API sync di Playwright non è thread-safe: ogni oggetto va usato dal thread che lo ha creato.
+    Per questo il pool avvia (in modo lazy, fino a `size`) thread dedicati, ognuno con il proprio
+    Chromium e il proprio contesto; i task vengono accodati e ricevono una pagina nuova.
+    Il contesto viene riciclato dopo `max_navigations_per_context` navigazioni o dopo un errore.
+    Con `lean` i contesti bloccano immagini, media, font e tracker.
+    """
+
+    def __init__(self, size: int = 4, max_navigations_per_context: int = 50, headless: bool = True,
+                 context_options: Optional[dict] = None, lean: bool = True):
+        self._size = max(1, size)
+        self._lean = lean
+        self._max_navigations = max(1, max_navigations_per_context)
+        self._headless = headless
+        self._context_options = context_options if context_options is not None else {
+            "user_agent": DEFAULT_USER_AGENT,
+            "viewport": {"width": 1280, "height": 800},
+            "java_script_enabled": True,
+        }
+        self._tasks: queue.Queue = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        self._idle_workers = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def run(self, task: Callable[[Page], T], timeout: Optional[float] = None) -> T:
+        """Esegue `task(page)` su una pagina del pool e ne restituisce il risultato (bloccante).
+
+        Allo scadere di `timeout` (attesa in coda compresa) solleva TimeoutError; un task non ancora
+        avviato viene annullato.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BrowserPool is closed")
+            # avvia un nuovo browser solo se nessuno è libero e non si è raggiunto il limite
+            if self._idle_workers == 0 and len(self._workers) < self._size:
+                worker = threading.Thread(target=self._worker_loop,
+                                          name=f"browser-pool-{len(self._workers)}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._tasks.put((task, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Browser task exceeded {timeout:.1f}s")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+            for _ in workers:
+                self._tasks.put(None)
+        for worker in workers:
+            worker.join(timeout=30)
+
+    def _set_idle(self, delta: int) -> None:
+        with self._lock:
+            self._idle_workers += delta
+
+    def _worker_loop(self) -> None:
+        playwright = None
+        browser = None
+        context = None
+        navigations = 0
+        try:
+            while True:
+                self._set_idle(+1)
+                item = self._tasks.get()
+                self._set_idle(-1)
+                if item is None:
+                    break
+                task, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    # avvio lazy: un eventuale errore di avvio viene propagato al chiamante
+                    if playwright is None:
+                        playwright = sync_playwright().start()
+                    if browser is None or not browser.is_connected():
+                        browser = playwright.chromium.launch(headless=self._headless)
+                        context = None
+                    if context is None or navigations >= self._max_navigations:
+                        self._safe_close(context)
+                        context = browser.new_context(**self._context_options)
+                        if self._lean:
+                            block_heavy_resources(context)
+                        navigations = 0
+                    navigations += 1
+                    page = context.new_page()
+                    try:
+                        future.set_result(task(page))
+                    finally:
+                        self._safe_close(page)
+                except Exception as e:
+                    future.set_exception(e)
+                    # dopo un errore (timeout, crash della pagina, target chiuso) il contesto
+                    # non è più affidabile: lo ricicliamo, e il browser se è disconnesso
+                    self._safe_close(context)
+                    context = None
+                    if browser is not None and not browser.is_connected():
+                        browser = None
+        finally:
+            self._safe_close(context)
+            self._safe_close(browser)
+            if playwright is not None:
+                try:
+                    playwright.stop()
+                except Exception as e:
+                    logger.debug(f"Error stopping playwright: {e}")
+
+    @staticmethod
+    def _safe_close(resource) -> None:
+        if resource is None:
+            return
+        try:
+            resource.close()
+        except Exception as e:
+            logger.debug(f"Error closing browser resource: {e}")
+
+
+class AsyncBrowserPool:
+    """Versione asyncio del pool: un solo Chromium e fino a `size` contesti usati in parallelo.
+
+    Con l'API async tutto gira nell'event loop, quindi non servono thread dedicati: ogni slot
+    ha il proprio contesto, riciclato dopo `max_navigations_per_context` navigazioni o dopo un errore.
+    """
+
+    def __init__(self, size: int = 4, max_navigations_per_context: int = 50, headless: bool = True,
+                 context_options: Optional[dict] = None, lean: bool = True):
+        self._size = max(1, size)
+        self._lean = lean
+        self._max_navigations = max(1, max_navigations_per_context)
+        self._headless = headless
+        self._context_options = context_options if context_options is not None else {
+            "user_agent": DEFAULT_USER_AGENT,
+            "viewport": {"width": 1280, "height": 800},
+            "java_script_enabled": True,
+        }
+        self._semaphore = asyncio.Semaphore(self._size)
+        self._start_lock = asyncio.Lock()
+        # ogni slot è [contesto, numero di navigazioni]
+        self._free_slots: List[list] = [[None, 0] for _ in range(self._size)]
+        self._playwright = None
+        self._browser = None
+        self._closed = False
+
+    async def __aenter__(self) -> "AsyncBrowserPool":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    async def _ensure_browser(self):
+        async with self._start_lock:
+            if self._closed:
+                raise RuntimeError("AsyncBrowserPool is closed")
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._browser is None or not self._browser.is_connected():
+                self._browser = await self._playwright.chromium.launch(headless=self._headless)
+            return self._browser
+
+    async def run(self, task: Callable[[AsyncPage], Awaitable[T]]) -> T:
+        """Esegue `await task(page)` su una pagina del pool e ne restituisce il risultato."""
+        async with self._semaphore:
+            slot = self._free_slots.pop()
+            try:
+                browser = await self._ensure_browser()
+                context, navigations = slot
+                if context is None or navigations >= self._max_navigations or not browser.is_connected():
+                    await self._safe_close(context)
+                    context = await browser.new_context(**self._context_options)
+                    if self._lean:
+                        await ablock_heavy_resources(context)
+                    navigations = 0
+                slot[0], slot[1] = context, navigations + 1
+                page = await context.new_page()
+                try:
+                    return await task(page)
+                finally:
+                    await self._safe_close(page)
+            except Exception:
+                # contesto non più affidabile dopo un errore: verrà ricreato al prossimo uso
+                await self._safe_close(slot[0])
+                slot[0], slot[1] = None, 0
+                raise
+            finally:
+                self._free_slots.append(slot)
+
+    async def close(self) -> None:
+        async with self._start_lock:
+            self._closed = True
+            for slot in self._free_slots:
+                await self._safe_close(slot[0])
+                slot[0] = None
+            await self._safe_close(self._browser)
+            self._browser = None
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception as e:
+                    logger.debug(f"Error stopping playwright: {e}")
+                self._playwright = None
+
+    @staticmethod
+    async def _safe_close(resource) -> None:
+        if resource is None:
+            return
+        try:
+            await resource.close()
+        except Exception as e:
+            logger.debug(f"Error closing browser resource: {e}")
@@ -1,14 +1,34 @@
 import os
-from typing import Any, Optional, Literal, List
+from typing import Any, Dict, Optional, Literal, List
 from pydantic import BaseModel, Field
 from langchain_core.runnables import RunnableConfig
 
 
 class Configuration(BaseModel):
-    search_api: Literal["duckduckgo", "google", "tavily",] = Field(
+    search_api: Literal["duckduckgo", "google", "tavily", "multi",] = Field(
         default="duckduckgo",
         title="Search API",
-        description="Web search API to use"
+        description="Web search API to use (multi: query the engines in multi_search_engines and fuse the results)"
+    )
+    tavily_raw_content: bool = Field(
+        default=True,
+        title="Tavily Raw Content",
+        description="Ask Tavily for the page content together with the results, so those pages are not fetched"
+    )
+    multi_search_engines: List[Literal["duckduckgo", "google", "tavily",]] = Field(
+        default=["duckduckgo", "google"],
+        title="Multi Search Engines",
+        description="Engines queried in parallel when search_api is multi, in order of preference"
+    )
+    multi_engine_deadline: float = Field(
+        default=10,
+        title="Multi Engine Deadline",
+        description="Max seconds to wait for each engine in multi mode; late engines are left out of the fusion"
+    )
+    rrf_k: int = Field(
+        default=60,
+        title="RRF Constant",
+        description="Constant k of reciprocal rank fusion, score = sum of 1 / (k + rank) over the engines"
     )
     sites_search_restriction: List[str] = Field(
         default=None,
@@ -35,6 +55,221 @@ class Configuration(BaseModel):
         title="Fetch Full Page",
         description="Include the full page content in the search results"
     )
+    fetch_max_concurrency: int = Field(
+        default=10,
+        title="Fetch Concurrency",
+        description="Max number of pages fetched at the same time"
+    )
+    fetch_max_per_host: int = Field(
+        default=2,
+        title="Fetch Concurrency per Host",
+        description="Max number of pages fetched at the same time from the same host"
+    )
+    fetch_min_host_interval: float = Field(
+        default=0.5,
+        title="Fetch Interval per Host",
+        description="Min seconds between the start of two fetches from the same host"
+    )
+    fetch_respect_robots: bool = Field(
+        default=True,
+        title="Respect Crawl-delay",
+        description="Read robots.txt once per host and honour its Crawl-delay"
+    )
+    http_pool_maxsize: int = Field(
+        default=10,
+        title="HTTP Pool Size",
+        description="Max number of keep-alive connections kept open for each host"
+    )
+    http_host_pool_sizes: Dict[str, int] = Field(
+        default={},
+        title="HTTP Pool Size per Host",
+        description="Per-host override of the keep-alive pool size, e.g. {\"www.inail.it\": 4}"
+    )
+    http2: bool = Field(
+        default=False,
+        title="HTTP/2",
+        description="Use HTTP/2 for the async fetcher (requires the 'h2' package)"
+    )
+    fetch_connect_timeout: float = Field(
+        default=10,
+        title="Fetch Connect Timeout",
+        description="Max seconds to establish the connection to a page host"
+    )
+    fetch_first_byte_timeout: float = Field(
+        default=20,
+        title="Fetch First Byte Timeout",
+        description="Max seconds waiting for the first byte (and between bytes) of a response"
+    )
+    fetch_total_timeout: float = Field(
+        default=45,
+        title="Fetch Total Timeout",
+        description="Max seconds spent fetching a single page, browser fallback included"
+    )
+    fetch_extraction_timeout: float = Field(
+        default=60,
+        title="Extraction Timeout",
+        description="Max seconds spent converting a single page or PDF to markdown"
+    )
+    search_deadline: float = Field(
+        default=120,
+        title="Search Deadline",
+        description="Max seconds for a whole web research step; pages not fetched by then are dropped"
+    )
+    fetch_overprovision_factor: float = Field(
+        default=1.5,
+        title="Fetch Over-provision Factor",
+        description="Ratio of pages fetched in parallel to the number of results still needed"
+    )
+    browser_pool_size: int = Field(
+        default=4,
+        title="Browser Pool Size",
+        description="Max number of persistent headless browsers used to fetch pages"
+    )
+    browser_max_navigations: int = Field(
+        default=50,
+        title="Browser Max Navigations",
+        description="Number of navigations after which a browser context is recycled"
+    )
+    browser_lean_profile: bool = Field(
+        default=True,
+        title="Lean Browser Profile",
+        description="Block images, media, fonts and trackers and wait for DOMContentLoaded plus stable "
+                    "content instead of networkidle"
+    )
+    content_cache_enabled: bool = Field(
+        default=False,
+        title="Content Cache",
+        description="Persist the extracted content of fetched pages and PDFs in an on-disk cache"
+    )
+    content_cache_path: str = Field(
+        default=".cache/content_cache.sqlite",
+        title="Content Cache Path",
+        description="SQLite file of the content cache (can be shared by several processes)"
+    )
+    content_cache_ttl_hours: float = Field(
+        default=24,
+        title="Content Cache TTL",
+        description="Hours after which a cached page is revalidated with ETag/Last-Modified"
+    )
+    content_cache_max_mb: int = Field(
+        default=512,
+        title="Content Cache Size",
+        description="Max size of the content cache in MB (least recently used entries are evicted)"
+    )
+    search_cache_enabled: bool = Field(
+        default=True,
+        title="Search Cache",
+        description="Reuse the results of a search already issued with the same query, engine, sites and depth"
+    )
+    search_cache_persist: bool = Field(
+        default=False,
+        title="Persistent Search Cache",
+        description="Also store the search results on disk, shared by sessions and processes"
+    )
+    search_cache_path: str = Field(
+        default=".cache/search_cache.sqlite",
+        title="Search Cache Path",
+        description="SQLite file of the persistent search cache"
+    )
+    search_cache_ttl_hours: float = Field(
+        default=6,
+        title="Search Cache TTL",
+        description="Hours after which cached search results expire"
+    )
+    search_cache_max_entries: int = Field(
+        default=512,
+        title="Search Cache Size",
+        description="Max number of searches kept in the in-memory cache (least recently used are dropped)"
+    )
+    rate_limit_shared: bool = Field(
+        default=False,
+        title="Shared Rate Limit",
+        description="Share the search engines' rate limits between processes through a SQLite file"
+    )
+    rate_limit_path: str = Field(
+        default=".cache/rate_limits.sqlite",
+        title="Rate Limit Path",
+        description="SQLite file holding the shared rate limit buckets"
+    )
+    negative_cache_enabled: bool = Field(
+        default=True,
+        title="Negative Cache",
+        description="Skip URLs that failed recently and hosts that keep failing"
+    )
+    negative_cache_path: Optional[str] = Field(
+        default=".cache/negative_cache.sqlite",
+        title="Negative Cache Path",
+        description="SQLite file where failed URLs and host circuits are kept across sessions (None: memory only)"
+    )
+    host_failure_threshold: int = Field(
+        default=3,
+        title="Host Failure Threshold",
+        description="Consecutive fetch failures after which a host is skipped for a cooldown period"
+    )
+    host_cooldown_minutes: float = Field(
+        default=10,
+        title="Host Cooldown",
+        description="Minutes a failing host is skipped before being tried again"
+    )
+    relevance_weight: float = Field(
+        default=0.3,
+        title="Relevance Weight",
+        description="Weight of the BM25 text relevance in the ranking score (0 keeps only position, lengths and "
+                    "URL frequency)"
+    )
+    relevance_research_query_share: float = Field(
+        default=0.5,
+        title="Research Query Share",
+        description="Share of the relevance computed against the research question; the rest is against the "
+                    "query that produced each result"
+    )
+    ranking_record_dir: Optional[str] = Field(
+        default=None,
+        title="Ranking Record Directory",
+        description="If set, each ranked candidate set is saved here as JSON for the offline relevance benchmark"
+    )
+    near_duplicate_detection: bool = Field(
+        default=True,
+        title="Near-Duplicate Detection",
+        description="Collapse sources whose text (full content, or snippet without full page fetch) is nearly "
+                    "identical to a source already selected in this session"
+    )
+    near_duplicate_max_distance: int = Field(
+        default=3,
+        title="Near-Duplicate Max Distance",
+        description="Maximum Hamming distance between 64-bit SimHash fingerprints to consider two texts duplicates"
+    )
+    content_extractor: Literal["readability", "lxml"] = Field(
+        default="readability",
+        title="Content Extractor",
+        description="HTML main-content extractor: readability (accurate) or lxml (fast single pass, "
+                    "stops at the per-source character budget)"
+    )
+    html_extraction_workers: int = Field(
+        default=4,
+        title="HTML Extraction Workers",
+        description="Number of processes used to extract the main content of HTML pages"
+    )
+    html_max_kb: int = Field(
+        default=2048,
+        title="HTML Max Size",
+        description="Max size (KB) of the HTML passed to content extraction; larger pages are truncated"
+    )
+    pdf_extraction_workers: int = Field(
+        default=4,
+        title="PDF Extraction Workers",
+        description="Number of processes used to convert PDFs to markdown"
+    )
+    pdf_max_pages: int = Field(
+        default=200,
+        title="PDF Max Pages",
+        description="Max number of pages converted for each PDF"
+    )
+    pdf_max_mb: int = Field(
+        default=50,
+        title="PDF Max Size",
+        description="Max size (MB) downloaded for each PDF; larger files are truncated"
+    )
     max_tokens_per_source: int = Field(
         default=1000,
         title="Max Tokens per Source",
@@ -0,0 +1,159 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit
+
+from utils import canonical_url
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_PAGE_FRAGMENT_RE = re.compile(r"(?:^|&)page=(\d+)")
+
+
+@dataclass
+class CachedContent:
+    url: str
+    content: str
+    tier: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    fresh: bool
+
+    def validators(self) -> dict:
+        # header per la richiesta condizionale di rivalidazione
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ContentCache:
+    """Cache persistente (SQLite) del markdown estratto da pagine e PDF, con chiave l'URL canonico.
+
+    La chiave comprende anche la pagina di partenza dei PDF (frammento #page=N, che canonical_url scarta)
+    e `variant`, che descrive le impostazioni di estrazione (estrattore, budget di caratteri): un testo
+    troncato o estratto in un altro modo non viene riusato con impostazioni diverse.
+    Le voci più vecchie di `ttl_seconds` vengono restituite come non fresche, da rivalidare con
+    ETag/Last-Modified. Oltre `max_bytes` si eliminano le voci usate meno di recente (LRU).
+    SQLite in modalità WAL permette l'uso concorrente da più thread e più processi.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int, variant: str = ""):
+        self._path = path
+        self._variant = variant
+        self._ttl_seconds = ttl_seconds
+        self._max_bytes = max_bytes
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS content_cache (
+                    url TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    tier TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_content_cache_last_access ON content_cache(last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # una connessione per operazione: le connessioni sqlite3 non vanno condivise tra thread
+        return sqlite3.connect(self._path, timeout=30)
+
+    def _key(self, url: str) -> str:
+        key = canonical_url(url)
+        page = _PAGE_FRAGMENT_RE.search(urlsplit(url).fragment)
+        if page is not None:
+            key += f"#page={page.group(1)}"
+        return f"{self._variant} {key}" if self._variant else key
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
+    @property
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def get(self, url: str) -> Optional[CachedContent]:
+        key = self._key(url)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT content, tier, etag, last_modified, fetched_at FROM content_cache "
+                               "WHERE url = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            conn.execute("UPDATE content_cache SET last_access = ? WHERE url = ?", (now, key))
+
+        content, tier, etag, last_modified, fetched_at = row
+        fresh = now - fetched_at < self._ttl_seconds
+        self._count("hits" if fresh else "stale")
+        return CachedContent(url=key, content=content, tier=tier, etag=etag, last_modified=last_modified,
+                             fetched_at=fetched_at, fresh=fresh)
+
+    def mark_revalidated(self, url: str) -> None:
+        # risposta 304: il contenuto in cache è ancora valido per un altro TTL
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE content_cache SET fetched_at = ?, last_access = ? WHERE url = ?",
+                         (now, now, self._key(url)))
+        self._count("revalidated")
+
+    def put(self, url: str, content: str, tier: Optional[str] = None,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        if size > self._max_bytes:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO content_cache "
+                         "(url, content, tier, etag, last_modified, fetched_at, last_access, size) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (self._key(url), content, tier, etag, last_modified, now, now, size))
+        self._count("stores")
+        self._evict()
+
+    def _evict(self) -> None:
+        with closing(self._connect()) as conn:
+            # BEGIN IMMEDIATE: un solo processo alla volta calcola ed esegue l'eviction
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM content_cache").fetchone()[0]
+                evicted = 0
+                if total > self._max_bytes:
+                    # si libera fino al 90% del limite, per non ripetere l'eviction a ogni inserimento
+                    target = int(self._max_bytes * 0.9)
+                    for url, size in conn.execute("SELECT url, size FROM content_cache "
+                                                  "ORDER BY last_access ASC").fetchall():
+                        if total <= target:
+                            break
+                        conn.execute("DELETE FROM content_cache WHERE url = ?", (url,))
+                        total -= size
+                        evicted += 1
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if evicted:
+            self._count("evictions", evicted)
+            logger.debug(f"Content cache: evicted {evicted} entries")
@@ -1,7 +1,9 @@
+import asyncio
 import json
+from typing import Optional
 from typing_extensions import Literal
 
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_core.messages import AnyMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -21,7 +23,7 @@ from prompts import (
 )
 from search_system import SearchSystem
 from sources_formatter import SourcesFormatter
-from utils import strip_thinking_tokens, get_current_date, linkify_sources
+from utils import strip_thinking_tokens, get_current_date, linkify_sources, dedup_url
 
 import logging
 
@@ -33,6 +35,7 @@ class DeepSearcherGraph():
         self._config = config
         self._graph = self._build_graph()
         self._chat_history: list[AnyMessage] = []
+        self._search_system: Optional[SearchSystem] = None
 
     def graph_to_image(self, graph_image_path: str) -> None:
         self._graph.get_graph().draw_mermaid_png(output_file_path=graph_image_path)
@@ -106,29 +109,68 @@ class DeepSearcherGraph():
         queries["search_queries"].extend([q["query"] for q in search_queries])
         return queries
 
-    @staticmethod
-    def _node_web_research(state: DeepSearcherGraphState, config: RunnableConfig):
-        configurable = Configuration.from_runnable_config(config)
+    def _get_search_system(self, configurable: Configuration) -> SearchSystem:
+        # il SearchSystem (e il suo pool di browser) vive per tutta l'esecuzione del grafo
+        if self._search_system is None:
+            self._search_system = SearchSystem(configurable.search_api, configurable)
+        return self._search_system
 
-        prev_web_research_results = sum(state.web_research_results, [])
-        last_num_source = len(prev_web_research_results)
+    async def _aget_search_system(self, configurable: Configuration) -> SearchSystem:
+        # la creazione apre le cache SQLite (contenuti, cache negativa, risultati, rate limit): fuori dall'event loop
+        if self._search_system is None:
+            self._search_system = await asyncio.to_thread(SearchSystem, configurable.search_api, configurable)
+        return self._search_system
 
-        search_sys = SearchSystem(configurable.search_api)
-        results = search_sys.execute_search(state.search_queries,
-                                            configurable.max_filtered_results,
-                                            configurable.max_results_per_query,
-                                            include_raw_content=configurable.fetch_full_page,
-                                            exclude_sources=prev_web_research_results,
-                                            sites=configurable.sites_search_restriction)
+    def _close_search_system(self) -> None:
+        if self._search_system is not None:
+            self._search_system.close()
+            self._search_system = None
+
+    async def _aclose_search_system(self) -> None:
+        if self._search_system is not None:
+            await self._search_system.aclose()
+            self._search_system = None
+
+    @staticmethod
+    def _web_research_update(state: DeepSearcherGraphState, results: list) -> dict:
+        last_num_source = sum(len(loop_results) for loop_results in state.web_research_results)
         for res in results:
             last_num_source += 1
             res['num_source'] = last_num_source
 
         return {
             "research_loop_count": state.research_loop_count + 1,
-            "web_research_results": [results]
+            "web_research_results": [results],
+            # solo le chiavi nuove: il reducer le unisce all'indice degli URL già visti
+            "seen_urls": {dedup_url(res['url']) for res in results}
         }
 
+    def _node_web_research(self, state: DeepSearcherGraphState, config: RunnableConfig):
+        configurable = Configuration.from_runnable_config(config)
+
+        search_sys = self._get_search_system(configurable)
+        results = search_sys.execute_search(state.search_queries,
+                                            configurable.max_filtered_results,
+                                            configurable.max_results_per_query,
+                                            include_raw_content=configurable.fetch_full_page,
+                                            seen_urls=state.seen_urls,
+                                            research_query=state.query,
+                                            sites=configurable.sites_search_restriction)
+        return self._web_research_update(state, results)
+
+    async def _anode_web_research(self, state: DeepSearcherGraphState, config: RunnableConfig):
+        configurable = Configuration.from_runnable_config(config)
+
+        search_sys = await self._aget_search_system(configurable)
+        results = await search_sys.aexecute_search(state.search_queries,
+                                                   configurable.max_filtered_results,
+                                                   configurable.max_results_per_query,
+                                                   include_raw_content=configurable.fetch_full_page,
+                                                   seen_urls=state.seen_urls,
+                                                   research_query=state.query,
+                                                   sites=configurable.sites_search_restriction)
+        return self._web_research_update(state, results)
+
     @staticmethod
     def _node_summarize_sources(state: DeepSearcherGraphState, config: RunnableConfig) -> dict:
         existing_summary = state.running_summary
@@ -266,7 +308,9 @@ class DeepSearcherGraph():
                                    output=DeepSearcherGraphStateOutput)
         graph_builder.add_node("reformulate_question", self._node_reformulate_question)
         graph_builder.add_node("generate_queries", self._node_generate_queries)
-        graph_builder.add_node("web_research", self._node_web_research)
+        # con ainvoke il nodo usa la pipeline asincrona di ricerca e fetch
+        graph_builder.add_node("web_research", RunnableLambda(self._node_web_research,
+                                                              afunc=self._anode_web_research))
         graph_builder.add_node("summarize_sources", self._node_summarize_sources)
         graph_builder.add_node("reflect_on_summary", self._node_reflect_on_summary)
         graph_builder.add_node("finalize_summary", self._node_finalize_summary)
@@ -287,6 +331,18 @@ class DeepSearcherGraph():
 
     def invoke(self, query: str):
         initial_state = DeepSearcherGraphState(chat_history=self._chat_history, query=query)
-        res = self._graph.invoke(initial_state, config=self._config)
+        try:
+            res = self._graph.invoke(initial_state, config=self._config)
+        finally:
+            self._close_search_system()
+        self._chat_history = res['chat_history']
+        return res
+
+    async def ainvoke(self, query: str):
+        initial_state = DeepSearcherGraphState(chat_history=self._chat_history, query=query)
+        try:
+            res = await self._graph.ainvoke(initial_state, config=self._config)
+        finally:
+            await self._aclose_search_system()
         self._chat_history = res['chat_history']
         return res
@@ -22,6 +22,8 @@ class DeepSearcherGraphState:
     query: str = field(default=None)
     search_queries: list = field(default=None)  # Search query
     web_research_results: Annotated[list, operator.add] = field(default_factory=list)
+    # chiavi dedup_url delle fonti già raccolte nell'esecuzione: ogni ciclo aggiunge solo le nuove
+    seen_urls: Annotated[set, operator.or_] = field(default_factory=set)
     research_loop_count: int = field(default=0)  # Research loop count
     chat_history: list[AnyMessage] = field(default_factory=list)
     running_summary: str = field(default=None)  # Final report
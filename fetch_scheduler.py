@@ -0,0 +1,210 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# limite all'attesa imposta da Retry-After o Crawl-delay, oltre il quale prevale la scadenza del fetch
+MAX_HOST_DELAY = 60
+
+
+class FetchTimeout(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"{stage} timeout")
+        self.stage = stage  # "connect", "first_byte", "total", "extraction", "deadline"
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Secondi indicati dall'header Retry-After (numero di secondi o data HTTP)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class _HostState:
+    active: int = 0
+    queued: int = 0
+    next_allowed: float = 0.0
+    crawl_delay: Optional[float] = None
+    robots_checked: bool = False
+    # statistiche
+    fetches: int = 0
+    max_queued: int = 0
+    wait_time: float = 0.0
+    max_wait: float = 0.0
+    async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = field(default_factory=list)
+
+
+class HostScheduler:
+    """Scheduler di cortesia per host: al più `max_per_host` fetch contemporanei verso lo stesso host,
+    distanziati di almeno `min_interval` secondi (o del Crawl-delay di robots.txt, se maggiore).
+
+    Un Retry-After ricevuto dall'host sposta in avanti il prossimo fetch consentito. Lo stato è
+    thread-safe e condiviso tra il percorso sincrono (`slot`) e quello asincrono (`aslot`).
+    `crawl_delay_provider(url)` viene chiamato una volta per host per leggere il Crawl-delay.
+    """
+
+    def __init__(self, max_per_host: int = 2, min_interval: float = 0.5,
+                 crawl_delay_provider: Optional[Callable[[str], Optional[float]]] = None):
+        self._max_per_host = max(1, max_per_host)
+        self._min_interval = max(0.0, min_interval)
+        self._crawl_delay_provider = crawl_delay_provider
+        self._condition = threading.Condition()
+        self._hosts: Dict[str, _HostState] = {}
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlsplit(url).hostname or ""
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState()
+        return state
+
+    def _interval(self, state: _HostState) -> float:
+        return max(self._min_interval, min(state.crawl_delay or 0.0, MAX_HOST_DELAY))
+
+    def _reserve(self, state: _HostState) -> Optional[float]:
+        # 0: slot assegnato; > 0: secondi da attendere per l'intervallo minimo; None: host saturo
+        if state.active >= self._max_per_host:
+            return None
+        now = time.monotonic()
+        if state.next_allowed > now:
+            return state.next_allowed - now
+        state.active += 1
+        state.next_allowed = now + self._interval(state)
+        return 0
+
+    def _claim_robots_check(self, url: str) -> bool:
+        # True solo per il primo fetch verso l'host, che si occupa di leggere il Crawl-delay
+        if self._crawl_delay_provider is None:
+            return False
+        with self._condition:
+            state = self._state(self.host(url))
+            if state.robots_checked:
+                return False
+            state.robots_checked = True
+            return True
+
+    def _load_crawl_delay(self, url: str) -> None:
+        # lettura di robots.txt fuori dal lock; nel frattempo per l'host vale l'intervallo minimo
+        delay = self._crawl_delay_provider(url)
+        if delay:
+            with self._condition:
+                self._state(self.host(url)).crawl_delay = delay
+            logger.debug(f"Crawl-delay {delay}s for host {self.host(url)}")
+
+    def _enqueue(self, state: _HostState) -> float:
+        state.queued += 1
+        state.max_queued = max(state.max_queued, state.queued)
+        return time.monotonic()
+
+    def _granted(self, state: _HostState, queued_since: float) -> None:
+        waited = time.monotonic() - queued_since
+        state.fetches += 1
+        state.wait_time += waited
+        state.max_wait = max(state.max_wait, waited)
+
+    def _release(self, state: _HostState) -> None:
+        with self._condition:
+            state.active -= 1
+            waiters, state.async_waiters = state.async_waiters, []
+            self._condition.notify_all()
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    @contextmanager
+    def slot(self, url: str, deadline: Optional[float] = None):
+        """Attende (bloccando il thread) uno slot per l'host dell'URL.
+
+        Con `deadline` (time.monotonic()) solleva FetchTimeout("deadline") se lo slot non può essere concesso
+        prima della scadenza, così un fetch abbandonato alla scadenza del passo non parte più tardi.
+        """
+        if self._claim_robots_check(url):
+            self._load_crawl_delay(url)
+        with self._condition:
+            state = self._state(self.host(url))
+            queued_since = self._enqueue(state)
+            try:
+                while (wait := self._reserve(state)) != 0:
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or (wait is not None and wait >= remaining):
+                            raise FetchTimeout("deadline")
+                        wait = remaining if wait is None else wait
+                    self._condition.wait(wait)
+            finally:
+                state.queued -= 1
+            self._granted(state, queued_since)
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    @asynccontextmanager
+    async def aslot(self, url: str):
+        """Versione asyncio di `slot`: l'attesa non blocca l'event loop."""
+        if self._claim_robots_check(url):
+            await asyncio.to_thread(self._load_crawl_delay, url)
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            state = self._state(self.host(url))
+            queued_since = self._enqueue(state)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._reserve(state)
+                    if wait == 0:
+                        self._granted(state, queued_since)
+                        break
+                    event = asyncio.Event()
+                    state.async_waiters.append((loop, event))
+                try:
+                    # risvegliato da un rilascio o allo scadere dell'intervallo minimo
+                    await asyncio.wait_for(event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._condition:
+                state.queued -= 1
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    def defer(self, url: str, seconds: float) -> None:
+        """Rinvia i prossimi fetch verso l'host (es. per un Retry-After)."""
+        seconds = min(max(0.0, seconds), MAX_HOST_DELAY)
+        with self._condition:
+            state = self._state(self.host(url))
+            state.next_allowed = max(state.next_allowed, time.monotonic() + seconds)
+        logger.info(f"Host {self.host(url)} asked to retry after {seconds:.0f}s")
+
+    def queue_depth(self, url: str) -> int:
+        with self._condition:
+            state = self._hosts.get(self.host(url))
+            return state.queued if state is not None else 0
+
+    @property
+    def stats(self) -> Dict[str, dict]:
+        """Per host: fetch in corso e in coda, massimo della coda, tempo di attesa totale e massimo."""
+        with self._condition:
+            return {host: {"active": s.active, "queued": s.queued, "max_queued": s.max_queued,
+                           "fetches": s.fetches, "wait_time": round(s.wait_time, 2),
+                           "max_wait": round(s.max_wait, 2), "crawl_delay": s.crawl_delay}
+                    for host, s in self._hosts.items()}
@@ -0,0 +1,275 @@
+import asyncio
+import multiprocessing
+import re
+import signal
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError, wait
+from typing import Dict, List, Optional, Tuple, Union
+
+import lxml.html
+from lxml import etree
+from markdownify import markdownify
+from readability import Document
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HtmlExtractionTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise HtmlExtractionTimeout()
+
+
+def html_to_markdown(html: Union[bytes, str]) -> str:
+    """Estrae il contenuto principale della pagina (readability) e lo converte in markdown."""
+    doc = Document(html)
+    contenuto_html = doc.summary()
+    return markdownify(contenuto_html)
+
+
+class BaseContentExtractor(ABC):
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    def extract(self, html: Union[bytes, str], max_chars: Optional[int] = None) -> str:
+        """Testo (markdown) del contenuto principale; `max_chars` è un limite indicativo, che
+        l'estrattore può usare per fermarsi prima."""
+        pass
+
+
+class ReadabilityExtractor(BaseContentExtractor):
+    """readability-lxml + markdownify: l'estrattore di riferimento, accurato ma lento sulle pagine grandi."""
+
+    def __init__(self):
+        super().__init__(name="readability")
+
+    def extract(self, html: Union[bytes, str], max_chars: Optional[int] = None) -> str:
+        return html_to_markdown(html)
+
+
+# elementi che non contengono mai il testo principale
+_SKIP_TAGS = {"script", "style", "noscript", "template", "nav", "header", "footer", "aside", "form", "iframe",
+              "svg", "canvas", "button", "select", "option", "figure", "menu", "dialog", "head", "title"}
+_HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+_BLOCK_TAGS = {"p", "li", "pre", "blockquote", "dd", "dt", "td", "th", "caption"} | set(_HEADING_TAGS)
+_BOILERPLATE_RE = re.compile(r"cookie|consent|banner|breadcrumb|menu|navbar|sidebar|footer|header|social|share|"
+                             r"newsletter|advert|\bads?\b|promo|related|correlat|comment|popup|modal",
+                             re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+# paragrafi più corti (in parole) e con più testo nei link di così sono considerati navigazione
+_MIN_BLOCK_WORDS = 4
+_MAX_LINK_DENSITY = 0.5
+
+
+class LxmlExtractor(BaseContentExtractor):
+    """Estrattore veloce in un'unica passata sull'albero lxml.
+
+    Salta gli elementi di contorno (script, navigazione, header/footer, banner riconosciuti da id e classi),
+    tiene titoli, paragrafi, elementi di lista e celle con testo sufficiente e poca densità di link,
+    e si ferma appena ha raccolto `max_chars` caratteri.
+    """
+
+    def __init__(self):
+        super().__init__(name="lxml")
+
+    def extract(self, html: Union[bytes, str], max_chars: Optional[int] = None) -> str:
+        if not html:
+            return ""
+        try:
+            root = lxml.html.fromstring(html)
+        except (etree.ParserError, ValueError):
+            return ""
+        blocks: List[str] = []
+        self._walk(root.find("body") if root.find("body") is not None else root, blocks, [0], max_chars)
+        return "\n\n".join(blocks)
+
+    @staticmethod
+    def _is_boilerplate(element) -> bool:
+        if element.tag in _SKIP_TAGS:
+            return True
+        attributes = f"{element.get('id', '')} {element.get('class', '')} {element.get('role', '')}"
+        return attributes.strip() != "" and _BOILERPLATE_RE.search(attributes) is not None
+
+    def _add(self, text: Optional[str], prefix: str, blocks: List[str], size: List[int], is_heading: bool) -> None:
+        text = _SPACES_RE.sub(" ", text or "").strip()
+        if not text or (not is_heading and len(text.split()) < _MIN_BLOCK_WORDS):
+            return
+        blocks.append(prefix + text)
+        size[0] += len(text)
+
+    def _walk(self, element, blocks: List[str], size: List[int], max_chars: Optional[int]) -> bool:
+        """Visita i figli di `element`; restituisce True quando il budget di caratteri è esaurito."""
+        # testo diretto dei contenitori (pagine che non usano <p>)
+        self._add(element.text, "", blocks, size, False)
+        for child in element:
+            if max_chars and size[0] >= max_chars:
+                return True
+            tag = child.tag if isinstance(child.tag, str) else None
+            if tag is not None and not self._is_boilerplate(child):
+                if tag in _BLOCK_TAGS:
+                    text = child.text_content()
+                    links = sum(len(a.text_content()) for a in child.iter("a"))
+                    if tag in _HEADING_TAGS:
+                        self._add(text, "#" * _HEADING_TAGS[tag] + " ", blocks, size, True)
+                    elif not text or links <= _MAX_LINK_DENSITY * len(text):
+                        self._add(text, "- " if tag == "li" else "", blocks, size, False)
+                elif self._walk(child, blocks, size, max_chars):
+                    return True
+            self._add(child.tail, "", blocks, size, False)
+        return bool(max_chars) and size[0] >= max_chars
+
+
+def create_extractor(name: str) -> BaseContentExtractor:
+    if name == "readability":
+        return ReadabilityExtractor()
+    elif name == "lxml":
+        return LxmlExtractor()
+    else:
+        raise ValueError("Invalid extractor name")
+
+
+# un'istanza per estrattore in ogni processo del pool
+_extractors: Dict[str, BaseContentExtractor] = {}
+
+
+def _warm_up(extractor_name: str) -> None:
+    # eseguita in ogni processo all'avvio del pool: import dei moduli e creazione dell'estrattore
+    if extractor_name not in _extractors:
+        _extractors[extractor_name] = create_extractor(extractor_name)
+
+
+def _timed_extract(extractor_name: str, html: Union[bytes, str], timeout: Optional[float],
+                   max_chars: Optional[int]) -> Tuple[str, float]:
+    # eseguita nei processi del pool: restituisce anche il tempo di CPU dell'estrazione, senza l'attesa in coda
+    use_alarm = timeout and hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        start = time.perf_counter()
+        if extractor_name not in _extractors:
+            _extractors[extractor_name] = create_extractor(extractor_name)
+        text = _extractors[extractor_name].extract(html, max_chars)
+        return text, time.perf_counter() - start
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class HtmlExtractionPool:
+    """Pool di processi per l'estrazione HTML -> markdown con l'estrattore `extractor`, che è CPU-bound.
+
+    I thread di fetch consegnano l'HTML grezzo alla coda del pool invece di contendersi il GIL.
+    L'input oltre `max_bytes` viene troncato; `stats` riporta il costo di estrazione per pagina.
+    """
+
+    def __init__(self, max_workers: int = 4, timeout: float = 60, max_bytes: Optional[int] = None,
+                 extractor: str = "readability", max_chars: Optional[int] = None):
+        create_extractor(extractor)  # nome non valido: errore subito, non nel processo del pool
+        self._extractor = extractor
+        self._max_chars = max_chars
+        self._max_workers = max(1, max_workers)
+        self._timeout = timeout
+        self._max_bytes = max_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._warm_up_futures: List[Future] = []
+        self._stats = {"pages": 0, "truncated": 0, "timeouts": 0, "input_bytes": 0,
+                       "total_ms": 0.0, "max_ms": 0.0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._closed:
+                # un fetch abbandonato alla scadenza del passo non deve riavviare il pool
+                raise RuntimeError("HtmlExtractionPool is closed")
+            if self._executor is None:
+                # spawn: il processo padre ha thread attivi (browser, fetch) e il fork non è sicuro
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def warm_up(self) -> None:
+        """Avvia subito un processo del pool, senza attendere: con spawn il processo reimporta il modulo
+        principale e le dipendenze, un avvio a freddo che altrimenti peserebbe sul primo fetch. Gli altri
+        processi partono quando servono, mentre il primo è già al lavoro sulla coda condivisa."""
+        executor = self._get_executor()
+        with self._lock:
+            if not self._warm_up_futures:
+                self._warm_up_futures = [executor.submit(_warm_up, self._extractor)]
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Attende la fine di warm_up (se avviato); False se `timeout` scade prima."""
+        with self._lock:
+            futures = list(self._warm_up_futures)
+        return not wait(futures, timeout=timeout).not_done
+
+    def _submit(self, html: Union[bytes, str]) -> Future:
+        size = len(html)
+        truncated = bool(self._max_bytes) and size > self._max_bytes
+        if truncated:
+            logger.debug(f"HTML truncated from {size} to {self._max_bytes} for extraction")
+            html = html[:self._max_bytes]
+        with self._lock:
+            self._stats["input_bytes"] += min(size, self._max_bytes or size)
+            self._stats["truncated"] += truncated
+        return self._get_executor().submit(_timed_extract, self._extractor, html, self._timeout, self._max_chars)
+
+    def _result_timeout(self) -> Optional[float]:
+        # margine per il trasferimento dei dati da e verso il processo
+        return self._timeout + 5 if self._timeout else None
+
+    def _record(self, elapsed: float) -> None:
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            self._stats["pages"] += 1
+            self._stats["total_ms"] += elapsed_ms
+            self._stats["max_ms"] = max(self._stats["max_ms"], elapsed_ms)
+
+    def _timed_out(self) -> HtmlExtractionTimeout:
+        with self._lock:
+            self._stats["timeouts"] += 1
+        return HtmlExtractionTimeout(f"HTML extraction exceeded {self._timeout}s")
+
+    def extract(self, html: Union[bytes, str]) -> str:
+        future = self._submit(html)
+        try:
+            text, elapsed = future.result(timeout=self._result_timeout())
+        except (TimeoutError, HtmlExtractionTimeout):
+            future.cancel()
+            raise self._timed_out()
+        self._record(elapsed)
+        return text
+
+    async def aextract(self, html: Union[bytes, str]) -> str:
+        future = self._submit(html)
+        try:
+            text, elapsed = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self._result_timeout())
+        except (asyncio.TimeoutError, HtmlExtractionTimeout):
+            future.cancel()
+            raise self._timed_out()
+        self._record(elapsed)
+        return text
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_ms"] = round(stats["total_ms"] / stats["pages"], 1) if stats["pages"] else 0.0
+        stats["total_ms"] = round(stats["total_ms"], 1)
+        stats["max_ms"] = round(stats["max_ms"], 1)
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
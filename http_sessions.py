@@ -0,0 +1,120 @@
+import ssl
+import threading
+from typing import Dict, Optional
+
+import cloudscraper
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from browser_pool import DEFAULT_USER_AGENT
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SSLIgnoreAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        context = ssl.create_default_context()
+        context.check_hostname = False  # ❗️DISATTIVA PRIMA
+        context.verify_mode = ssl.CERT_NONE  # ❗️POI IMPOSTA verify_mode
+        kwargs['ssl_context'] = context
+        return super().init_poolmanager(*args, **kwargs)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class SessionRegistry:
+    """Registro thread-safe delle sessioni HTTP condivise da fetcher e motori di ricerca.
+
+    Le sessioni sono identificate da un nome (es. "fetch", "google", "tavily"), così header e cookie
+    di un client non finiscono nelle richieste di un altro, e vengono create una sola volta: le
+    connessioni restano aperte (keep-alive) e le sessioni TLS vengono riusate tra URL dello stesso host.
+    Ogni host ha un pool di `pool_maxsize` connessioni, modificabile per host con `host_pool_sizes`.
+    HTTP/2 è disponibile solo per i client httpx e richiede il pacchetto opzionale `h2`.
+    """
+
+    def __init__(self, pool_connections: int = 20, pool_maxsize: int = 10,
+                 host_pool_sizes: Optional[Dict[str, int]] = None, http2: bool = False):
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._host_pool_sizes = host_pool_sizes or {}
+        self._http2 = http2 and _http2_available()
+        if http2 and not self._http2:
+            logger.warning("Warning: HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._closed = False
+
+    def __enter__(self) -> "SessionRegistry":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _mount_adapters(self, session: requests.Session) -> None:
+        https_adapter = HTTPAdapter if session.verify else SSLIgnoreAdapter
+        session.mount("https://", https_adapter(pool_connections=self._pool_connections,
+                                                pool_maxsize=self._pool_maxsize))
+        session.mount("http://", HTTPAdapter(pool_connections=self._pool_connections,
+                                             pool_maxsize=self._pool_maxsize))
+        # requests sceglie l'adapter con il prefisso più lungo: un adapter dedicato per gli host configurati
+        for host, size in self._host_pool_sizes.items():
+            session.mount(f"https://{host}/", https_adapter(pool_connections=1, pool_maxsize=size))
+            session.mount(f"http://{host}/", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+
+    def _get_or_create(self, name: str, factory) -> requests.Session:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SessionRegistry is closed")
+            session = self._sessions.get(name)
+            if session is None:
+                session = factory()
+                self._mount_adapters(session)
+                self._sessions[name] = session
+            return session
+
+    def session(self, name: str = "default", verify: bool = True) -> requests.Session:
+        """Sessione condivisa `name`; `verify=False` (solo per il fetch delle pagine) disattiva la verifica TLS."""
+        def create() -> requests.Session:
+            session = requests.Session()
+            session.verify = verify
+            session.headers["User-Agent"] = DEFAULT_USER_AGENT
+            return session
+
+        return self._get_or_create(name, create)
+
+    def scraper(self) -> requests.Session:
+        """Sessione cloudscraper condivisa, per i download protetti da JS-challenge."""
+        def create() -> requests.Session:
+            scraper = cloudscraper.create_scraper()
+            scraper.verify = False
+            return scraper
+
+        return self._get_or_create("cloudscraper", create)
+
+    def async_client(self, **kwargs) -> httpx.AsyncClient:
+        """Nuovo client httpx con la configurazione del registro.
+
+        I client async sono legati all'event loop in cui vengono usati: li possiede e li chiude il chiamante.
+        """
+        return httpx.AsyncClient(verify=False, http2=self._http2, headers={"User-Agent": DEFAULT_USER_AGENT},
+                                 **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as e:
+                logger.debug(f"Error closing HTTP session: {e}")
@@ -1,3 +1,5 @@
+import asyncio
+
 from dotenv import load_dotenv
 
 from deep_searcher_graph import DeepSearcherGraph
@@ -29,7 +31,7 @@ if __name__ == "__main__":
 
     deep_searcher = DeepSearcherGraph(config)
     deep_searcher.graph_to_image("graph.png")
-    r = deep_searcher.invoke("ultime normative europee su intelligenza artificiale")
+    r = asyncio.run(deep_searcher.ainvoke("ultime normative europee su intelligenza artificiale"))
 
     with open(f"sommario_finale.md", "w", encoding="utf-8") as file:
         file.write(r["running_summary"])
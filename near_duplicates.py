@@ -0,0 +1,88 @@
+import functools
+import hashlib
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from relevance import tokenize
+
+FINGERPRINT_BITS = 64
+# sequenze di parole (radici) confrontate: 3 parole distinguono bene testi diversi sullo stesso tema
+SHINGLE_SIZE = 3
+# sotto questo numero di shingle l'impronta è troppo instabile per dire che due testi coincidono
+MIN_SHINGLES = 8
+
+
+def _hash64(shingle: str) -> int:
+    # hash stabile tra processi ed esecuzioni, a differenza di hash()
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+@functools.lru_cache(maxsize=1024)
+def simhash(text: str) -> Optional[int]:
+    """Impronta SimHash a 64 bit del testo: testi quasi uguali hanno impronte a piccola distanza di Hamming.
+
+    Si calcola sugli shingle di SHINGLE_SIZE radici consecutive (vedi relevance.tokenize), pesati per
+    frequenza; None se il testo è troppo corto per un confronto affidabile. In cache, perché lo stesso
+    contenuto viene confrontato sia al fetch sia al ranking.
+    """
+    tokens = tokenize(text)
+    shingles = Counter(" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1))
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in shingles.items():
+        h = _hash64(shingle)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if (h >> bit) & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateIndex:
+    """Indice delle impronte SimHash dei testi già accettati, per trovare i quasi-duplicati in tempo costante.
+
+    L'impronta è divisa in `max_distance` + 1 blocchi: due impronte a distanza <= max_distance hanno
+    almeno un blocco identico (principio dei cassetti), quindi basta confrontare le impronte che
+    condividono un blocco invece di tutte quelle dell'indice.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self._max_distance = max_distance
+        num_blocks = max_distance + 1
+        self._block_bits = -(-FINGERPRINT_BITS // num_blocks)
+        self._num_blocks = num_blocks
+        # (numero del blocco, valore del blocco) -> impronte e chiavi dei testi
+        self._blocks: Dict[Tuple[int, int], List[Tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def _block_keys(self, fingerprint: int) -> List[Tuple[int, int]]:
+        mask = (1 << self._block_bits) - 1
+        return [(n, (fingerprint >> (n * self._block_bits)) & mask) for n in range(self._num_blocks)]
+
+    def find(self, fingerprint: Optional[int], exclude: Optional[str] = None) -> Optional[str]:
+        """Chiave di un testo già indicizzato quasi uguale a `fingerprint`, se c'è, ignorando la chiave `exclude`."""
+        if fingerprint is None:
+            return None
+        with self._lock:
+            for block_key in self._block_keys(fingerprint):
+                for other, key in self._blocks.get(block_key, ()):
+                    if key != exclude and hamming_distance(fingerprint, other) <= self._max_distance:
+                        return key
+        return None
+
+    def add(self, fingerprint: Optional[int], key: str) -> None:
+        if fingerprint is None:
+            return
+        with self._lock:
+            for block_key in self._block_keys(fingerprint):
+                self._blocks.setdefault(block_key, []).append((fingerprint, key))
+            self._size += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._size
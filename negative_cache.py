@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from utils import canonical_url
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# durata (secondi) dell'esclusione di un URL per tipo di errore: brevi, perché molti errori sono transitori
+FAILURE_TTL_SECONDS = {
+    "timeout": 15 * 60,
+    "http_4xx": 60 * 60,
+    "http_5xx": 10 * 60,
+    "challenge": 60 * 60,
+    "extraction": 60 * 60,
+    "error": 10 * 60,
+}
+
+# errori che dipendono dall'host e non dalla singola pagina: alimentano il circuit breaker
+HOST_FAILURE_KINDS = {"timeout", "http_5xx", "challenge", "error"}
+
+
+@dataclass
+class UrlFailure:
+    kind: str
+    expires_at: float
+
+
+@dataclass
+class HostState:
+    failures: int = 0  # errori consecutivi
+    open_until: float = 0.0  # circuito aperto fino a questo istante
+
+
+class NegativeCache:
+    """Cache negativa dei fetch falliti, per URL (con TTL per tipo di errore) e per host (circuit breaker).
+
+    Dopo `host_failure_threshold` errori consecutivi un host viene escluso per `host_cooldown_seconds`;
+    scaduto il cooldown il primo fetch fa da prova: un nuovo errore riapre subito il circuito,
+    un successo lo chiude. Con `path` lo stato viene salvato su SQLite e riletto dalle sessioni successive.
+    """
+
+    def __init__(self, path: Optional[str] = None, host_failure_threshold: int = 3,
+                 host_cooldown_seconds: float = 600):
+        self._path = path
+        self._threshold = max(1, host_failure_threshold)
+        self._cooldown = host_cooldown_seconds
+        self._lock = threading.Lock()
+        self._urls: Dict[str, UrlFailure] = {}
+        self._hosts: Dict[str, HostState] = {}
+        self._stats = {"url_skips": 0, "host_skips": 0, "failures": 0, "circuits_opened": 0}
+        if path is not None:
+            self._load()
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlsplit(url).hostname or ""
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def blocked_reason(self, url: str) -> Optional[str]:
+        """Motivo per cui l'URL non va scaricato ("url:<tipo>" o "host_circuit_open"), None se può esserlo."""
+        now = time.time()
+        with self._lock:
+            failure = self._urls.get(canonical_url(url))
+            if failure is not None and failure.expires_at > now:
+                self._stats["url_skips"] += 1
+                return f"url:{failure.kind}"
+            host = self._hosts.get(self._host(url))
+            if host is not None and host.open_until > now:
+                self._stats["host_skips"] += 1
+                return "host_circuit_open"
+        return None
+
+    def host_failures(self, url: str) -> int:
+        with self._lock:
+            host = self._hosts.get(self._host(url))
+            return host.failures if host is not None else 0
+
+    def record_failure(self, url: str, kind: str) -> None:
+        now = time.time()
+        key = canonical_url(url)
+        host_name = self._host(url)
+        with self._lock:
+            self._stats["failures"] += 1
+            self._urls[key] = UrlFailure(kind, now + FAILURE_TTL_SECONDS.get(kind, FAILURE_TTL_SECONDS["error"]))
+            host = self._hosts.setdefault(host_name, HostState())
+            if kind in HOST_FAILURE_KINDS:
+                host.failures += 1
+                if host.failures >= self._threshold:
+                    host.open_until = now + self._cooldown
+                    self._stats["circuits_opened"] += 1
+                    logger.warning(f"Warning: circuit opened for host {host_name} after "
+                                   f"{host.failures} consecutive failures")
+            url_failure, host_state = self._urls[key], HostState(host.failures, host.open_until)
+        self._persist(key, url_failure, host_name, host_state)
+
+    def record_success(self, url: str) -> None:
+        key = canonical_url(url)
+        host_name = self._host(url)
+        with self._lock:
+            had_url = self._urls.pop(key, None) is not None
+            had_host = self._hosts.pop(host_name, None) is not None
+        if self._path is not None and (had_url or had_host):
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM fetch_failures WHERE key IN (?, ?)", (key, f"host:{host_name}"))
+
+    # region PERSISTENZA ************
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._path, timeout=30)
+
+    def _load(self) -> None:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fetch_failures (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    expires_at REAL NOT NULL
+                )""")
+            conn.execute("DELETE FROM fetch_failures WHERE expires_at <= ?", (now,))
+            rows = conn.execute("SELECT key, kind, failures, expires_at FROM fetch_failures").fetchall()
+        for key, kind, failures, expires_at in rows:
+            if key.startswith("host:"):
+                # expires_at è la scadenza del conteggio; open_until è valorizzato solo se il circuito è aperto
+                open_until = expires_at if failures >= self._threshold else 0.0
+                self._hosts[key[len("host:"):]] = HostState(failures, open_until)
+            else:
+                self._urls[key] = UrlFailure(kind, expires_at)
+
+    def _persist(self, key: str, url_failure: UrlFailure, host_name: str, host: HostState) -> None:
+        if self._path is None:
+            return
+        # il conteggio degli errori dell'host si dimentica dopo un cooldown senza nuovi errori
+        host_expires_at = max(host.open_until, time.time() + self._cooldown)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO fetch_failures (key, kind, failures, expires_at) "
+                         "VALUES (?, ?, 0, ?)", (key, url_failure.kind, url_failure.expires_at))
+            conn.execute("INSERT OR REPLACE INTO fetch_failures (key, kind, failures, expires_at) "
+                         "VALUES (?, NULL, ?, ?)", (f"host:{host_name}", host.failures, host_expires_at))
+    # endregion PERSISTENZA ************
@@ -0,0 +1,147 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError, wait
+from typing import List, Optional, Tuple, Union
+
+import fitz
+import pymupdf4llm
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PdfExtractionTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise PdfExtractionTimeout()
+
+
+def _warm_up() -> None:
+    # eseguita in ogni processo all'avvio del pool: basta il riferimento a questa funzione per importare
+    # nel processo pdf_extraction, con fitz e pymupdf4llm
+    pass
+
+
+def pdf_to_markdown(source: Union[bytes, str], max_pages: Optional[int] = None,
+                    timeout: Optional[float] = None, max_chars: Optional[int] = None,
+                    page_range: Optional[Tuple[int, Optional[int]]] = None) -> str:
+    """Converte in markdown un PDF passato come bytes o come percorso su file (eseguita nei processi del pool).
+
+    La conversione procede pagina per pagina all'interno di `page_range` (indici 0-based, fine esclusa)
+    e si ferma appena il testo raggiunge `max_chars`.
+    """
+    # il timeout viene applicato anche dentro il processo, così un documento lento non occupa il worker
+    use_alarm = timeout and hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        doc = fitz.open(stream=source, filetype="pdf") if isinstance(source, bytes) else fitz.open(source)
+        try:
+            first_page, last_page = page_range or (0, None)
+            first_page = min(max(0, first_page), doc.page_count)
+            last_page = doc.page_count if last_page is None else min(last_page, doc.page_count)
+            if max_pages:
+                last_page = min(last_page, first_page + max_pages)
+
+            parts = []
+            num_chars = 0
+            for page_number in range(first_page, last_page):
+                testo = pymupdf4llm.to_markdown(doc, pages=[page_number])
+                parts.append(testo)
+                num_chars += len(testo)
+                if max_chars and num_chars >= max_chars:
+                    break
+            testo = "".join(parts).strip()
+            return testo if testo else "[Nessun testo estraibile dal PDF]"
+        finally:
+            doc.close()
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class PdfExtractionPool:
+    """Pool di processi limitato per l'estrazione PDF -> markdown, che è CPU-bound.
+
+    Ogni documento ha un timeout, un limite di pagine, un limite di dimensione e un budget di caratteri;
+    i thread di fetch attendono il future invece di serializzarsi su un lock globale.
+    """
+
+    def __init__(self, max_workers: int = 4, timeout: float = 60, max_pages: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        self._max_workers = max(1, max_workers)
+        self._timeout = timeout
+        self._max_pages = max_pages
+        self._max_bytes = max_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._warm_up_futures: List[Future] = []
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._closed:
+                # un fetch abbandonato alla scadenza del passo non deve riavviare il pool
+                raise RuntimeError("PdfExtractionPool is closed")
+            if self._executor is None:
+                # spawn: il processo padre ha thread attivi (browser, fetch) e il fork non è sicuro
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def warm_up(self) -> None:
+        """Avvia subito un processo del pool, senza attendere (vedi HtmlExtractionPool.warm_up)."""
+        executor = self._get_executor()
+        with self._lock:
+            if not self._warm_up_futures:
+                self._warm_up_futures = [executor.submit(_warm_up)]
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Attende la fine di warm_up (se avviato); False se `timeout` scade prima."""
+        with self._lock:
+            futures = list(self._warm_up_futures)
+        return not wait(futures, timeout=timeout).not_done
+
+    def _submit(self, source: Union[bytes, str], max_chars: Optional[int],
+                page_range: Optional[Tuple[int, Optional[int]]]) -> Future:
+        size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+        if self._max_bytes and size > self._max_bytes:
+            raise ValueError(f"PDF too large: {size} bytes (limit {self._max_bytes})")
+        return self._get_executor().submit(pdf_to_markdown, source, self._max_pages, self._timeout,
+                                           max_chars, page_range)
+
+    def _result_timeout(self) -> Optional[float]:
+        # margine per il trasferimento dei dati da e verso il processo
+        return self._timeout + 5 if self._timeout else None
+
+    def extract(self, source: Union[bytes, str], max_chars: Optional[int] = None,
+                page_range: Optional[Tuple[int, Optional[int]]] = None) -> str:
+        future = self._submit(source, max_chars, page_range)
+        try:
+            return future.result(timeout=self._result_timeout())
+        except TimeoutError:
+            future.cancel()
+            raise PdfExtractionTimeout(f"PDF extraction exceeded {self._timeout}s")
+
+    async def aextract(self, source: Union[bytes, str], max_chars: Optional[int] = None,
+                       page_range: Optional[Tuple[int, Optional[int]]] = None) -> str:
+        future = self._submit(source, max_chars, page_range)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self._result_timeout())
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise PdfExtractionTimeout(f"PDF extraction exceeded {self._timeout}s")
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
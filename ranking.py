@@ -0,0 +1,105 @@
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from relevance import BM25Index, tokenize
+from search_engines.search_engine_base import SearchEngResult
+from utils import dedup_url
+
+
+def _min_max_scale(values: Sequence[float]) -> List[float]:
+    # stesse operazioni di sklearn MinMaxScaler (x * scale + min), per avere gli stessi punteggi al bit;
+    # con valori tutti uguali l'intervallo vale 1 e il risultato è 0
+    data_min = min(values)
+    data_range = max(values) - data_min
+    scale = 1 / (data_range if data_range != 0 else 1)
+    offset = 0 - data_min * scale
+    return [value * scale + offset for value in values]
+
+
+def _page_length_score(page_length: float) -> float:
+    # pagine più lunghe hanno più contenuto, ma oltre il 70% della lunghezza massima il punteggio cala
+    return page_length if page_length <= 0.7 else 0.7 - 0.3 * (page_length - 0.7) / 0.3
+
+
+def relevance_scores(results: List[SearchEngResult], include_raw_content: bool,
+                     research_query: Optional[str], research_query_share: float = 0.5) -> List[float]:
+    """Pertinenza BM25 di ogni risultato (titolo, snippet e, con `include_raw_content`, pagina), in [0, 1].
+
+    Combina la pertinenza rispetto alla domanda di ricerca (`research_query`, con peso `research_query_share`)
+    e quella rispetto alla query che ha prodotto il risultato; ciascuna è normalizzata min-max.
+    """
+    documents = [tokenize(f"{r['title']} {r['snippet']} {r['full_content'] if include_raw_content else ''}")
+                 for r in results]
+    index = BM25Index(documents)
+
+    # le query di un passo sono poche: ognuna si tokenizza una volta sola
+    query_terms: Dict[str, List[str]] = {}
+    for r in results:
+        if r['query'] not in query_terms:
+            query_terms[r['query']] = tokenize(r['query'] or "")
+    by_query = _min_max_scale([index.score(i, query_terms[r['query']]) for i, r in enumerate(results)])
+    if not research_query:
+        return by_query
+    by_research_query = _min_max_scale(index.scores(tokenize(research_query)))
+    return [research_query_share * research + (1 - research_query_share) * query
+            for research, query in zip(by_research_query, by_query)]
+
+
+def rank_search_results(results: List[SearchEngResult], top_n: int, include_raw_content: bool,
+                        research_query: Optional[str] = None, relevance_weight: float = 0.0,
+                        research_query_share: float = 0.5) -> List[SearchEngResult]:
+    """Ordina i risultati per punteggio composito e restituisce i primi `top_n` URL univoci.
+
+    Il punteggio combina posizione originale, lunghezza dello snippet (preferibilmente né troppo corto
+    né troppo lungo), frequenza dell'URL tra le query e, con `include_raw_content`, lunghezza della pagina;
+    le grandezze sono normalizzate min-max sull'insieme dei risultati. Con `relevance_weight` > 0 il
+    punteggio è mescolato con la pertinenza BM25 del testo (vedi relevance_scores). Per ogni URL vale
+    la riga con il punteggio più alto; a parità di punteggio quella che compare prima. Gli URL sono
+    confrontati con utils.dedup_url, così le varianti della stessa pagina contano come un solo URL.
+    """
+    if not results:
+        return []
+
+    positions = _min_max_scale([float(r['position']) for r in results])
+    desc_lengths = _min_max_scale([float(len(r['snippet'])) for r in results])
+    # le varianti dello stesso URL (frammento, utm_*, http/https, AMP...) contano come la stessa pagina
+    pages = [dedup_url(r['url']) for r in results]
+    url_counts = Counter(pages)
+    max_freq = max(url_counts.values())
+
+    if include_raw_content:
+        page_lengths = _min_max_scale([float(len(r['full_content'])) for r in results])
+
+    scores = []
+    for i, r in enumerate(results):
+        position_score = 1 - positions[i]
+        # curva a campana con picco a 0.5
+        desc_length_score = 1 - 2 * abs(desc_lengths[i] - 0.5)
+        url_frequency_norm = url_counts[pages[i]] / max_freq
+        if include_raw_content:
+            scores.append(0.4 * position_score +  # La posizione originale è importante
+                          0.2 * _page_length_score(page_lengths[i]) +  # La lunghezza della pagina è abbastanza importante
+                          0.15 * desc_length_score +  # La lunghezza della descrizione è meno importante
+                          0.25 * url_frequency_norm)  # Premiamo i risultati che appaiono in più query
+        else:
+            scores.append(0.5 * position_score +  # La posizione originale diventa più importante
+                          0.2 * desc_length_score +  # La lunghezza della descrizione resta importante
+                          0.3 * url_frequency_norm)  # Premiamo di più i risultati che appaiono in più query
+
+    if relevance_weight > 0:
+        relevance = relevance_scores(results, include_raw_content, research_query, research_query_share)
+        scores = [(1 - relevance_weight) * score + relevance_weight * rel for score, rel in zip(scores, relevance)]
+
+    # ordinamento stabile per punteggio decrescente, poi il primo risultato di ogni pagina
+    ranked: List[SearchEngResult] = []
+    seen_pages = set()
+    for i in sorted(range(len(results)), key=lambda i: -scores[i]):
+        if pages[i] in seen_pages:
+            continue
+        seen_pages.add(pages[i])
+        result = SearchEngResult(**{key: results[i].get(key) for key in SearchEngResult.__annotations__})
+        result['score'] = scores[i]
+        ranked.append(result)
+        if len(ranked) >= top_n:
+            break
+    return ranked
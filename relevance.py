@@ -0,0 +1,96 @@
+import functools
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Sequence
+
+# parametri standard di Okapi BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+ITALIAN_STOPWORDS = frozenset("""
+a ad al all alla alle allo agli ai anche ancora avere aveva avevano ben buono c che chi ci cio ciò come
+con contro cosa così cui d da dal dall dalla dalle dallo dagli dai de degli dei del dell della delle dello
+dentro di dove dopo e è ed era erano essere fa fare fino fra gli ha hanno ho i il in infatti inoltre io l
+la le lei li lo loro lui ma me mentre mi mia mie miei mio molto ne negli nei nel nell nella nelle nello
+noi non nostra nostre nostri nostro o od ogni oppure ora per perché perche però pero piu più po poi
+proprio qua quale quali qualche quando quanto quella quelle quelli quello questa queste questi questo qui
+se sei senza si sia siamo siete sono sopra sotto sta stata state stati stato su sua sue sugli sui sul
+sull sulla sulle sullo suo suoi tra tu tua tue tuo tuoi tutta tutte tutti tutto un una uno uni vi voi
+""".split())
+
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+# suffissi derivazionali e verbali, dal più lungo al più corto (stemmer leggero ispirato a Snowball)
+_SUFFIXES = sorted("""
+amento amenti imento imenti azione azioni zione zioni ione ioni atore atori atrice atrici abile abili
+ibile ibili mente ista iste isti ismo ismi ante anti anza anze enza enze ico ici ica iche ichi oso osa osi
+ose ita ivo ivi iva ive are ere ire ando endo ato ata ati ate uto uta uti ute ito iti ite ano ono
+""".split(), key=len, reverse=True)
+_MIN_STEM = 3
+
+
+def _strip_accents(word: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", word) if unicodedata.category(c) != "Mn")
+
+
+@functools.lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Stemmer italiano leggero: toglie un suffisso derivazionale o verbale, poi la vocale finale.
+
+    Meno preciso di Snowball, ma senza dipendenze; conta solo che le forme flesse della stessa parola
+    (bando/bandi, impresa/imprese, finanziato/finanziamento) diano la stessa radice.
+    """
+    if not word.isascii():
+        word = _strip_accents(word)
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    if len(word) > _MIN_STEM and word[-1] in "aeio":
+        word = word[:-1]
+        # -io/-ia (rischio, finanzia) e -chi/-ghi (rischi, luoghi)
+        if len(word) > _MIN_STEM and word[-1] == "i":
+            word = word[:-1]
+        if len(word) > _MIN_STEM and word[-1] == "h" and word[-2] in "cg":
+            word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Radici delle parole di `text`, senza stopword, numeri e parole di una lettera."""
+    words = _WORD_RE.findall(text.lower())
+    return [stem(word) for word in words if len(word) > 1 and word not in ITALIAN_STOPWORDS]
+
+
+class BM25Index:
+    """Indice BM25 su un insieme di documenti già tokenizzati: frequenze e IDF si calcolano una volta
+    e l'indice si interroga con più query (la domanda di ricerca e le query dei singoli risultati)."""
+
+    def __init__(self, documents: Sequence[List[str]], k1: float = BM25_K1, b: float = BM25_B):
+        self._k1 = k1
+        self._b = b
+        self._frequencies = [Counter(document) for document in documents]
+        self._lengths = [len(document) for document in documents]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_frequency = Counter(term for frequencies in self._frequencies for term in frequencies)
+        n = len(self._frequencies)
+        # IDF come in Lucene: sempre positivo, anche per i termini presenti in più di metà dei documenti
+        self._idf: Dict[str, float] = {term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+                                       for term, df in document_frequency.items()}
+
+    def score(self, index: int, query_terms: Sequence[str]) -> float:
+        frequencies = self._frequencies[index]
+        if not frequencies:
+            return 0.0
+        norm = self._k1 * (1 - self._b + self._b * self._lengths[index] / self._avg_length)
+        total = 0.0
+        for term in set(query_terms):
+            tf = frequencies.get(term)
+            if tf:
+                total += self._idf[term] * tf * (self._k1 + 1) / (tf + norm)
+        return total
+
+    def scores(self, query_terms: Sequence[str]) -> List[float]:
+        return [self.score(i, query_terms) for i in range(len(self._frequencies))]
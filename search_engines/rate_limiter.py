@@ -0,0 +1,120 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Optional, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Rate limiter a token bucket: `rate` richieste al secondo in media, con raffiche fino a `burst`.
+
+    Ogni richiesta prenota un token (il saldo può diventare negativo) e attende il tempo necessario
+    a ripagarlo: così le richieste concorrenti vengono distanziate senza corse tra lettura e scrittura.
+    Lo stato è protetto da un lock nel processo e, con `path`, salvato in SQLite e condiviso tra processi.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int = 1, path: Optional[str] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.name = name
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._path = path
+        self._lock = threading.Lock()
+        self._tokens = float(self._burst)
+        self._updated_at = time.time()
+        self._stats = {"acquired": 0, "waited": 0, "wait_time": 0.0, "max_wait": 0.0}
+
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS rate_limits (
+                        name TEXT PRIMARY KEY,
+                        tokens REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )""")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._path, timeout=30)
+
+    def _take(self, tokens: float, updated_at: float, now: float) -> Tuple[float, float]:
+        # ricarica i token maturati, prenota il prossimo e restituisce (nuovo saldo, attesa)
+        tokens = min(float(self._burst), tokens + (now - updated_at) * self._rate) - 1
+        return tokens, max(0.0, -tokens / self._rate)
+
+    def _reserve(self) -> float:
+        now = time.time()
+        with self._lock:
+            if self._path is None:
+                self._tokens, wait = self._take(self._tokens, self._updated_at, now)
+                self._updated_at = now
+                return wait
+            with closing(self._connect()) as conn:
+                # BEGIN IMMEDIATE: lettura e aggiornamento del saldo atomici anche tra processi
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute("SELECT tokens, updated_at FROM rate_limits WHERE name = ?",
+                                       (self.name,)).fetchone()
+                    tokens, updated_at = row if row is not None else (float(self._burst), now)
+                    tokens, wait = self._take(tokens, updated_at, now)
+                    conn.execute("INSERT OR REPLACE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)",
+                                 (self.name, tokens, now))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                return wait
+
+    def _record(self, wait: float) -> None:
+        with self._lock:
+            self._stats["acquired"] += 1
+            if wait > 0:
+                self._stats["waited"] += 1
+                self._stats["wait_time"] += wait
+                self._stats["max_wait"] = max(self._stats["max_wait"], wait)
+
+    def acquire(self) -> float:
+        """Attende il proprio turno; restituisce i secondi di attesa."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        self._record(wait)
+        return wait
+
+    async def aacquire(self) -> float:
+        wait = await asyncio.to_thread(self._reserve) if self._path is not None else self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._record(wait)
+        return wait
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["wait_time"] = round(stats["wait_time"], 2)
+        stats["max_wait"] = round(stats["max_wait"], 2)
+        return stats
+
+
+_limiters: Dict[Tuple[str, Optional[str]], TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, rate: float, burst: int = 1, path: Optional[str] = None) -> TokenBucket:
+    """Limiter condiviso da tutte le istanze del processo con lo stesso nome (e lo stesso archivio)."""
+    with _limiters_lock:
+        limiter = _limiters.get((name, path))
+        if limiter is None:
+            limiter = _limiters[(name, path)] = TokenBucket(name, rate, burst, path)
+        return limiter
@@ -1,7 +1,32 @@
+import asyncio
+import functools
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import ClassVar, List, Optional
 from typing_extensions import TypedDict
 
+from search_engines.rate_limiter import TokenBucket, get_rate_limiter
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# thread condivisi da tutti i motori: adattatore asincrono per i motori senza un client async nativo e
+# ricerche parallele del percorso sincrono; essendo sempre gli stessi, i client per thread vengono riusati
+SEARCH_EXECUTOR_WORKERS = 8
+
+_search_executor: Optional[ThreadPoolExecutor] = None
+_search_executor_lock = threading.Lock()
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(max_workers=SEARCH_EXECUTOR_WORKERS, thread_name_prefix="search")
+        return _search_executor
+
 
 class SearchEngResult(TypedDict):
     id: str
@@ -14,12 +39,58 @@ class SearchEngResult(TypedDict):
     position: Optional[int]
     search_engine: Optional[str]
     score: Optional[float]
+    fetch_tier: Optional[str]  # livello del fetcher che ha prodotto full_content
 
 
 class BaseSearchEngine(ABC):
-    def __init__(self, name: str, **kwargs):
+    # limiti dichiarati da ogni motore: richieste al secondo in media e raffica massima (None: nessun limite)
+    rate_per_second: ClassVar[Optional[float]] = None
+    rate_burst: ClassVar[int] = 1
+
+    def __init__(self, name: str, rate_limit_path: Optional[str] = None, **kwargs):
         self.name = name
+        # limiter condiviso da tutte le istanze del motore nel processo; con rate_limit_path anche tra processi
+        self._rate_limiter: Optional[TokenBucket] = None
+        if self.rate_per_second:
+            self._rate_limiter = get_rate_limiter(name, self.rate_per_second, self.rate_burst, rate_limit_path)
+
+    @property
+    def rate_limiter(self) -> Optional[TokenBucket]:
+        return self._rate_limiter
+
+    @property
+    def cache_variant(self) -> str:
+        """Opzioni del motore che cambiano i risultati restituiti per la stessa query (es. il raw content di
+        Tavily): fanno parte della chiave della cache dei risultati."""
+        return ""
+
+    def _wait_rate_limit(self) -> None:
+        if self._rate_limiter is not None:
+            waited = self._rate_limiter.acquire()
+            if waited > 0:
+                logger.debug(f"{self.name}: waited {waited:.2f}s for the rate limit")
+
+    async def _await_rate_limit(self) -> None:
+        if self._rate_limiter is not None:
+            waited = await self._rate_limiter.aacquire()
+            if waited > 0:
+                logger.debug(f"{self.name}: waited {waited:.2f}s for the rate limit")
 
     @abstractmethod
     def search(self, query: str, max_results: Optional[int] = 10, sites: List[str] = None) -> List[SearchEngResult]:
         pass
+
+    async def asearch(self, query: str, max_results: Optional[int] = 10,
+                      sites: List[str] = None) -> List[SearchEngResult]:
+        """Versione asyncio di search.
+
+        Di default esegue search nel pool di thread condiviso dei motori, che limita i thread occupati
+        anche con molte sessioni di ricerca sullo stesso event loop; i motori con un client async lo ridefiniscono.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_search_executor(),
+                                          functools.partial(self.search, query, max_results=max_results, sites=sites))
+
+    async def aclose(self) -> None:
+        """Chiude i client async del motore legati all'event loop corrente."""
+        pass
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+from typing import List, Optional, Tuple
+
+from search_engines.rate_limiter import TokenBucket
+from search_engines.search_engine_base import BaseSearchEngine, SearchEngResult
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    # la stessa query riformulata con maiuscole o spazi diversi usa la stessa voce di cache
+    query = unicodedata.normalize("NFKC", query).lower()
+    return re.sub(r"\s+", " ", query).strip()
+
+
+class SearchResultCache:
+    """Cache dei risultati dei motori di ricerca: LRU in memoria davanti a un archivio SQLite opzionale.
+
+    La chiave è (motore, variante del motore, query normalizzata, siti, max_results); le voci più vecchie di `ttl_seconds`
+    sono scadute. I risultati vuoti non vengono salvati, perché spesso dipendono da un errore transitorio.
+    Il contenuto completo fornito dal motore (es. raw content di Tavily, senza limiti di lunghezza) viene
+    troncato a `max_content_chars`, così la memoria occupata resta limitata anche con `max_entries` voci.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 512, path: Optional[str] = None,
+                 max_content_chars: Optional[int] = None):
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max(1, max_entries)
+        self._max_content_chars = max_content_chars
+        self._path = path
+        self._lock = threading.Lock()
+        # chiave -> (istante di creazione, risultati)
+        self._memory: "OrderedDict[str, Tuple[float, List[SearchEngResult]]]" = OrderedDict()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS search_cache (
+                        key TEXT PRIMARY KEY,
+                        results TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )""")
+
+    @staticmethod
+    def key(engine: str, query: str, sites: Optional[List[str]], max_results: Optional[int],
+            variant: str = "") -> str:
+        # la variante (vedi BaseSearchEngine.cache_variant) separa, ad esempio, i risultati Tavily con e senza
+        # raw content: con la cache persistita un passo che richiede il contenuto non riusa voci che non lo hanno
+        engine_key = f"{engine}:{variant}" if variant else engine
+        sites_key = ",".join(sorted(site.strip().lower() for site in sites)) if sites else ""
+        return f"{engine_key}|{normalize_query(query)}|{sites_key}|{max_results}"
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._path, timeout=30)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    @staticmethod
+    def _copy(results: List[SearchEngResult]) -> List[SearchEngResult]:
+        # i risultati hanno solo valori immutabili: una copia dei dizionari basta a isolare la cache dal chiamante
+        return [SearchEngResult(**r) for r in results]
+
+    def _remember(self, key: str, created_at: float, results: List[SearchEngResult]) -> None:
+        # da chiamare con il lock acquisito
+        self._memory[key] = (created_at, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[SearchEngResult]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] < self._ttl_seconds:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._copy(entry[1])
+            self._memory.pop(key, None)
+
+        if self._path is not None:
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT results, created_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] < self._ttl_seconds:
+                results = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, row[1], results)
+                    self._stats["disk_hits"] += 1
+                return self._copy(results)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, results: List[SearchEngResult]) -> None:
+        if not results:
+            return
+        now = time.time()
+        results = self._copy(results)
+        if self._max_content_chars is not None:
+            for r in results:
+                if r.get('full_content'):
+                    r['full_content'] = r['full_content'][:self._max_content_chars]
+        with self._lock:
+            self._remember(key, now, results)
+            self._stats["stores"] += 1
+        if self._path is not None:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("INSERT OR REPLACE INTO search_cache (key, results, created_at) VALUES (?, ?, ?)",
+                             (key, json.dumps(results), now))
+                conn.execute("DELETE FROM search_cache WHERE created_at < ?", (now - self._ttl_seconds,))
+
+
+class CachedSearchEngine(BaseSearchEngine):
+    """Motore di ricerca con cache dei risultati davanti a `engine`.
+
+    Con un hit non si chiama il motore, quindi non si paga né l'attesa del rate limit né la chiamata API.
+    """
+
+    def __init__(self, engine: BaseSearchEngine, cache: SearchResultCache):
+        super().__init__(name=engine.name)
+        self._engine = engine
+        self._cache = cache
+
+    @property
+    def rate_limiter(self) -> Optional[TokenBucket]:
+        return self._engine.rate_limiter
+
+    @property
+    def cache_variant(self) -> str:
+        return self._engine.cache_variant
+
+    def _key(self, query: str, sites: Optional[List[str]], max_results: Optional[int]) -> str:
+        return SearchResultCache.key(self.name, query, sites, max_results, self._engine.cache_variant)
+
+    def _cached(self, key: str, query: str) -> Optional[List[SearchEngResult]]:
+        results = self._cache.get(key)
+        if results is not None:
+            logger.debug(f"Search cache hit for {self.name}: {query}")
+            # id nuovi: i risultati di una ricerca ripetuta sono voci distinte dello stato
+            for r in results:
+                r['id'] = str(uuid.uuid4())
+        return results
+
+    def search(self, query: str, max_results: Optional[int] = 10, sites: List[str] = None) -> List[SearchEngResult]:
+        key = self._key(query, sites, max_results)
+        results = self._cached(key, query)
+        if results is not None:
+            return results
+
+        results = self._engine.search(query, max_results=max_results, sites=sites)
+        self._cache.put(key, results)
+        return results
+
+    async def asearch(self, query: str, max_results: Optional[int] = 10,
+                      sites: List[str] = None) -> List[SearchEngResult]:
+        key = self._key(query, sites, max_results)
+        # con la cache persistita get e put leggono e scrivono su SQLite: fuori dall'event loop
+        results = await asyncio.to_thread(self._cached, key, query)
+        if results is not None:
+            return results
+
+        results = await self._engine.asearch(query, max_results=max_results, sites=sites)
+        await asyncio.to_thread(self._cache.put, key, results)
+        return results
+
+    async def aclose(self) -> None:
+        await self._engine.aclose()
@@ -1,56 +1,53 @@
-from typing import List, Optional, ClassVar
+import threading
+from typing import List, Optional
 from search_engines.search_engine_base import BaseSearchEngine, SearchEngResult
 from duckduckgo_search import DDGS
 import uuid
-import time
 
 import logging
 logger = logging.getLogger(__name__)
 
 
 class DuckDuckGoSearchEngine(BaseSearchEngine):
-    _last_search_time: ClassVar[float] = 0.0
-    _min_delay: ClassVar[float] = 1.0
+    """DuckDuckGo non ha un client async: asearch usa l'adattatore a thread di BaseSearchEngine."""
+    rate_per_second = 1.0
+    rate_burst = 1
 
-    def __init__(self):
-        super().__init__(name="DuckDuckGo")
+    def __init__(self, rate_limit_path: Optional[str] = None):
+        super().__init__(name="DuckDuckGo", rate_limit_path=rate_limit_path)
+        # un client DDGS per thread, riusato tra le ricerche (con i suoi cookie e le sue connessioni)
+        self._local = threading.local()
 
-    @classmethod
-    def _ensure_delay(cls) -> None:
-        # Metodo di classe per gestire il delay tra le ricerche
-        current_time = time.time()
-        elapsed = current_time - cls._last_search_time
-
-        if elapsed < cls._min_delay:
-            time.sleep(cls._min_delay - elapsed)
-
-        cls._last_search_time = time.time()
+    def _ddgs(self) -> DDGS:
+        ddgs = getattr(self._local, "ddgs", None)
+        if ddgs is None:
+            ddgs = self._local.ddgs = DDGS()
+        return ddgs
 
     def search(self, query, max_results: Optional[int] = 10, sites: List[str] = None) -> List[SearchEngResult]:
-        # Applica il rate limiting a livello di classe
-        self._ensure_delay()
-
-        with DDGS() as ddgs:
-            if sites:
-                query_con_dominio = " OR ".join([f"site:{dominio}" for dominio in sites])
-                query = query + " " + query_con_dominio
-            search_results = list(ddgs.text(query,
-                                            region="it-it",
-                                            backend="auto",  # backend: auto, html, lite. Defaults to auto.
-                                            # timelimit="y",
-                                            max_results=max_results))
-            results: List[SearchEngResult] = []
-            k = 0
-            for res in search_results:
-                url = res.get('href')
-                title = res.get('title', "")
-                content = res.get('body', "")
-                k += 1
-                if not all([url, title, content]):
-                    logger.warning(f"Warning: Incomplete result from DuckDuckGo: {res}")
-                    continue
-                results.append(SearchEngResult(id=str(uuid.uuid4()), query=query,
-                                               title=title, snippet=content, url=url, position=k,
-                                               full_content=None, num_source=None,
-                                               score=None, search_engine=self.name))
+        self._wait_rate_limit()
+
+        ddgs = self._ddgs()
+        if sites:
+            query_con_dominio = " OR ".join([f"site:{dominio}" for dominio in sites])
+            query = query + " " + query_con_dominio
+        search_results = list(ddgs.text(query,
+                                        region="it-it",
+                                        backend="auto",  # backend: auto, html, lite. Defaults to auto.
+                                        # timelimit="y",
+                                        max_results=max_results))
+        results: List[SearchEngResult] = []
+        k = 0
+        for res in search_results:
+            url = res.get('href')
+            title = res.get('title', "")
+            content = res.get('body', "")
+            k += 1
+            if not all([url, title, content]):
+                logger.warning(f"Warning: Incomplete result from DuckDuckGo: {res}")
+                continue
+            results.append(SearchEngResult(id=str(uuid.uuid4()), query=query,
+                                           title=title, snippet=content, url=url, position=k,
+                                           full_content=None, num_source=None,
+                                           score=None, search_engine=self.name, fetch_tier=None))
         return results
@@ -1,44 +1,50 @@
-from typing import List, Optional, ClassVar
+import asyncio
+from typing import List, Optional, Tuple
+from urllib.parse import unquote
 from search_engines.search_engine_base import BaseSearchEngine, SearchEngResult
 import uuid
-import time
-from googlesearch import search
+import httpx
+import requests
+from bs4 import BeautifulSoup
+from googlesearch import SearchResult
+from googlesearch.user_agents import get_useragent
 
 import logging
 logger = logging.getLogger(__name__)
 
-class GoogleSearchEngine(BaseSearchEngine):
-    _last_search_time: ClassVar[float] = 0.0
-    _min_delay: ClassVar[float] = 1.0
-
-    def __init__(self):
-        super().__init__(name="Google")
-
-    @classmethod
-    def _ensure_delay(cls) -> None:
-        """Metodo di classe per gestire il delay tra le ricerche"""
-        current_time = time.time()
-        elapsed = current_time - cls._last_search_time
+GOOGLE_SEARCH_URL = "https://www.google.com/search"
+GOOGLE_COOKIES = {"CONSENT": "PENDING+987", "SOCS": "CAESHAgBEhIaAB"}
 
-        if elapsed < cls._min_delay:
-            time.sleep(cls._min_delay - elapsed)
 
-        cls._last_search_time = time.time()
+class GoogleSearchEngine(BaseSearchEngine):
+    rate_per_second = 1.0
+    rate_burst = 1
 
-    def search(self, query, max_results: Optional[int] = 10, sites: List[str] = None) -> List[SearchEngResult]:
-        # Applica il rate limiting a livello di classe
-        self._ensure_delay()
+    def __init__(self, session: Optional[requests.Session] = None, rate_limit_path: Optional[str] = None):
+        super().__init__(name="Google", rate_limit_path=rate_limit_path)
+        # sessione condivisa (keep-alive verso google.com); senza, se ne crea una dedicata
+        self._session = session if session is not None else requests.Session()
+        # client async riusato tra le ricerche, legato all'event loop in cui è stato creato
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
 
+    @staticmethod
+    def _full_query(query: str, sites: Optional[List[str]]) -> str:
         if sites:
             query_con_dominio = " OR ".join([f"site:{dominio}" for dominio in sites])
             query = query + " " + query_con_dominio
+        return query
 
-        search_results = list(search(query,
-                                     num_results=max_results,
-                                     lang="it",
-                                     sleep_interval=1,
-                                     advanced=True, ))
+    def search(self, query, max_results: Optional[int] = 10, sites: List[str] = None) -> List[SearchEngResult]:
+        query = self._full_query(query, sites)
+        return self._to_results(query, self._google_search(query, num_results=max_results, lang="it"))
+
+    async def asearch(self, query, max_results: Optional[int] = 10,
+                      sites: List[str] = None) -> List[SearchEngResult]:
+        query = self._full_query(query, sites)
+        return self._to_results(query, await self._agoogle_search(query, num_results=max_results, lang="it"))
 
+    def _to_results(self, query: str, search_results: List[SearchResult]) -> List[SearchEngResult]:
         results: List[SearchEngResult] = []
         k = 0
         for res in search_results:
@@ -51,7 +57,78 @@ class GoogleSearchEngine(BaseSearchEngine):
                 continue
             results.append(
                 SearchEngResult(id=str(uuid.uuid4()), query=query, title=title, snippet=content, url=url, position=k,
-                                full_content=None, num_source=None, score=None, search_engine=self.name))
+                                full_content=None, num_source=None, score=None, search_engine=self.name,
+                                fetch_tier=None))
 
         return results
 
+    @staticmethod
+    def _page_request(term: str, num_results: int, lang: str, start: int) -> Tuple[dict, dict]:
+        headers = {"User-Agent": get_useragent(), "Accept": "*/*"}
+        params = {"q": term, "num": num_results - start + 2, "hl": lang, "start": start, "safe": "active"}
+        return headers, params
+
+    @staticmethod
+    def _parse_page(html: str, results: List[SearchResult], num_results: int) -> int:
+        """Aggiunge a `results` i risultati della pagina; restituisce quanti ne ha trovati."""
+        new_results = 0
+        for block in BeautifulSoup(html, "html.parser").find_all("div", class_="ezO2md"):
+            link_tag = block.find("a", href=True)
+            title_tag = link_tag.find("span", class_="CVA68e") if link_tag else None
+            description_tag = block.find("span", class_="FrIlee")
+            if not (link_tag and title_tag and description_tag):
+                continue
+            link = unquote(link_tag["href"].split("&")[0].replace("/url?q=", ""))
+            results.append(SearchResult(link, title_tag.text, description_tag.text))
+            new_results += 1
+            if len(results) >= num_results:
+                break
+        return new_results
+
+    def _google_search(self, term: str, num_results: int, lang: str, timeout: float = 5) -> List[SearchResult]:
+        """Come googlesearch.search(advanced=True), ma con le richieste fatte dalla sessione condivisa.
+
+        Ogni pagina di risultati è una richiesta a Google e passa dal rate limiter.
+        """
+        results: List[SearchResult] = []
+        start = 0
+        while len(results) < num_results:
+            self._wait_rate_limit()
+            headers, params = self._page_request(term, num_results, lang, start)
+            response = self._session.get(GOOGLE_SEARCH_URL, headers=headers, params=params, cookies=GOOGLE_COOKIES,
+                                         timeout=timeout)
+            response.raise_for_status()
+            if self._parse_page(response.text, results, num_results) == 0:
+                break
+            start += 10
+        return results
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(follow_redirects=True, cookies=GOOGLE_COOKIES)
+            self._async_loop = loop
+        return self._async_client
+
+    async def _agoogle_search(self, term: str, num_results: int, lang: str,
+                              timeout: float = 5) -> List[SearchResult]:
+        results: List[SearchResult] = []
+        start = 0
+        while len(results) < num_results:
+            await self._await_rate_limit()
+            headers, params = self._page_request(term, num_results, lang, start)
+            response = await self._get_async_client().get(GOOGLE_SEARCH_URL, headers=headers, params=params,
+                                                          timeout=timeout)
+            response.raise_for_status()
+            # il parsing con BeautifulSoup è CPU-bound: fuori dall'event loop
+            if await asyncio.to_thread(self._parse_page, response.text, results, num_results) == 0:
+                break
+            start += 10
+        return results
+
+    async def aclose(self) -> None:
+        if self._async_client is not None and self._async_loop is asyncio.get_running_loop():
+            await self._async_client.aclose()
+        self._async_client = None
+        self._async_loop = None
+
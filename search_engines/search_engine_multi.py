@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import wait
+from typing import Dict, List, Optional, Tuple
+
+from search_engines.search_engine_base import BaseSearchEngine, SearchEngResult, get_search_executor
+from utils import dedup_url
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# costante della reciprocal rank fusion: valori alti attenuano il vantaggio delle prime posizioni
+RRF_K = 60
+
+
+class MultiSearchEngine(BaseSearchEngine):
+    """Interroga più motori in parallelo e fonde i risultati con la reciprocal rank fusion.
+
+    Ogni motore ha `engine_deadline` secondi: chi non risponde in tempo (o fallisce) viene ignorato
+    per quella query, senza bloccare gli altri. Lo score di una pagina (chiave dedup_url) è la somma di
+    1 / (rrf_k + posizione) sui motori che lo restituiscono; `search_engine` di ogni risultato riporta
+    i motori che hanno contribuito, con la posizione e la latenza di ciascuno.
+    """
+
+    def __init__(self, engines: List[BaseSearchEngine], engine_deadline: float = 10, rrf_k: int = RRF_K):
+        super().__init__(name="Multi")
+        if not engines:
+            raise ValueError("MultiSearchEngine needs at least one engine")
+        self._engines = engines
+        self._engine_deadline = engine_deadline
+        self._rrf_k = rrf_k
+        # le query di un passo sono cercate in parallelo: il lock protegge le statistiche
+        self._lock = threading.Lock()
+        self._stats = {engine.name: Counter() for engine in engines}
+
+    @property
+    def engines(self) -> List[BaseSearchEngine]:
+        return self._engines
+
+    @property
+    def stats(self) -> Dict[str, dict]:
+        stats = {}
+        with self._lock:
+            counters = {name: Counter(counter) for name, counter in self._stats.items()}
+        for name, counter in counters.items():
+            stats[name] = dict(counter)
+            stats[name]["avg_latency"] = round(counter["latency"] / counter["searches"], 2) \
+                if counter["searches"] else 0.0
+            stats[name]["latency"] = round(counter["latency"], 2)
+        return stats
+
+    def _timed_search(self, engine: BaseSearchEngine, query: str, max_results: Optional[int],
+                      sites: Optional[List[str]]) -> Tuple[List[SearchEngResult], float]:
+        start = time.monotonic()
+        results = engine.search(query, max_results=max_results, sites=sites)
+        return results, time.monotonic() - start
+
+    def _collect(self, query: str, max_results: Optional[int],
+                 sites: Optional[List[str]]) -> List[Tuple[BaseSearchEngine, List[SearchEngResult], float]]:
+        """Risultati di ogni motore che ha risposto entro la scadenza, nell'ordine dei motori configurati.
+
+        I motori sono interrogati nell'executor condiviso, così i client per thread (es. DDGS) vengono riusati;
+        il chiamante non deve quindi essere a sua volta un worker di quell'executor (vedi
+        SearchSystem._search_queries), altrimenti con molte query i motori resterebbero in coda.
+        """
+        executor = get_search_executor()
+        futures = {executor.submit(self._timed_search, engine, query, max_results, sites): engine
+                   for engine in self._engines}
+        try:
+            done, not_done = wait(futures, timeout=self._engine_deadline)
+        finally:
+            # i motori in ritardo non vengono attesi: i loro risultati vanno persi
+            for future in futures:
+                future.cancel()
+
+        collected = []
+        for future, engine in futures.items():
+            if future in not_done:
+                self._record_timeout(engine, query)
+                continue
+            try:
+                results, latency = future.result()
+            except Exception as e:
+                self._record_error(engine, query, e)
+                continue
+            self._record_results(engine, results, latency)
+            collected.append((engine, results, latency))
+        return collected
+
+    async def _acollect(self, query: str, max_results: Optional[int],
+                        sites: Optional[List[str]]) -> List[Tuple[BaseSearchEngine, List[SearchEngResult], float]]:
+        async def timed_search(engine: BaseSearchEngine) -> Tuple[List[SearchEngResult], float]:
+            start = time.monotonic()
+            results = await engine.asearch(query, max_results=max_results, sites=sites)
+            return results, time.monotonic() - start
+
+        tasks = {asyncio.create_task(timed_search(engine)): engine for engine in self._engines}
+        _, not_done = await asyncio.wait(tasks, timeout=self._engine_deadline)
+        for task in not_done:
+            task.cancel()
+
+        collected = []
+        for task, engine in tasks.items():
+            if task in not_done:
+                self._record_timeout(engine, query)
+                continue
+            try:
+                results, latency = task.result()
+            except Exception as e:
+                self._record_error(engine, query, e)
+                continue
+            self._record_results(engine, results, latency)
+            collected.append((engine, results, latency))
+        return collected
+
+    def _record_timeout(self, engine: BaseSearchEngine, query: str) -> None:
+        logger.warning(f"Warning: {engine.name} did not answer within {self._engine_deadline}s for: {query}")
+        with self._lock:
+            self._stats[engine.name].update(searches=1, timeouts=1, latency=self._engine_deadline)
+
+    def _record_error(self, engine: BaseSearchEngine, query: str, error: Exception) -> None:
+        logger.warning(f"Warning: {engine.name} search failed for {query}: {error}")
+        with self._lock:
+            self._stats[engine.name].update(searches=1, errors=1)
+
+    def _record_results(self, engine: BaseSearchEngine, results: List[SearchEngResult], latency: float) -> None:
+        with self._lock:
+            self._stats[engine.name].update(searches=1, results=len(results), latency=latency)
+
+    def search(self, query: str, max_results: Optional[int] = 10, sites: List[str] = None) -> List[SearchEngResult]:
+        return self._fuse(self._collect(query, max_results, sites), max_results)
+
+    async def asearch(self, query: str, max_results: Optional[int] = 10,
+                      sites: List[str] = None) -> List[SearchEngResult]:
+        return self._fuse(await self._acollect(query, max_results, sites), max_results)
+
+    async def aclose(self) -> None:
+        for engine in self._engines:
+            await engine.aclose()
+
+    def _fuse(self, collected: List[Tuple[BaseSearchEngine, List[SearchEngResult], float]],
+              max_results: Optional[int]) -> List[SearchEngResult]:
+        fused: Dict[str, SearchEngResult] = {}
+        scores: Dict[str, float] = {}
+        contributions: Dict[str, List[Tuple[str, int, float]]] = {}
+
+        for engine, results, latency in collected:
+            seen = set()
+            for rank, result in enumerate(results, 1):
+                key = dedup_url(result['url'])
+                if key in seen:
+                    continue
+                seen.add(key)
+                # il primo motore (nell'ordine configurato) che restituisce l'URL fornisce titolo e snippet;
+                # il contenuto completo (es. raw content di Tavily) si prende da qualunque motore lo fornisca
+                first = fused.setdefault(key, result)
+                if not first.get('full_content') and result.get('full_content'):
+                    first['full_content'] = result['full_content']
+                scores[key] = scores.get(key, 0.0) + 1 / (self._rrf_k + rank)
+                contributions.setdefault(key, []).append((engine.name, rank, latency))
+
+        # ordinamento stabile: a parità di score vale l'ordine di arrivo (motore, posizione)
+        ranked = sorted(fused, key=lambda key: -scores[key])
+        if max_results:
+            ranked = ranked[:max_results]
+        merged: List[SearchEngResult] = []
+        for position, key in enumerate(ranked, 1):
+            result = fused[key]
+            result['position'] = position
+            result['search_engine'] = ", ".join(f"{name}#{rank} ({latency:.2f}s)"
+                                                for name, rank, latency in contributions[key])
+            merged.append(result)
+        with self._lock:
+            for key in ranked:
+                for name, _, _ in contributions[key]:
+                    self._stats[name]["contributed"] += 1
+        return merged
@@ -1,7 +1,9 @@
+import asyncio
 from typing import List, Optional
 from search_engines.search_engine_base import BaseSearchEngine, SearchEngResult
 import uuid
-from tavily import TavilyClient
+import requests
+from tavily import AsyncTavilyClient, TavilyClient
 import os
 import logging
 
@@ -9,32 +11,66 @@ logger = logging.getLogger(__name__)
 
 
 class TavilySearchEngine(BaseSearchEngine):
-    def __init__(self):
-        super().__init__(name="Tavily")
+    # piano base dell'API: 100 richieste al minuto
+    rate_per_second = 100 / 60
+    rate_burst = 5
+
+    def __init__(self, session: Optional[requests.Session] = None, rate_limit_path: Optional[str] = None,
+                 include_raw_content: bool = False):
+        super().__init__(name="Tavily", rate_limit_path=rate_limit_path)
+        # con una sessione condivisa le connessioni verso l'API restano aperte tra una ricerca e l'altra
+        self._client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"), session=session)
+        # con il raw content (in markdown, come gli estrattori) la pagina arriva insieme al risultato
+        self._include_raw_content = include_raw_content
+        # client async riusato tra le ricerche, legato all'event loop in cui è stato creato
+        self._async_client: Optional[AsyncTavilyClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def cache_variant(self) -> str:
+        return "raw_content" if self._include_raw_content else ""
+
+    def _search_params(self, max_results: Optional[int], sites: Optional[List[str]]) -> dict:
+        return dict(include_domains=[] if sites is None else sites,
+                    max_results=max_results,
+                    include_raw_content="markdown" if self._include_raw_content else False)
 
     def search(self, query, max_results: Optional[int] = 10, sites:List[str] = None) -> List[SearchEngResult]:
-        tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        self._wait_rate_limit()
+        search_results = self._client.search(query, **self._search_params(max_results, sites))
+        return self._to_results(query, search_results)
 
-        search_results = tavily_client.search(query,
-                                              include_domains=[] if sites is None else sites,
-                                              max_results=max_results,
-                                              include_raw_content=False)
+    async def asearch(self, query, max_results: Optional[int] = 10,
+                      sites: List[str] = None) -> List[SearchEngResult]:
+        await self._await_rate_limit()
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = AsyncTavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+            self._async_loop = loop
+        search_results = await self._async_client.search(query, **self._search_params(max_results, sites))
+        return self._to_results(query, search_results)
 
+    async def aclose(self) -> None:
+        if self._async_client is not None and self._async_loop is asyncio.get_running_loop():
+            await self._async_client.close()
+        self._async_client = None
+        self._async_loop = None
+
+    def _to_results(self, query: str, search_results: dict) -> List[SearchEngResult]:
         results: List[SearchEngResult] = []
         k = 0
         for res in search_results['results']:
             url = res.get('url')
             title = res.get('title')
             content = res.get('content')
+            raw_content = res.get('raw_content')
             k += 1
             if not all([url, title, content]):
                 logger.warning(f"Incomplete result from Tavily: {res}")
                 continue
             results.append(
                 SearchEngResult(id=str(uuid.uuid4()), query=query, title=title, snippet=content, url=url,
-                                position=k, full_content=None, num_source=None,
-                                score=None, search_engine=self.name))
+                                position=k, full_content=raw_content or None, num_source=None,
+                                score=None, search_engine=self.name, fetch_tier=None))
 
         return results
-
-
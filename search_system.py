@@ -1,50 +1,213 @@
 import os
+import json
 import tempfile
 
-import cloudscraper
+import asyncio
+
+import httpx
 import requests
 import math
 
-import fitz
-import pymupdf4llm
-
 import io
-from typing import Optional, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional, List, Mapping, Set, Tuple
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from PyPDF2 import PdfReader
-from playwright.sync_api import sync_playwright
-from readability import Document
-from markdownify import markdownify
+from playwright.async_api import Page as AsyncPage
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 from collections import Counter
-import numpy as np
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-from search_engines.search_engine_base import BaseSearchEngine, SearchEngResult
+from browser_pool import AsyncBrowserPool, BrowserPool, aload_html, load_html
+from configuration import Configuration
+from content_cache import CachedContent, ContentCache
+from fetch_scheduler import FetchTimeout, HostScheduler, parse_retry_after
+from http_sessions import SessionRegistry
+from near_duplicates import NearDuplicateIndex, simhash
+from negative_cache import NegativeCache
+from html_extraction import HtmlExtractionPool, HtmlExtractionTimeout, html_to_markdown
+from pdf_extraction import PdfExtractionPool, PdfExtractionTimeout
+from ranking import rank_search_results
+from utils import dedup_url
+from search_engines.search_engine_base import BaseSearchEngine, SearchEngResult, get_search_executor
+from search_engines.search_engine_cache import CachedSearchEngine, SearchResultCache
 from search_engines.search_engine_ddg import DuckDuckGoSearchEngine
 from search_engines.search_engine_google import GoogleSearchEngine
+from search_engines.search_engine_multi import MultiSearchEngine
 from search_engines.search_engine_tavily import TavilySearchEngine
-import ssl
-from requests.adapters import HTTPAdapter
-import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
-lock = threading.Lock()
+# numero minimo di parole perché un contenuto scaricato sia considerato utile
+MIN_CONTENT_WORDS = 30
+
+# margine sul budget di caratteri per fonte oltre il quale si interrompe l'estrazione (PDF, estrattore lxml)
+CHAR_BUDGET_MARGIN = 1.5
+
+# soglie per decidere se la risposta HTTP statica è sufficiente o serve il browser
+MIN_STATIC_WORDS = 50
+NOSCRIPT_SHELL_MAX_WORDS = 200
+MARKER_SCAN_BYTES = 64 * 1024
+STATIC_MAX_BYTES = 5 * 2 ** 20
+# risposte per cui non si tenta il fallback sul browser
+GONE_STATUS_CODES = (404, 410)
+# risposte il cui header Retry-After rinvia i fetch successivi verso lo stesso host
+RETRY_AFTER_STATUS_CODES = (429, 503)
+# timeout (secondi) per la lettura di robots.txt
+ROBOTS_TIMEOUT = 5
+# tempo concesso oltre la scadenza del fetch per l'attesa di un task nel pool di browser
+BROWSER_QUEUE_GRACE = 5
+CHALLENGE_MARKERS = (
+    "cf-browser-verification",
+    "challenge-platform",
+    "cf-chl-",
+    "just a moment...",
+    "checking your browser",
+    "ddos-guard",
+    "g-recaptcha",
+    "hcaptcha",
+    "please enable javascript",
+    "abilita javascript",
+    "attiva javascript",
+)
+
+
+class FetchAbandoned(Exception):
+    """Fetch abbandonato alla scadenza del passo di ricerca (o alla chiusura del SearchSystem) e interrotto."""
+
 
+class FetchFailed(Exception):
+    def __init__(self, kind: str, message: str = ""):
+        super().__init__(message or kind)
+        self.kind = kind  # "http_4xx", "http_5xx", "challenge", "extraction"
 
-class SSLIgnoreAdapter(HTTPAdapter):
-    def init_poolmanager(self, *args, **kwargs):
-        context = ssl.create_default_context()
-        context.check_hostname = False  # ❗️DISATTIVA PRIMA
-        context.verify_mode = ssl.CERT_NONE  # ❗️POI IMPOSTA verify_mode
-        kwargs['ssl_context'] = context
-        return super().init_poolmanager(*args, **kwargs)
+
+@dataclass
+class FetchResult:
+    content: Optional[str]
+    tier: Optional[str]  # "engine", "cache", "http", "browser", "pdf_http", "pdf_browser"
+    error: Optional[str] = None  # tipo di errore registrato nella cache negativa
+
+
+@dataclass
+class HttpResponse:
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+    truncated: bool = False  # corpo interrotto al limite di byte
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+
+class _AsyncFetchResources:
+    """Risorse del fetch asincrono, legate a un event loop: client HTTP, pool di browser e limite di concorrenza."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, configuration: Configuration, sessions: SessionRegistry):
+        self.loop = loop
+        self.http_client = sessions.async_client(
+            follow_redirects=True,
+            timeout=httpx.Timeout(configuration.fetch_first_byte_timeout,
+                                  connect=configuration.fetch_connect_timeout),
+            limits=httpx.Limits(max_connections=configuration.fetch_max_concurrency * 2,
+                                max_keepalive_connections=configuration.fetch_max_concurrency))
+        self.browser_pool = AsyncBrowserPool(size=configuration.browser_pool_size,
+                                             max_navigations_per_context=configuration.browser_max_navigations,
+                                             lean=configuration.browser_lean_profile)
+        self.global_limit = asyncio.Semaphore(configuration.fetch_max_concurrency)
+
+    async def aclose(self) -> None:
+        await self.browser_pool.close()
+        await self.http_client.aclose()
 
 
 class SearchSystem:
-    def __init__(self, search_api: str):
+    def __init__(self, search_api: str, configuration: Optional[Configuration] = None):
         self._search_api = search_api
+        self._configuration = configuration or Configuration()
+        # pool di browser persistente, condiviso da tutte le ricerche di questa istanza
+        self._browser_pool = BrowserPool(size=self._configuration.browser_pool_size,
+                                         max_navigations_per_context=self._configuration.browser_max_navigations,
+                                         lean=self._configuration.browser_lean_profile)
+        # sessioni HTTP con keep-alive condivise dal fetcher e dai motori di ricerca
+        self._sessions = SessionRegistry(pool_maxsize=self._configuration.http_pool_maxsize,
+                                         host_pool_sizes=self._configuration.http_host_pool_sizes,
+                                         http2=self._configuration.http2)
+        self._http_session = self._sessions.session("fetch", verify=False)
+        # limiti per host condivisi dal fetch sincrono e da quello asincrono
+        self._host_scheduler = HostScheduler(
+            max_per_host=self._configuration.fetch_max_per_host,
+            min_interval=self._configuration.fetch_min_host_interval,
+            crawl_delay_provider=self._robots_crawl_delay if self._configuration.fetch_respect_robots else None)
+        self._pdf_max_bytes = self._configuration.pdf_max_mb * 2 ** 20
+        # budget di caratteri per fonte: quanto serve a format_sources (4 caratteri per token) più un margine
+        self._char_budget = int(self._configuration.max_tokens_per_source * 4 * CHAR_BUDGET_MARGIN)
+        # estrazione HTML -> markdown in processi separati, fuori dai thread di fetch
+        self._html_pool = HtmlExtractionPool(max_workers=self._configuration.html_extraction_workers,
+                                             timeout=self._configuration.fetch_extraction_timeout,
+                                             max_bytes=self._configuration.html_max_kb * 2 ** 10,
+                                             extractor=self._configuration.content_extractor,
+                                             max_chars=self._char_budget)
+        self._pdf_pool = PdfExtractionPool(max_workers=self._configuration.pdf_extraction_workers,
+                                           timeout=self._configuration.fetch_extraction_timeout,
+                                           max_pages=self._configuration.pdf_max_pages,
+                                           max_bytes=self._pdf_max_bytes)
+        self._async_fetch: Optional[_AsyncFetchResources] = None
+        # ricerche e fetch ancora in corso abbandonati alla scadenza di un passo: close() li attende
+        self._closed = threading.Event()
+        self._abandoned_futures: List[Future] = []
+        self._abandoned_lock = threading.Lock()
+        # motore creato alla prima ricerca e riusato, con i suoi client, per tutte le successive
+        self._search_engine: Optional[BaseSearchEngine] = None
+        self._content_cache: Optional[ContentCache] = None
+        if self._configuration.content_cache_enabled:
+            self._content_cache = ContentCache(self._configuration.content_cache_path,
+                                               ttl_seconds=self._configuration.content_cache_ttl_hours * 3600,
+                                               max_bytes=self._configuration.content_cache_max_mb * 2 ** 20,
+                                               variant=f"{self._configuration.content_extractor}:{self._char_budget}")
+        self._search_cache: Optional[SearchResultCache] = None
+        if self._configuration.search_cache_enabled:
+            self._search_cache = SearchResultCache(
+                ttl_seconds=self._configuration.search_cache_ttl_hours * 3600,
+                max_entries=self._configuration.search_cache_max_entries,
+                path=self._configuration.search_cache_path if self._configuration.search_cache_persist else None,
+                # del contenuto fornito dal motore si usa comunque solo il budget di caratteri della fonte
+                max_content_chars=self._char_budget)
+        self._negative_cache: Optional[NegativeCache] = None
+        if self._configuration.negative_cache_enabled:
+            self._negative_cache = NegativeCache(
+                self._configuration.negative_cache_path,
+                host_failure_threshold=self._configuration.host_failure_threshold,
+                host_cooldown_seconds=self._configuration.host_cooldown_minutes * 60)
+        # impronte SimHash delle fonti già selezionate: restano per tutta la vita del SearchSystem (l'esecuzione
+        # del grafo), così anche i quasi-duplicati di fonti dei cicli precedenti vengono scartati
+        self._near_duplicates: Optional[NearDuplicateIndex] = None
+        if self._configuration.near_duplicate_detection:
+            self._near_duplicates = NearDuplicateIndex(self._configuration.near_duplicate_max_distance)
+
+    def __enter__(self) -> "SearchSystem":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # i fetch abbandonati si fermano al prossimo controllo di _raise_if_abandoned (al più alla fine della
+        # fase in corso) e vanno attesi prima di chiudere i pool che stanno usando
+        self._closed.set()
+        with self._abandoned_lock:
+            futures, self._abandoned_futures = self._abandoned_futures, []
+        wait(futures)
+        self._browser_pool.close()
+        self._html_pool.close()
+        self._pdf_pool.close()
+        self._sessions.close()
 
     def execute_search(self, query_list: list[str],
                        max_filtered_results: int,
@@ -52,216 +215,911 @@ class SearchSystem:
                        include_raw_content: bool = False,
                        exclude_sources: Optional[List[SearchEngResult]] = None,
                        sites: Optional[List[str]] = None,
+                       seen_urls: Optional[Set[str]] = None,
+                       research_query: Optional[str] = None,
                        additional_params=None) -> List[SearchEngResult]:
 
-        def process_result(result):
-            result['full_content'] = self._fetch_raw_content(result['url'])
-            return result
+        if include_raw_content:
+            self._wait_for_extraction_pools()
+        deadline = time.monotonic() + self._configuration.search_deadline
+        search_engine = self._get_search_engine()
+        # domanda di ricerca per la pertinenza: di default la prima query, che nel grafo è state.query
+        research_query = research_query or (query_list[0] if query_list else None)
+
+        excluded_urls = self._excluded_urls(exclude_sources, seen_urls)
+        max_results_per_query = self._results_per_query(query_list, max_results_per_query, len(excluded_urls))
+
+        all_results = self._search_queries(search_engine, query_list, max_results_per_query, sites,
+                                           excluded_urls, include_raw_content, deadline)
+        self._log_search_stats(search_engine)
+
+        if include_raw_content and all_results:
+            # rank-then-fetch: il re-ranking finale (con page_length) avviene solo sulla shortlist scaricata
+            all_results = self._fetch_full_contents(all_results, max_filtered_results, research_query, deadline)
+
+        return self._select_top_results(all_results, max_filtered_results, include_raw_content, research_query)
+
+    async def aexecute_search(self, query_list: list[str],
+                              max_filtered_results: int,
+                              max_results_per_query: int,
+                              include_raw_content: bool = False,
+                              exclude_sources: Optional[List[SearchEngResult]] = None,
+                              sites: Optional[List[str]] = None,
+                              seen_urls: Optional[Set[str]] = None,
+                              research_query: Optional[str] = None,
+                              additional_params=None) -> List[SearchEngResult]:
+        """Versione asyncio di execute_search: le query sono cercate in parallelo e i fetch partono
+        man mano che arrivano i risultati, con limiti di concorrenza globali e per host."""
+        if include_raw_content:
+            await asyncio.to_thread(self._wait_for_extraction_pools)
+        deadline = time.monotonic() + self._configuration.search_deadline
+        # la creazione del motore può aprire il rate limiter su SQLite: fuori dall'event loop
+        search_engine = await asyncio.to_thread(self._get_search_engine)
+        # domanda di ricerca per la pertinenza: di default la prima query, che nel grafo è state.query
+        research_query = research_query or (query_list[0] if query_list else None)
+        excluded_urls = self._excluded_urls(exclude_sources, seen_urls)
+        max_results_per_query = self._results_per_query(query_list, max_results_per_query, len(excluded_urls))
+
+        async def search(query: str) -> List[SearchEngResult]:
+            query_results = await search_engine.asearch(query, max_results=max_results_per_query, sites=sites)
+            return self._prepare_results(query, query_results, excluded_urls, include_raw_content)
+
+        search_tasks = {asyncio.create_task(search(query)): query for query in query_list}
+        results_by_query = {}
+        fetch_tasks = {}
+        fetched_by_url = {}
+        accepted = 0
+        accepted_index = self._new_near_duplicate_index()
+        factor = max(1.0, self._configuration.fetch_overprovision_factor)
+        try:
+            while search_tasks or fetch_tasks:
+                done, _ = await asyncio.wait(set(search_tasks) | set(fetch_tasks),
+                                             timeout=max(0.0, deadline - time.monotonic()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # scadenza del passo: si usa quanto già raccolto, il resto viene annullato
+                    if search_tasks:
+                        logger.warning(f"Warning: search deadline expired before {len(search_tasks)} "
+                                       f"queries completed")
+                    self._log_deadline_expired(fetch_tasks.values())
+                    break
+                for task in done:
+                    if task in search_tasks:
+                        query_results = results_by_query[search_tasks.pop(task)] = task.result()
+                        # contenuti già forniti dal motore: nessun fetch per questi URL
+                        for url, fetched in self._engine_contents(query_results).items():
+                            if url not in fetched_by_url:
+                                fetched_by_url[url] = fetched
+                                if self._accept_fetched(url, fetched, accepted_index):
+                                    accepted += 1
+                    else:
+                        fetched = task.result()
+                        url = fetch_tasks.pop(task)
+                        fetched_by_url[url] = fetched
+                        if self._accept_fetched(url, fetched, accepted_index):
+                            accepted += 1
+
+                missing = max_filtered_results - accepted
+                if not include_raw_content or missing <= 0:
+                    continue
+                # rank-then-fetch sui risultati arrivati finora: i candidati migliori non ancora
+                # scaricati entrano nella coda di fetch, con il consueto margine di over-provisioning
+                seen = [r for query in query_list for r in results_by_query.get(query, [])]
+                if not seen:
+                    continue
+                in_progress = {dedup_url(url) for url in list(fetched_by_url) + list(fetch_tasks.values())}
+                queue = [url for url in self._fetch_order(self._rank_search_results(seen, len(seen),
+                                                                                     include_raw_content=False,
+                                                                                     research_query=research_query))
+                         if dedup_url(url) not in in_progress]
+                while len(fetch_tasks) < math.ceil(missing * factor):
+                    url = self._next_fetch_url(queue, fetch_tasks.values())
+                    if url is None:
+                        break
+                    fetch_tasks[asyncio.create_task(self._afetch_raw_content(url))] = url
+        finally:
+            for task in list(search_tasks) + list(fetch_tasks):
+                task.cancel()
+
+        # ordine deterministico: risultati nell'ordine delle query, come nel percorso sincrono
+        all_results = [r for query in query_list for r in results_by_query.get(query, [])]
+        self._log_search_stats(search_engine)
+        if include_raw_content and all_results:
+            self._log_fetch_stats(fetched_by_url, max_filtered_results, all_results)
+            all_results = self._apply_fetched(all_results, fetched_by_url)
+
+        # ranking e salvataggio opzionale dei candidati (ranking_record_dir) su file: fuori dall'event loop
+        return await asyncio.to_thread(self._select_top_results, all_results, max_filtered_results,
+                                       include_raw_content, research_query)
+
+    def _search_queries(self, search_engine: BaseSearchEngine, query_list: list[str], max_results_per_query: int,
+                        sites: Optional[List[str]], excluded_urls: Set[str],
+                        include_raw_content: bool, deadline: float) -> List[SearchEngResult]:
+        """Cerca tutte le query in parallelo: l'unico a distanziare le chiamate è il rate limiter del motore.
+        I risultati sono restituiti nell'ordine delle query, indipendentemente dall'ordine di arrivo."""
+        results_by_query = {}
+        # executor condiviso e di lunga durata: i client per thread dei motori (es. DDGS) restano tra un passo e l'altro
+        executor = get_search_executor()
+        own_executor = None
+        if isinstance(search_engine, MultiSearchEngine):
+            # la ricerca multi attende i motori, che girano nell'executor condiviso: i suoi thread di coordinamento
+            # sono a parte, altrimenti con molte query occuperebbero tutti i worker e i motori resterebbero in coda
+            executor = own_executor = ThreadPoolExecutor(max_workers=max(1, len(query_list)),
+                                                        thread_name_prefix="multi")
+        try:
+            pending = {executor.submit(search_engine.search, query, max_results=max_results_per_query,
+                                       sites=sites): query
+                       for query in query_list}
+            while pending:
+                done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    logger.warning(f"Warning: search deadline expired before {len(pending)} queries completed")
+                    break
+                for future in done:
+                    query = pending.pop(future)
+                    results_by_query[query] = self._prepare_results(query, future.result(), excluded_urls,
+                                                                    include_raw_content)
+        finally:
+            self._abandon(pending, own_executor)
+        return [r for query in query_list for r in results_by_query.get(query, [])]
+
+    def _abandon(self, pending, executor: Optional[ThreadPoolExecutor] = None,
+                 cancel: Optional[threading.Event] = None) -> None:
+        """Annulla i task del passo non ancora partiti e lascia proseguire quelli in corso, che close() attenderà;
+        chiude l'`executor` del passo, se ne ha uno proprio. Con `cancel` i task in corso si fermano al prossimo
+        controllo di _raise_if_abandoned, senza occupare slot degli host e browser fino alla fine del fetch."""
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if cancel is not None:
+            cancel.set()
+        running = [future for future in pending if not future.cancel()]
+        if running:
+            with self._abandoned_lock:
+                self._abandoned_futures = [f for f in self._abandoned_futures if not f.done()] + running
 
-        search_engine: BaseSearchEngine = self._create_search_engine()
+    def _raise_if_abandoned(self, cancel: Optional[threading.Event]) -> None:
+        if self._closed.is_set() or (cancel is not None and cancel.is_set()):
+            raise FetchAbandoned()
 
-        all_results: List[SearchEngResult] = []
-        exclude_sources = exclude_sources or []
+    def _wait_for_extraction_pools(self) -> None:
+        # con spawn l'avvio a freddo dei processi di estrazione dura anche secondi: la scadenza del passo
+        # parte con i pool già pronti (attesa solo al primo passo con contenuto completo)
+        self._html_pool.warm_up()
+        self._pdf_pool.warm_up()
+        timeout = self._configuration.fetch_extraction_timeout
+        if not (self._html_pool.wait_ready(timeout) and self._pdf_pool.wait_ready(timeout)):
+            logger.warning(f"Warning: extraction pools not ready after {timeout}s")
 
+    @staticmethod
+    def _excluded_urls(exclude_sources: Optional[List[SearchEngResult]], seen_urls: Optional[Set[str]]) -> Set[str]:
+        """Chiavi dedup_url delle pagine da escludere: l'indice `seen_urls` più le fonti passate esplicitamente."""
+        excluded = set(seen_urls) if seen_urls else set()
+        excluded.update(dedup_url(r['url']) for r in exclude_sources or [])
+        return excluded
+
+    @staticmethod
+    def _results_per_query(query_list: list[str], max_results_per_query: int, num_exclusions: int) -> int:
         num_queries = len(query_list)
-        num_exclusions = len(exclude_sources)
         if num_exclusions > 0:
             delta_per_query = math.ceil(num_exclusions / num_queries)
             max_results_per_query = max_results_per_query + delta_per_query
+        return max_results_per_query
 
-        for query in query_list:
-            all_query_results: List[SearchEngResult] = search_engine.search(query,
-                                                                            max_results=max_results_per_query,
-                                                                            sites=sites)
-            filtered_results = [r for r in all_query_results
-                                if not any(exclude_result['url'] == r['url'] for exclude_result in exclude_sources)]
+    def _prepare_results(self, query: str, query_results: List[SearchEngResult],
+                         excluded_urls: Set[str], include_raw_content: bool) -> List[SearchEngResult]:
+        # stessa pagina anche con schema, www., slash finale, parametri utm_* o variante AMP diversi
+        filtered_results = [r for r in query_results if dedup_url(r['url']) not in excluded_urls]
 
-            for r in filtered_results:
-                r['query'] = query
+        for r in filtered_results:
+            r['query'] = query
+            if self._search_api != "multi":
+                # in modalità multi il campo riporta già i motori che hanno contribuito
                 r['search_engine'] = self._search_api
-                r['full_content'] = ""
-
-            if include_raw_content:
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = [executor.submit(process_result, r) for r in filtered_results]
-                processed_results = [future.result() for future in as_completed(futures)]
-                processed_results = [r for r in processed_results
-                                     if r['full_content'] is not None and len(r['full_content'].split()) > 30]
-                all_results.extend(processed_results)
-            else:
-                all_results.extend(filtered_results)
+            # il contenuto completo fornito dal motore (es. raw content di Tavily) si tiene solo se serve
+            r['full_content'] = (r.get('full_content') or "")[:self._char_budget] if include_raw_content else ""
+            r['fetch_tier'] = None
+        return filtered_results
 
-        if len(all_results) <= 1:
-            return all_results
+    def _engine_contents(self, results: List[SearchEngResult]) -> dict:
+        """Risultati per URL il cui contenuto completo è già arrivato dal motore di ricerca."""
+        return {r['url']: FetchResult(r['full_content'], "engine")
+                for r in results if self._is_usable_content(r['full_content'])}
 
-        top_results = self._rank_search_results(all_results, max_filtered_results, include_raw_content)
+    def _select_top_results(self, all_results: List[SearchEngResult], max_filtered_results: int,
+                            include_raw_content: bool, research_query: Optional[str] = None) -> List[SearchEngResult]:
+        if len(all_results) <= 1:
+            top_results = all_results
+        else:
+            if self._configuration.ranking_record_dir:
+                self._record_ranking_input(all_results, include_raw_content, research_query)
+            # con il controllo dei quasi-duplicati servono anche i candidati oltre il taglio, per i rimpiazzi
+            top_n = len(all_results) if self._near_duplicates is not None else max_filtered_results
+            top_results = self._rank_search_results(all_results, top_n, include_raw_content, research_query)
+        if self._near_duplicates is not None:
+            top_results = self._collapse_near_duplicates(top_results, max_filtered_results, include_raw_content)
         return top_results[:max_filtered_results]
 
+    def _new_near_duplicate_index(self) -> Optional[NearDuplicateIndex]:
+        if self._near_duplicates is None:
+            return None
+        return NearDuplicateIndex(self._configuration.near_duplicate_max_distance)
+
+    def _near_duplicate_of(self, fingerprint: Optional[int], url: str,
+                           step_index: NearDuplicateIndex) -> Optional[str]:
+        """Fonte già selezionata (nella sessione o in questo passo) quasi uguale al testo di `url`. Non conta
+        solo lo stesso identico URL, già selezionato in un ciclo precedente: escluderlo è compito di seen_urls;
+        le sue varianti (vedi dedup_url) invece sono duplicati."""
+        return self._near_duplicates.find(fingerprint, exclude=url) or step_index.find(fingerprint, exclude=url)
+
+    def _collapse_near_duplicates(self, ranked: List[SearchEngResult], max_filtered_results: int,
+                                  include_raw_content: bool) -> List[SearchEngResult]:
+        """Scorre i risultati in ordine di rank scartando i quasi-duplicati di fonti già scelte, sul contenuto
+        completo se scaricato, altrimenti sullo snippet; le fonti scelte entrano nell'indice di sessione."""
+        step_index = NearDuplicateIndex(self._configuration.near_duplicate_max_distance)
+        selected = []
+        for r in ranked:
+            if len(selected) >= max_filtered_results:
+                break
+            fingerprint = simhash(r['full_content'] if include_raw_content else r['snippet'])
+            duplicate_of = self._near_duplicate_of(fingerprint, r['url'], step_index)
+            if duplicate_of is not None:
+                logger.info(f"Skipping {r['url']}: near-duplicate of {duplicate_of}")
+                continue
+            step_index.add(fingerprint, r['url'])
+            selected.append((r, fingerprint))
+        for r, fingerprint in selected:
+            self._near_duplicates.add(fingerprint, r['url'])
+        return [r for r, _ in selected]
+
+    def _record_ranking_input(self, results: List[SearchEngResult], include_raw_content: bool,
+                              research_query: Optional[str]) -> None:
+        """Salva i candidati del ranking per il benchmark offline (benchmarks/bench_relevance.py)."""
+        directory = self._configuration.ranking_record_dir
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"research_query": research_query, "include_raw_content": include_raw_content,
+                           "results": results, "relevant": []}, f, ensure_ascii=False, indent=1)
+        except OSError as e:
+            logger.warning(f"Warning: could not record the ranking input: {e}")
+
+    @staticmethod
+    def _is_usable_content(content: Optional[str]) -> bool:
+        return content is not None and len(content.split()) > MIN_CONTENT_WORDS
+
+    def _accept_fetched(self, url: str, fetched: FetchResult, accepted_index: Optional[NearDuplicateIndex]) -> bool:
+        """True se la pagina conta tra quelle che servono: utilizzabile e non quasi uguale a una già accettata
+        in questo passo o nella sessione. I quasi-duplicati non fermano i fetch, perché verranno scartati nel
+        ranking finale."""
+        if not self._is_usable_content(fetched.content):
+            return False
+        if accepted_index is None:
+            return True
+        fingerprint = simhash(fetched.content)
+        if self._near_duplicate_of(fingerprint, url, accepted_index) is not None:
+            logger.debug(f"Fetched {url} is a near-duplicate of an accepted page")
+            return False
+        accepted_index.add(fingerprint, url)
+        return True
+
+    def _fetch_full_contents(self, results: List[SearchEngResult], needed: int, research_query: Optional[str],
+                             deadline: float) -> List[SearchEngResult]:
+        # 1. ranking sui soli snippet per stabilire l'ordine di fetch degli URL (univoci)
+        snippet_ranked = self._rank_search_results(results, len(results), include_raw_content=False,
+                                                   research_query=research_query)
+        queue = self._fetch_order(snippet_ranked)
+        factor = max(1.0, self._configuration.fetch_overprovision_factor)
+
+        # 2. fetch in ordine di rank, con un piccolo margine di fetch in parallelo,
+        #    fermandosi appena ci sono abbastanza pagine che superano il filtro di qualità.
+        #    Lo stesso URL restituito da più query viene scaricato una sola volta.
+        fetched_by_url = self._engine_contents(results)
+        accepted_index = self._new_near_duplicate_index()
+        accepted = sum(self._accept_fetched(url, fetched, accepted_index) for url, fetched in fetched_by_url.items())
+        fetched_keys = {dedup_url(url) for url in fetched_by_url}
+        queue = [url for url in queue if dedup_url(url) not in fetched_keys]
+        pending = {}
+        executor = ThreadPoolExecutor(max_workers=self._configuration.fetch_max_concurrency)
+        # segnale di interruzione dei fetch di questo passo, dato alla scadenza
+        cancel = threading.Event()
+        try:
+            while True:
+                missing = needed - accepted
+                while missing > 0 and len(pending) < math.ceil(missing * factor):
+                    url = self._next_fetch_url(queue, pending.values())
+                    if url is None:
+                        break
+                    pending[executor.submit(self._fetch_raw_content, url, deadline, cancel)] = url
+                if not pending:
+                    break
+                done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    self._log_deadline_expired(pending.values())
+                    break
+                for future in done:
+                    fetched = future.result()
+                    url = pending.pop(future)
+                    fetched_by_url[url] = fetched
+                    if self._accept_fetched(url, fetched, accepted_index):
+                        accepted += 1
+        finally:
+            # alla scadenza non si attendono i fetch ancora in corso: si restituisce quanto già scaricato
+            self._abandon(pending, executor, cancel)
+
+        self._log_fetch_stats(fetched_by_url, needed, snippet_ranked)
+        return self._apply_fetched(results, fetched_by_url)
+
+    def _fetch_order(self, ranked: List[SearchEngResult]) -> List[str]:
+        """URL univoci in ordine di rank (una sola variante per pagina, vedi dedup_url), esclusi quelli nella
+        cache negativa; gli host che hanno già fallito (circuito ancora chiuso) scendono in fondo alla coda."""
+        by_page = {}
+        for r in ranked:
+            by_page.setdefault(dedup_url(r['url']), r['url'])
+        urls = list(by_page.values())
+        if self._negative_cache is None:
+            return urls
+        allowed = []
+        for url in urls:
+            reason = self._negative_cache.blocked_reason(url)
+            if reason is None:
+                allowed.append(url)
+            else:
+                logger.debug(f"Skipping {url}: {reason}")
+        return sorted(allowed, key=lambda url: self._negative_cache.host_failures(url) > 0)
+
+    def _next_fetch_url(self, queue: List[str], in_flight) -> Optional[str]:
+        """Estrae dalla coda (in ordine di rank) il primo URL di un host con slot liberi, così i fetch
+        si alternano tra host diversi; se tutti gli host sono occupati, il primo in ordine di rank."""
+        if not queue:
+            return None
+        busy = Counter(HostScheduler.host(url) for url in in_flight)
+        for i, url in enumerate(queue):
+            if busy[HostScheduler.host(url)] < self._configuration.fetch_max_per_host:
+                return queue.pop(i)
+        return queue.pop(0)
+
+    def _record_fetch_outcome(self, url: str, fetched: FetchResult) -> None:
+        if self._negative_cache is None or fetched.tier == "cache":
+            return
+        if self._is_usable_content(fetched.content):
+            self._negative_cache.record_success(url)
+        else:
+            self._negative_cache.record_failure(url, fetched.error or "extraction")
+
+    def _log_deadline_expired(self, urls) -> None:
+        for url in urls:
+            logger.warning(f"Warning: search deadline ({self._configuration.search_deadline}s) expired "
+                           f"while fetching {url}")
+
+    def _log_search_stats(self, search_engine: BaseSearchEngine) -> None:
+        engines = [search_engine]
+        if isinstance(search_engine, MultiSearchEngine):
+            logger.info(f"Multi search stats: {search_engine.stats}")
+            engines = search_engine.engines
+        for engine in engines:
+            if engine.rate_limiter is not None:
+                logger.info(f"{engine.name} rate limiter stats: {engine.rate_limiter.stats}")
+        if self._search_cache is not None:
+            logger.info(f"Search cache stats: {self._search_cache.stats}")
+
+    def _log_fetch_stats(self, fetched_by_url: dict, needed: int, candidates: List[SearchEngResult]) -> None:
+        logger.info(f"Fetched {len(fetched_by_url)} URLs for {needed} needed results "
+                    f"({len({r['url'] for r in candidates})} candidates), "
+                    f"tiers: {dict(Counter(f.tier for f in fetched_by_url.values()))}")
+        if self._content_cache is not None:
+            logger.info(f"Content cache stats: {self._content_cache.stats}")
+        if self._negative_cache is not None:
+            logger.info(f"Negative cache stats: {self._negative_cache.stats}")
+        logger.info(f"Host scheduler stats: {self._host_scheduler.stats}")
+        logger.info(f"HTML extraction stats: {self._html_pool.stats}")
+
+    def _apply_fetched(self, results: List[SearchEngResult], fetched_by_url: dict) -> List[SearchEngResult]:
+        # le righe duplicate restano (con la propria query) per il calcolo di url_frequency nel re-ranking;
+        # le varianti dello stesso URL ricevono il contenuto scaricato una volta sola
+        fetched_by_page = {dedup_url(url): fetched for url, fetched in fetched_by_url.items()}
+        shortlist: List[SearchEngResult] = []
+        for r in results:
+            fetched = fetched_by_page.get(dedup_url(r['url']))
+            if fetched is None or not self._is_usable_content(fetched.content):
+                continue
+            r['full_content'] = fetched.content
+            r['fetch_tier'] = fetched.tier
+            shortlist.append(r)
+        return shortlist
+
+    def _get_search_engine(self) -> BaseSearchEngine:
+        if self._search_engine is None:
+            self._search_engine = self._create_search_engine()
+        return self._search_engine
+
     def _create_search_engine(self) -> BaseSearchEngine:
-        if self._search_api == "google":
-            return GoogleSearchEngine()
-        elif self._search_api == "duckduckgo":
-            return DuckDuckGoSearchEngine()
-        elif self._search_api == "tavily":
-            return TavilySearchEngine()
+        if self._search_api == "multi":
+            # cache per singolo motore: un motore in ritardo non invalida i risultati degli altri
+            return MultiSearchEngine([self._create_cached_search_engine(name)
+                                      for name in dict.fromkeys(self._configuration.multi_search_engines)],
+                                     engine_deadline=self._configuration.multi_engine_deadline,
+                                     rrf_k=self._configuration.rrf_k)
+        return self._create_cached_search_engine(self._search_api)
+
+    def _create_cached_search_engine(self, search_api: str) -> BaseSearchEngine:
+        engine = self._create_base_search_engine(search_api)
+        if self._search_cache is None:
+            return engine
+        return CachedSearchEngine(engine, self._search_cache)
+
+    def _create_base_search_engine(self, search_api: str) -> BaseSearchEngine:
+        # con rate_limit_shared il bucket è su SQLite, condiviso da tutti i processi sulla stessa macchina
+        rate_limit_path = self._configuration.rate_limit_path if self._configuration.rate_limit_shared else None
+        if search_api == "google":
+            return GoogleSearchEngine(session=self._sessions.session("google"), rate_limit_path=rate_limit_path)
+        elif search_api == "duckduckgo":
+            return DuckDuckGoSearchEngine(rate_limit_path=rate_limit_path)
+        elif search_api == "tavily":
+            # il raw content serve solo quando si usa il contenuto completo delle pagine
+            return TavilySearchEngine(session=self._sessions.session("tavily"), rate_limit_path=rate_limit_path,
+                                      include_raw_content=self._configuration.tavily_raw_content
+                                      and self._configuration.fetch_full_page)
         else:
             raise ValueError("Invalid search engine name")
 
-    @staticmethod
-    def _fetch_pdf(url: str) -> bytes:
-        with sync_playwright() as p:
-            browser = p.chromium.launch()
-            page = browser.new_page()
+    def _fetch_pdf(self, url: str, deadline: float, cancel: Optional[threading.Event] = None) -> str:
+        """Scarica il PDF tramite il browser e restituisce il percorso del file temporaneo (da rimuovere)."""
+        def download(page: Page) -> str:
+            # un task rimasto in coda nel pool di un fetch ormai abbandonato non occupa il browser
+            self._raise_if_abandoned(cancel)
+            timeout_ms = self._remaining(deadline) * 1000
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+                temp_file_path = tmp_file.name
             try:
-                with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                    temp_file_path = tmp_file.name
-
-                with page.expect_download() as download_info:
-                    page.goto(url)
+                with page.expect_download(timeout=timeout_ms) as download_info:
+                    page.goto(url, timeout=timeout_ms)
                     download = download_info.value
                     download.save_as(temp_file_path)
-                    with open(temp_file_path, 'rb') as f:
-                        pdf_bytes = f.read()
-                        return pdf_bytes
-            finally:
-                browser.close()
-                if temp_file_path and os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
+                    return temp_file_path
+            except Exception:
+                os.remove(temp_file_path)
+                raise
+
+        return self._browser_pool.run(download, timeout=self._remaining(deadline) + BROWSER_QUEUE_GRACE)
+
+    def _load_html(self, page: Page, url: str, deadline: float) -> str:
+        return load_html(page, url, self._remaining(deadline), lean=self._configuration.browser_lean_profile)
+
+    @staticmethod
+    def _html_to_markdown(html) -> str:
+        return html_to_markdown(html)
+
+    @staticmethod
+    def _is_challenge(html) -> bool:
+        if isinstance(html, str):
+            html = html.encode("utf-8", errors="ignore")
+        head = html[:MARKER_SCAN_BYTES].decode("utf-8", errors="ignore").lower()
+        return any(marker in head for marker in CHALLENGE_MARKERS)
 
+    @staticmethod
+    def _static_failure_kind(response: Optional[HttpResponse]) -> Optional[str]:
+        # motivo per cui la risposta statica non basta, usato se fallisce anche il browser
+        if response is None:
+            return None
+        if response.status_code >= 500:
+            return "http_5xx"
+        if response.status_code >= 400:
+            return "http_4xx"
+        if SearchSystem._is_challenge(response.content):
+            return "challenge"
+        return None
+
+    def _failure_kind(self, error: Exception) -> str:
+        if isinstance(error, FetchFailed):
+            return error.kind
+        stage = self._timeout_stage(error)
+        if stage == "extraction":
+            return "extraction"
+        if stage is not None:
+            return "timeout"
+        return "error"
+
+    @staticmethod
+    def _needs_browser(html: bytes, text: str) -> bool:
+        # il testo estratto dalla risposta statica non è utilizzabile: pagina vuota o troppo corta
+        words = len(text.split()) if text else 0
+        if words < MIN_STATIC_WORDS:
+            return True
+        head = html[:MARKER_SCAN_BYTES].decode("utf-8", errors="ignore").lower()
+        # pagine di challenge anti-bot
+        if SearchSystem._is_challenge(html):
+            return True
+        # guscio JS-only: il <noscript> chiede di abilitare JavaScript e il testo è scarno
+        if "<noscript" in head and "javascript" in head and words < NOSCRIPT_SHELL_MAX_WORDS:
+            return True
+        return False
 
     @staticmethod
-    def _fetch_raw_content(url: str) -> Optional[str]:
+    def _remaining(deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise FetchTimeout("total")
+        return remaining
+
+    def _request_timeout(self, deadline: float) -> Tuple[float, float]:
+        # (connect, first byte): requests applica il secondo valore a ogni lettura dal socket
+        remaining = self._remaining(deadline)
+        return (min(self._configuration.fetch_connect_timeout, remaining),
+                min(self._configuration.fetch_first_byte_timeout, remaining))
+
+    @staticmethod
+    def _timeout_stage(error: Exception) -> Optional[str]:
+        if isinstance(error, FetchTimeout):
+            return error.stage
+        if isinstance(error, (requests.ConnectTimeout, httpx.ConnectTimeout)):
+            return "connect"
+        if isinstance(error, (requests.ReadTimeout, httpx.ReadTimeout)):
+            return "first_byte"
+        if isinstance(error, (PdfExtractionTimeout, HtmlExtractionTimeout)):
+            return "extraction"
+        # asyncio.TimeoutError coincide con TimeoutError solo da Python 3.11
+        if isinstance(error, (PlaywrightTimeoutError, TimeoutError, asyncio.TimeoutError)):
+            return "total"
+        return None
+
+    def _read_capped(self, response: requests.Response, max_bytes: int, deadline: float) -> HttpResponse:
+        # legge il corpo in streaming fermandosi al limite di byte o alla scadenza del tempo totale
+        chunks = []
+        size = 0
+        truncated = False
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            self._remaining(deadline)
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                truncated = True
+                break
+        return HttpResponse(status_code=response.status_code, headers=response.headers,
+                            content=b"".join(chunks)[:max_bytes], truncated=truncated)
+
+    def _http_get(self, url: str, deadline: float, headers: Optional[dict] = None) -> HttpResponse:
+        with self._http_session.get(url, headers=headers, allow_redirects=True, stream=True,
+                                    timeout=self._request_timeout(deadline)) as response:
+            self._note_retry_after(url, response.status_code, response.headers)
+            is_pdf = self._is_pdf(url, response.headers.get("Content-Type", ""))
+            return self._read_capped(response, self._pdf_max_bytes if is_pdf else STATIC_MAX_BYTES, deadline)
+
+    def _note_retry_after(self, url: str, status_code: int, headers: Mapping[str, str]) -> None:
+        if status_code in RETRY_AFTER_STATUS_CODES:
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                self._host_scheduler.defer(url, retry_after)
+
+    def _robots_crawl_delay(self, url: str) -> Optional[float]:
+        """Crawl-delay indicato da robots.txt per il nostro user agent (o per "*"), se presente."""
+        parts = urlsplit(url)
         try:
-            session = requests.Session()
-            session.verify = False
-            session.mount("https://", SSLIgnoreAdapter())
-            try:
-                head_resp = session.head(url, allow_redirects=True)
-                content_type = head_resp.headers.get("Content-Type", "")
-            except:
-                content_type = ""
-
-            if url.lower().endswith(".pdf") or "application/pdf" in content_type:
-                try:
-                    scraper = cloudscraper.create_scraper()  # crea un sessione che esegue JS-challenge
-                    scraper.mount("https://", SSLIgnoreAdapter())
-                    response = scraper.get(url, verify=False)
-                    pdf_bytes = response.content
-                    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-                except Exception as e:
-                    pdf_bytes = SearchSystem._fetch_pdf(url)
-                    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-                with lock:
-                    # da eseguire in mutua esclusione
-                    testo = pymupdf4llm.to_markdown(doc)
-                    return testo.strip() if testo else "[Nessun testo estraibile dal PDF]"
-
-            # Create a client with reasonable timeout
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)  # headless=False per vedere il browser
-                context = browser.new_context(
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-                    viewport={"width": 1280, "height": 800},
-                    java_script_enabled=True,
-                )
-                page = context.new_page()
-                page.goto(url, wait_until="networkidle", timeout=60 * 1000)  # 60 sec.
-                # html = page.content()
-                html = page.inner_html("body")
-                doc = Document(html)
-                contenuto_html = doc.summary()
-                return markdownify(contenuto_html)
+            response = self._http_session.get(f"{parts.scheme}://{parts.netloc}/robots.txt", timeout=ROBOTS_TIMEOUT)
+            if not response.ok:
+                return None
+            parser = RobotFileParser()
+            parser.parse(response.text.splitlines())
+            delay = parser.crawl_delay(self._http_session.headers["User-Agent"])
+            return float(delay) if delay is not None else None
         except Exception as e:
-            logger.warning(f"Warning: Failed to fetch full page content for {url}: {str(e)}")
+            logger.debug(f"Cannot read robots.txt for {parts.netloc}: {e}")
             return None
 
-    def _rank_search_results(self, results: List[SearchEngResult], top_n: int,
-                             include_raw_content: bool) -> List[SearchEngResult]:
-        df = pd.DataFrame(results)
-        df['desc_length'] = df['snippet'].str.len()
+    @staticmethod
+    def _is_pdf(url: str, content_type: str) -> bool:
+        return urlsplit(url).path.lower().endswith(".pdf") or "application/pdf" in content_type
 
-        numeric_cols = ['position', 'desc_length']
-        if include_raw_content:
-            df['page_length'] = df['full_content'].str.len()
-            numeric_cols.append('page_length')
+    @staticmethod
+    def _pdf_page_range(url: str) -> Optional[Tuple[int, Optional[int]]]:
+        # i link a PDF del tipo "documento.pdf#page=12" indicano la pagina rilevante
+        match = re.search(r"(?:^|&)page=(\d+)", urlsplit(url).fragment)
+        if match is None:
+            return None
+        return max(0, int(match.group(1)) - 1), None
+
+    def _extract_pdf(self, url: str, source, cancel: Optional[threading.Event] = None) -> str:
+        # estrazione nel pool di processi, pagina per pagina fino al budget di caratteri della fonte
+        self._raise_if_abandoned(cancel)
+        return self._pdf_pool.extract(source, max_chars=self._char_budget, page_range=self._pdf_page_range(url))
 
-        url_counts = Counter(df['url'])
-        df['url_frequency'] = df['url'].map(url_counts)
+    def _fetch_pdf_content(self, url: str, response: Optional[HttpResponse], deadline: float,
+                           cancel: Optional[threading.Event] = None) -> FetchResult:
+        # un PDF troncato dal limite di download viene comunque aperto: MuPDF ricostruisce le pagine leggibili
+        if response is not None and response.ok and response.content.startswith(b"%PDF"):
+            return FetchResult(self._extract_pdf(url, response.content, cancel), "pdf_http")
 
-        scaler = MinMaxScaler()
-        df_scaled = df.copy()
+        pdf_bytes = None
+        try:
+            scraper = self._sessions.scraper()  # sessione che esegue JS-challenge
+            with scraper.get(url, verify=False, stream=True,
+                             timeout=self._request_timeout(deadline)) as scraper_response:
+                content = self._read_capped(scraper_response, self._pdf_max_bytes, deadline).content
+            if content.startswith(b"%PDF"):
+                pdf_bytes = content
+        except FetchTimeout:
+            raise
+        except Exception as e:
+            logger.debug(f"PDF download with cloudscraper failed for {url}: {e}")
+        if pdf_bytes is not None:
+            return FetchResult(self._extract_pdf(url, pdf_bytes, cancel), "pdf_http")
 
-        if not df[numeric_cols].empty:
-            df_scaled[numeric_cols] = scaler.fit_transform(df[numeric_cols])
+        # il worker apre direttamente il file scaricato dal browser
+        pdf_path = self._fetch_pdf(url, deadline, cancel)
+        try:
+            return FetchResult(self._extract_pdf(url, pdf_path, cancel), "pdf_browser")
+        finally:
+            os.remove(pdf_path)
 
-        max_freq = df['url_frequency'].max()
-        df_scaled['url_frequency_norm'] = df['url_frequency'] / max_freq if max_freq > 0 else 0
+    def _fetch_from_response(self, url: str, response: Optional[HttpResponse], deadline: float,
+                             cancel: Optional[threading.Event] = None) -> FetchResult:
+        content_type = response.headers.get("Content-Type", "") if response is not None else ""
+        if self._is_pdf(url, content_type):
+            return self._fetch_pdf_content(url, response, deadline, cancel)
 
-        # 3.1 Inverti il valore della posizione (rank più basso è migliore)
-        df_scaled['position_score'] = 1 - df_scaled['position']
+        if response is not None and response.status_code in GONE_STATUS_CODES:
+            # pagina inesistente: il browser otterrebbe la stessa risposta
+            raise FetchFailed("http_4xx", f"HTTP {response.status_code}")
+        if response is not None and response.ok and (not content_type or "html" in content_type):
+            # passiamo i bytes: readability rileva la codifica dal meta charset
+            self._raise_if_abandoned(cancel)
+            text = self._html_pool.extract(response.content)
+            if not self._needs_browser(response.content, text):
+                return FetchResult(text, "http")
 
-        # 3.2 Calcola punteggio per lunghezza descrizione (preferibilmente non troppo corta né troppo lunga)
-        # Questo crea una curva a campana con picco a 0.5
-        df_scaled['desc_length_score'] = 1 - 2 * np.abs(df_scaled['desc_length'] - 0.5)
+        self._raise_if_abandoned(cancel)
 
-        if include_raw_content:
-            # 3.3 Calcola punteggio per lunghezza pagina
-            # Assumiamo che pagine più lunghe abbiano più contenuto, ma non troppo lunghe
-            df_scaled['page_length_score'] = np.where(
-                df_scaled['page_length'] <= 0.7,
-                df_scaled['page_length'],
-                0.7 - 0.3 * (df_scaled['page_length'] - 0.7) / 0.3
-            )
-
-            # 4. Calcolo dello score composito con pesi
-            # Ora includiamo la frequenza dell'URL tra le query
-            df_scaled['final_score'] = (
-                    0.4 * df_scaled['position_score'] +  # La posizione originale è importante
-                    0.2 * df_scaled['page_length_score'] +  # La lunghezza della pagina è abbastanza importante
-                    0.15 * df_scaled['desc_length_score'] +  # La lunghezza della descrizione è meno importante
-                    0.25 * df_scaled['url_frequency_norm']  # Premiamo i risultati che appaiono in più query
-            )
+        def load(page: Page) -> str:
+            self._raise_if_abandoned(cancel)
+            return self._load_html(page, url, deadline)
+
+        try:
+            html = self._browser_pool.run(load, timeout=self._remaining(deadline) + BROWSER_QUEUE_GRACE)
+        except Exception as e:
+            static_failure = self._static_failure_kind(response)
+            if static_failure is not None and self._timeout_stage(e) is None:
+                raise FetchFailed(static_failure, str(e)) from e
+            raise
+        self._raise_if_abandoned(cancel)
+        text = self._html_pool.extract(html)
+        if self._is_challenge(html) and len(text.split()) < MIN_STATIC_WORDS:
+            # anche il browser riceve solo la pagina di challenge
+            raise FetchFailed("challenge", "challenge page served to the browser")
+        return FetchResult(text, "browser")
+
+    def _fetch_raw_content(self, url: str, deadline: Optional[float] = None,
+                           cancel: Optional[threading.Event] = None) -> FetchResult:
+        """Fetch a livelli: cache su disco, GET HTTP statica con la sessione condivisa, Playwright solo se necessario.
+
+        L'esito (successo o tipo di errore) aggiorna la cache negativa. Con `cancel` impostato (scadenza del
+        passo) il fetch si interrompe al prossimo controllo.
+        """
+        start_time = time.perf_counter()
+        try:
+            fetched = self._fetch_content(url, deadline, cancel)
+        except Exception as e:
+            if isinstance(e, FetchAbandoned) or self._closed.is_set() or (cancel is not None and cancel.is_set()):
+                # fetch abbandonato alla scadenza del passo: non è un errore dell'URL
+                logger.debug(f"Fetch of {url} abandoned")
+                return FetchResult(None, None, "abandoned")
+            if self._timeout_stage(e) == "deadline":
+                # slot dell'host non concesso entro la scadenza del passo: nemmeno questo è un errore dell'URL
+                logger.debug(f"Fetch of {url} not started before the search deadline")
+                return FetchResult(None, None, "deadline")
+            self._log_fetch_failure(url, e, time.perf_counter() - start_time)
+            fetched = FetchResult(None, None, self._failure_kind(e))
+        self._record_fetch_outcome(url, fetched)
+        logger.debug(f"Fetched {url} in {time.perf_counter() - start_time:.2f}s")
+        return fetched
+
+    def _fetch_content(self, url: str, deadline: Optional[float] = None,
+                       cancel: Optional[threading.Event] = None) -> FetchResult:
+        cached = self._content_cache.get(url) if self._content_cache is not None else None
+        if cached is not None and cached.fresh:
+            return FetchResult(cached.content, "cache")
+
+        # il tempo totale del fetch decorre da quando l'host concede lo slot, non dall'ingresso in coda
+        with self._host_scheduler.slot(url, deadline):
+            self._raise_if_abandoned(cancel)
+            return self._fetch_remote(url, cached, time.monotonic() + self._configuration.fetch_total_timeout,
+                                      cancel)
+
+    def _fetch_remote(self, url: str, cached: Optional[CachedContent], deadline: float,
+                      cancel: Optional[threading.Event] = None) -> FetchResult:
+        response = None
+        try:
+            # con una voce scaduta in cache la GET diventa una richiesta condizionale
+            response = self._http_get(url, deadline, headers=cached.validators() if cached is not None else None)
+        except (FetchTimeout, requests.Timeout):
+            # host lento o irraggiungibile: il browser non farebbe meglio
+            raise
+        except Exception as e:
+            logger.debug(f"Static fetch failed for {url}: {e}")
+
+        if cached is not None and response is not None and response.status_code == 304:
+            self._content_cache.mark_revalidated(url)
+            return FetchResult(cached.content, "cache")
+
+        fetched = self._fetch_from_response(url, response, deadline, cancel)
+        # solo contenuti che supererebbero il filtro di qualità: un'estrazione vuota o un segnaposto
+        # non deve impedire per un intero TTL un nuovo fetch della pagina
+        if self._content_cache is not None and self._is_usable_content(fetched.content):
+            response_headers = response.headers if response is not None else {}
+            self._content_cache.put(url, fetched.content, fetched.tier,
+                                    etag=response_headers.get("ETag"),
+                                    last_modified=response_headers.get("Last-Modified"))
+        return fetched
+
+    def _log_fetch_failure(self, url: str, error: Exception, elapsed: float) -> None:
+        stage = self._timeout_stage(error)
+        if stage is not None:
+            logger.warning(f"Warning: {stage} timeout after {elapsed:.1f}s fetching {url}")
         else:
-            df_scaled['final_score'] = (
-                    0.5 * df_scaled['position_score'] +  # La posizione originale diventa più importante
-                    0.2 * df_scaled['desc_length_score'] +  # La lunghezza della descrizione resta importante
-                    0.3 * df_scaled['url_frequency_norm']  # Premiamo di più i risultati che appaiono in più query
-            )
-
-        unique_urls = []
-        final_indices = []
-
-        for idx in df_scaled.sort_values('final_score', ascending=False).index:
-            url = df_scaled.loc[idx, 'url']
-            # Se l'URL non è già stato selezionato, lo aggiungiamo
-            if url not in unique_urls:
-                unique_urls.append(url)
-                final_indices.append(idx)
-                # Ci fermiamo quando raggiungiamo il numero desiderato di risultati
-                if len(unique_urls) >= top_n:
+            logger.warning(f"Warning: Failed to fetch full page content for {url}: {str(error)}")
+
+    # region ASYNC FETCH ************
+    def _async_resources(self) -> "_AsyncFetchResources":
+        # client HTTP, browser e semafori sono legati all'event loop in cui vengono creati
+        loop = asyncio.get_running_loop()
+        if self._async_fetch is None or self._async_fetch.loop is not loop:
+            self._async_fetch = _AsyncFetchResources(loop, self._configuration, self._sessions)
+        return self._async_fetch
+
+    async def aclose(self) -> None:
+        if self._search_engine is not None:
+            await self._search_engine.aclose()
+        if self._async_fetch is not None:
+            await self._async_fetch.aclose()
+            self._async_fetch = None
+        await asyncio.to_thread(self.close)
+
+    async def _aload_html(self, page: AsyncPage, url: str) -> str:
+        # la scadenza complessiva è gestita da asyncio.wait_for in _afetch_content
+        return await aload_html(page, url, self._configuration.fetch_total_timeout,
+                                lean=self._configuration.browser_lean_profile)
+
+    async def _ahttp_get(self, url: str, headers: Optional[dict] = None) -> HttpResponse:
+        async with self._async_resources().http_client.stream("GET", url, headers=headers) as response:
+            self._note_retry_after(url, response.status_code, response.headers)
+            is_pdf = self._is_pdf(url, response.headers.get("Content-Type", ""))
+            max_bytes = self._pdf_max_bytes if is_pdf else STATIC_MAX_BYTES
+            chunks = []
+            size = 0
+            truncated = False
+            async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    truncated = True
                     break
+            return HttpResponse(status_code=response.status_code, headers=response.headers,
+                                content=b"".join(chunks)[:max_bytes], truncated=truncated)
+
+    async def _afetch_pdf(self, url: str) -> str:
+        async def download(page: AsyncPage) -> str:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+                temp_file_path = tmp_file.name
+            try:
+                async with page.expect_download() as download_info:
+                    await page.goto(url)
+                download = await download_info.value
+                await download.save_as(temp_file_path)
+                return temp_file_path
+            except BaseException:
+                # anche con asyncio.CancelledError (timeout di asyncio.wait_for o nodo annullato)
+                os.remove(temp_file_path)
+                raise
+
+        return await self._async_resources().browser_pool.run(download)
+
+    async def _afetch_pdf_content(self, url: str, response: Optional[HttpResponse]) -> FetchResult:
+        page_range = self._pdf_page_range(url)
+        if response is not None and response.ok and response.content.startswith(b"%PDF"):
+            return FetchResult(await self._pdf_pool.aextract(response.content, self._char_budget, page_range),
+                               "pdf_http")
 
-        assert final_indices
-        final_result_df = df.loc[final_indices].copy()
-        final_result_df['score'] = df_scaled.loc[final_indices, 'final_score']
-        final_result_df['frequency'] = df.loc[final_indices, 'url_frequency']
+        # cloudscraper è solo sincrono: lo eseguiamo in un thread
+        def scrape() -> Optional[bytes]:
+            scraper = self._sessions.scraper()
+            timeout = (self._configuration.fetch_connect_timeout, self._configuration.fetch_first_byte_timeout)
+            deadline = time.monotonic() + self._configuration.fetch_total_timeout
+            with scraper.get(url, verify=False, stream=True, timeout=timeout) as scraper_response:
+                return self._read_capped(scraper_response, self._pdf_max_bytes, deadline).content
 
-        search_results: List[SearchEngResult] = []
-        for idx, row in final_result_df.iterrows():
-            # Crea un dizionario con tutti i valori
-            result_dict = {}
+        pdf_bytes = None
+        try:
+            content = await asyncio.to_thread(scrape)
+            if content.startswith(b"%PDF"):
+                pdf_bytes = content
+        except Exception as e:
+            logger.debug(f"PDF download with cloudscraper failed for {url}: {e}")
+        if pdf_bytes is not None:
+            return FetchResult(await self._pdf_pool.aextract(pdf_bytes, self._char_budget, page_range),
+                               "pdf_http")
+
+        pdf_path = await self._afetch_pdf(url)
+        try:
+            return FetchResult(await self._pdf_pool.aextract(pdf_path, self._char_budget, page_range),
+                               "pdf_browser")
+        finally:
+            os.remove(pdf_path)
+
+    async def _afetch_from_response(self, url: str, response: Optional[HttpResponse]) -> FetchResult:
+        content_type = response.headers.get("Content-Type", "") if response is not None else ""
+        if self._is_pdf(url, content_type):
+            return await self._afetch_pdf_content(url, response)
+
+        if response is not None and response.status_code in GONE_STATUS_CODES:
+            raise FetchFailed("http_4xx", f"HTTP {response.status_code}")
+        if response is not None and response.ok and (not content_type or "html" in content_type):
+            text = await self._html_pool.aextract(response.content)
+            if not self._needs_browser(response.content, text):
+                return FetchResult(text, "http")
+
+        try:
+            html = await self._async_resources().browser_pool.run(lambda page: self._aload_html(page, url))
+        except Exception as e:
+            static_failure = self._static_failure_kind(response)
+            if static_failure is not None and self._timeout_stage(e) is None:
+                raise FetchFailed(static_failure, str(e)) from e
+            raise
+        text = await self._html_pool.aextract(html)
+        if self._is_challenge(html) and len(text.split()) < MIN_STATIC_WORDS:
+            raise FetchFailed("challenge", "challenge page served to the browser")
+        return FetchResult(text, "browser")
+
+    async def _afetch_raw_content(self, url: str) -> FetchResult:
+        start_time = time.perf_counter()
+        try:
+            fetched = await self._afetch_content(url)
+        except Exception as e:
+            self._log_fetch_failure(url, e, time.perf_counter() - start_time)
+            fetched = FetchResult(None, None, self._failure_kind(e))
+        await asyncio.to_thread(self._record_fetch_outcome, url, fetched)
+        logger.debug(f"Fetched {url} in {time.perf_counter() - start_time:.2f}s")
+        return fetched
+
+    async def _afetch_content(self, url: str) -> FetchResult:
+        cached = None
+        if self._content_cache is not None:
+            cached = await asyncio.to_thread(self._content_cache.get, url)
+        if cached is not None and cached.fresh:
+            return FetchResult(cached.content, "cache")
+
+        # prima lo slot dell'host, poi quello globale: chi attende un host non occupa la concorrenza globale
+        async with self._host_scheduler.aslot(url), self._async_resources().global_limit:
+            # asyncio.wait_for e non asyncio.timeout, che richiede Python 3.11
+            return await asyncio.wait_for(self._afetch_remote(url, cached),
+                                          timeout=self._configuration.fetch_total_timeout)
+
+    async def _afetch_remote(self, url: str, cached: Optional[CachedContent]) -> FetchResult:
+        response = None
+        try:
+            response = await self._ahttp_get(url, headers=cached.validators() if cached is not None else None)
+        except httpx.TimeoutException:
+            # host lento o irraggiungibile: il browser non farebbe meglio
+            raise
+        except Exception as e:
+            logger.debug(f"Static fetch failed for {url}: {e}")
 
-            # Itera su tutte le chiavi del DataFrame
-            for key in SearchEngResult.__annotations__.keys():
-                # Assegna il valore dalla riga corrente
-                result_dict[key] = row[key]
-            result_dict['score'] = row['score']
+        if cached is not None and response is not None and response.status_code == 304:
+            await asyncio.to_thread(self._content_cache.mark_revalidated, url)
+            return FetchResult(cached.content, "cache")
 
-            # Crea l'oggetto SearchEngResult dal dizionario
-            result = SearchEngResult(**result_dict)
-            search_results.append(result)
+        fetched = await self._afetch_from_response(url, response)
+        if self._content_cache is not None and self._is_usable_content(fetched.content):
+            response_headers = response.headers if response is not None else {}
+            await asyncio.to_thread(self._content_cache.put, url, fetched.content, fetched.tier,
+                                    etag=response_headers.get("ETag"),
+                                    last_modified=response_headers.get("Last-Modified"))
+        return fetched
 
-        search_results.sort(key=lambda x: x['score'], reverse=True)
+    # endregion ASYNC FETCH ************
 
-        return search_results
+    def _rank_search_results(self, results: List[SearchEngResult], top_n: int, include_raw_content: bool,
+                             research_query: Optional[str] = None) -> List[SearchEngResult]:
+        return rank_search_results(results, top_n, include_raw_content, research_query=research_query,
+                                   relevance_weight=self._configuration.relevance_weight,
+                                   research_query_share=self._configuration.relevance_research_query_share)
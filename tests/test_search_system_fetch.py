@@ -0,0 +1,674 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fitz
+import pytest
+
+from browser_pool import is_blocked_request
+from configuration import Configuration
+from fetch_scheduler import FetchTimeout, HostScheduler
+from html_extraction import HtmlExtractionPool, LxmlExtractor
+from http_sessions import SessionRegistry
+from negative_cache import NegativeCache
+from search_engines.rate_limiter import TokenBucket
+from search_engines.search_engine_base import SEARCH_EXECUTOR_WORKERS, BaseSearchEngine, SearchEngResult
+from search_engines.search_engine_cache import CachedSearchEngine, SearchResultCache
+from search_engines.search_engine_multi import MultiSearchEngine
+from search_system import SearchSystem
+from utils import dedup_url
+
+
+def _article_html(title: str, paragraph: str) -> bytes:
+    return (f"<html><head><meta charset='utf-8'><title>{title}</title></head><body>"
+            f"<nav>Home | Notizie | Contatti</nav><article><h1>{title} 2024</h1>"
+            + "".join(f"<p>{paragraph.format(i=i)}</p>" for i in range(8))
+            + "</article><footer>Copyright</footer></body></html>").encode("utf-8")
+
+
+ARTICLE_HTML = _article_html("Bando ISI", "Il bando ISI finanzia progetti per la sicurezza sul lavoro, paragrafo {i}, "
+                                          "con contributi a fondo perduto per le imprese che investono in prevenzione.")
+# la stessa notizia ripresa da un altro sito: altra impaginazione e una riga sulla fonte
+SYNDICATED_ARTICLE_HTML = ARTICLE_HTML.replace(b"Home | Notizie | Contatti", b"Prima pagina | Economia").replace(
+    b"</article>", b"<p>Fonte: agenzia di stampa, riproduzione autorizzata.</p></article>")
+ARTICLE_2_HTML = _article_html("Formazione", "La formazione obbligatoria dei lavoratori sul rischio chimico, modulo {i}, "
+                                             "prevede ore di aula e verifiche finali presso enti accreditati.")
+ARTICLE_3_HTML = _article_html("Infortuni", "Le denunce di infortunio in itinere, caso {i}, vanno presentate entro "
+                                            "due giorni dal certificato medico tramite il portale telematico.")
+
+ARTICLE_ETAG = '"v1"'
+
+
+def _make_pdf(num_pages: int) -> bytes:
+    doc = fitz.open()
+    for n in range(1, num_pages + 1):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(72, 72, 540, 770),
+                            f"Pagina {n}. " + "Allegato tecnico sulla valutazione dei rischi nei luoghi di lavoro. " * 12,
+                            fontsize=10)
+    return doc.tobytes()
+
+
+def _make_blank_pdf() -> bytes:
+    # una pagina senza testo: l'estrazione restituisce solo il segnaposto "[Nessun testo ...]"
+    doc = fitz.open()
+    doc.new_page()
+    return doc.tobytes()
+
+
+PDF_BYTES = _make_pdf(3)
+LONG_PDF_BYTES = _make_pdf(30)
+BLANK_PDF_BYTES = _make_blank_pdf()
+
+CHALLENGE_HTML = (b"<html><head><title>Just a moment...</title></head><body>"
+                  b"<div id='cf-browser-verification'>Checking your browser before accessing.</div></body></html>")
+
+NOSCRIPT_HTML = (b"<html><body><noscript>Please enable JavaScript to view this site.</noscript>"
+                 b"<div id='root'></div></body></html>")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    pages = {"/articolo": ARTICLE_HTML, "/lenta": ARTICLE_HTML, "/articolo-2": ARTICLE_2_HTML,
+             "/articolo-3": ARTICLE_3_HTML, "/articolo-ripreso": SYNDICATED_ARTICLE_HTML,
+             "/allegato.pdf": PDF_BYTES, "/manuale.pdf": LONG_PDF_BYTES, "/vuoto.pdf": BLANK_PDF_BYTES}
+    hits = Counter()
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        if self.path == "/lenta":
+            # pagina che non risponde in tempo utile
+            time.sleep(5)
+        body = self.pages.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ARTICLE_ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type",
+                         "application/pdf" if self.path.endswith(".pdf") else "text/html; charset=utf-8")
+        self.send_header("ETag", ARTICLE_ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # client che ha già rinunciato per timeout
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache_dir(tmp_path, monkeypatch):
+    # le cache persistite di default (es. la cache negativa) finiscono in .cache/ relativa alla directory corrente:
+    # i test non devono condividerle tra loro né con esecuzioni precedenti
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+class _FakeSearchEngine(BaseSearchEngine):
+    """Motore fittizio: restituisce sempre gli stessi URL, per ogni query."""
+
+    def __init__(self, urls):
+        super().__init__(name="Fake")
+        self._urls = urls
+        self.calls = 0
+
+    def search(self, query, max_results=10, sites=None):
+        self.calls += 1
+        return [SearchEngResult(id=str(uuid.uuid4()), query=query, title=f"Titolo {k}",
+                                snippet=f"Snippet del risultato {k} per {query}", url=url, position=k,
+                                full_content=None, num_source=None, score=None, search_engine=self.name,
+                                fetch_tier=None)
+                for k, url in enumerate(self._urls[:max_results], 1)]
+
+
+def _fake_search_system(urls) -> SearchSystem:
+    search_system = SearchSystem("duckduckgo")
+    search_system._create_search_engine = lambda: _FakeSearchEngine(urls)
+    return search_system
+
+
+def test_search_cache_skips_the_engine(tmp_path):
+    engine = _FakeSearchEngine(["https://www.inail.it/bando", "https://www.inail.it/faq"])
+    path = str(tmp_path / "search_cache.sqlite")
+    cached = CachedSearchEngine(engine, SearchResultCache(ttl_seconds=60, path=path))
+    first = cached.search("Bando ISI  2024", max_results=2, sites=["inail.it"])
+    second = cached.search("bando isi 2024", max_results=2, sites=["inail.it"])
+    assert engine.calls == 1
+    assert [r["url"] for r in first] == [r["url"] for r in second]
+    assert first[0]["id"] != second[0]["id"], "I risultati dalla cache devono avere id nuovi"
+
+    cached.search("bando isi 2024", max_results=3, sites=["inail.it"])
+    assert engine.calls == 2, "max_results diverso: chiave di cache diversa"
+
+    # nuova sessione: l'LRU in memoria è vuoto, il risultato arriva dal file SQLite
+    reloaded = CachedSearchEngine(engine, SearchResultCache(ttl_seconds=60, path=path))
+    reloaded.search("bando isi 2024", max_results=2, sites=["inail.it"])
+    assert engine.calls == 2
+
+
+def test_search_cache_key_includes_engine_variant(tmp_path):
+    class _RawContentEngine(_FakeSearchEngine):
+        include_raw_content = False
+
+        @property
+        def cache_variant(self):
+            return "raw_content" if self.include_raw_content else ""
+
+    engine = _RawContentEngine(["https://www.inail.it/bando"])
+    cache = SearchResultCache(ttl_seconds=60, path=str(tmp_path / "search_cache.sqlite"))
+    CachedSearchEngine(engine, cache).search("bando isi", max_results=1)
+    # stesso motore e stessa query, ma con il raw content: i risultati senza contenuto non vanno riusati
+    engine.include_raw_content = True
+    CachedSearchEngine(engine, cache).search("bando isi", max_results=1)
+    CachedSearchEngine(engine, cache).search("bando isi", max_results=1)
+    assert engine.calls == 2
+
+
+def test_search_cache_caps_engine_content():
+    results = _FakeSearchEngine(["https://www.inail.it/bando"]).search("bando")
+    results[0]["full_content"] = "testo " * 10000
+    cache = SearchResultCache(ttl_seconds=60, max_content_chars=100)
+    cache.put("chiave", results)
+    assert len(results[0]["full_content"]) == 60000, "La cache non deve modificare i risultati del chiamante"
+    cached = cache.get("chiave")
+    assert len(cached[0]["full_content"]) == 100
+    cached[0]["full_content"] = ""
+    assert len(cache.get("chiave")[0]["full_content"]) == 100
+
+
+def test_static_fetch_uses_http_tier(base_url):
+    with SearchSystem("duckduckgo") as search_system:
+        fetched = search_system._fetch_raw_content(f"{base_url}/articolo")
+        # l'estrazione è avvenuta nel pool di processi, che ne misura il costo
+        assert search_system._html_pool.stats["pages"] == 1
+
+    assert fetched.tier == "http", "La pagina statica non è stata servita dal fast path HTTP"
+    assert "Bando ISI 2024" in fetched.content
+    assert len(fetched.content.split()) > 30, "full_content vuoto o troppo corto"
+
+
+def test_pdf_extracted_in_process_pool(base_url):
+    with SearchSystem("duckduckgo") as search_system:
+        fetched = search_system._fetch_raw_content(f"{base_url}/allegato.pdf")
+
+    assert fetched.tier == "pdf_http"
+    assert "Pagina 1" in fetched.content and "Pagina 3" in fetched.content
+
+
+def test_pdf_extraction_stops_at_char_budget(base_url):
+    # budget di 50 token: basta la prima pagina (o la pagina indicata nel frammento #page=N)
+    with SearchSystem("duckduckgo", Configuration(max_tokens_per_source=50)) as search_system:
+        fetched = search_system._fetch_raw_content(f"{base_url}/manuale.pdf")
+        from_page = search_system._fetch_raw_content(f"{base_url}/manuale.pdf#page=3")
+
+    assert "Pagina 1." in fetched.content and "Pagina 2." not in fetched.content
+    assert "Pagina 3." in from_page.content and "Pagina 1." not in from_page.content
+
+
+def test_needs_browser_detects_js_only_pages():
+    text = SearchSystem._html_to_markdown(ARTICLE_HTML)
+    assert not SearchSystem._needs_browser(ARTICLE_HTML, text)
+
+    for html in (CHALLENGE_HTML, NOSCRIPT_HTML):
+        assert SearchSystem._needs_browser(html, SearchSystem._html_to_markdown(html))
+    assert SearchSystem._needs_browser(b"<html><body></body></html>", "")
+
+
+def test_lean_profile_blocks_heavy_resources():
+    assert is_blocked_request("image", "https://www.ilsole24ore.com/foto.jpg")
+    assert is_blocked_request("font", "https://fonts.gstatic.com/font.woff2")
+    assert is_blocked_request("script", "https://www.googletagmanager.com/gtm.js")
+    assert not is_blocked_request("script", "https://www.inail.it/app.js")
+    assert not is_blocked_request("document", "https://www.inail.it/bando-isi")
+
+
+def test_html_extraction_pool_truncates_large_pages():
+    pool = HtmlExtractionPool(max_workers=1, max_bytes=len(ARTICLE_HTML) // 2)
+    try:
+        text = pool.extract(ARTICLE_HTML)
+    finally:
+        pool.close()
+    assert "paragrafo 0" in text and "paragrafo 7" not in text
+    assert pool.stats["truncated"] == 1 and pool.stats["pages"] == 1
+
+
+def test_lxml_extractor_skips_boilerplate_and_stops_at_budget():
+    text = LxmlExtractor().extract(ARTICLE_HTML)
+    assert text.startswith("# Bando ISI 2024") and "paragrafo 7" in text
+    assert "Notizie" not in text and "Copyright" not in text
+
+    short = LxmlExtractor().extract(ARTICLE_HTML, max_chars=300)
+    assert "paragrafo 1" in short and "paragrafo 3" not in short
+
+    with SearchSystem("duckduckgo", Configuration(content_extractor="lxml")) as search_system:
+        assert "paragrafo 0" in search_system._html_pool.extract(ARTICLE_HTML)
+
+
+def test_urls_shared_by_queries_are_fetched_once(base_url):
+    urls = [f"{base_url}/articolo", f"{base_url}/articolo-2", f"{base_url}/articolo-3"]
+    _Handler.hits.clear()
+    with _fake_search_system(urls) as search_system:
+        results = search_system.execute_search(["query uno", "query due", "query tre"],
+                                               max_filtered_results=3,
+                                               max_results_per_query=3,
+                                               include_raw_content=True)
+
+    assert len(results) == 3, "Numero di risultati non corretto"
+    assert {r["url"] for r in results} == set(urls)
+    for path in ("/articolo", "/articolo-2", "/articolo-3"):
+        assert _Handler.hits[path] == 1, f"{path} scaricato {_Handler.hits[path]} volte"
+
+
+def test_near_duplicate_sources_are_collapsed_across_loops(base_url):
+    urls = [f"{base_url}/articolo", f"{base_url}/articolo-ripreso", f"{base_url}/articolo-2", f"{base_url}/articolo-3"]
+    with _fake_search_system(urls) as search_system:
+        results = search_system.execute_search(["query uno"], max_filtered_results=3, max_results_per_query=4,
+                                               include_raw_content=True)
+        # la copia ripresa da un altro sito lascia il posto alla fonte successiva
+        assert [r["url"] for r in results] == [urls[0], urls[2], urls[3]]
+
+        # ciclo successivo: la copia resta l'unico candidato nuovo, ma è un duplicato di una fonte già usata
+        results = search_system.execute_search(["query due"], max_filtered_results=3, max_results_per_query=4,
+                                               include_raw_content=True, seen_urls={dedup_url(urls[0])})
+        assert {r["url"] for r in results} == {urls[2], urls[3]}
+
+
+def test_url_variants_are_fetched_and_returned_once(base_url):
+    urls = [f"{base_url}/articolo", f"{base_url}/articolo#sezione", f"{base_url}/articolo-2", f"{base_url}/articolo-3"]
+    _Handler.hits.clear()
+    with _fake_search_system(urls) as search_system:
+        results = search_system.execute_search(["query uno"], max_filtered_results=4, max_results_per_query=4,
+                                               include_raw_content=True)
+
+    assert sorted(r["url"] for r in results) == sorted([urls[0], urls[2], urls[3]])
+    assert _Handler.hits["/articolo"] == 1
+
+
+def test_identical_content_under_url_variants_is_collapsed():
+    content = ARTICLE_HTML.decode("utf-8")
+    results = [SearchEngResult(id=str(uuid.uuid4()), query="bando", title="Bando ISI", snippet="Bando ISI", url=url,
+                               position=k, full_content=content, num_source=None, score=None,
+                               search_engine="duckduckgo", fetch_tier=None)
+               for k, url in enumerate(["https://inail.it/bando", "https://inail.it/bando?utm_source=x"], 1)]
+    with SearchSystem("duckduckgo") as search_system:
+        selected = search_system._collapse_near_duplicates(results, 2, include_raw_content=True)
+    assert [r["url"] for r in selected] == ["https://inail.it/bando"]
+
+
+def test_fetch_stops_when_enough_results(base_url):
+    urls = [f"{base_url}/articolo", f"{base_url}/articolo-2", f"{base_url}/articolo-3"]
+    _Handler.hits.clear()
+    with _fake_search_system(urls) as search_system:
+        results = search_system.execute_search(["query uno"],
+                                               max_filtered_results=1,
+                                               max_results_per_query=3,
+                                               include_raw_content=True)
+
+    assert len(results) == 1, "Numero di risultati non corretto"
+    # con il fattore di over-provisioning di default (1.5) servono al massimo 2 fetch
+    assert sum(_Handler.hits[path] for path in ("/articolo", "/articolo-2", "/articolo-3")) <= 2, \
+        f"Troppi fetch: {dict(_Handler.hits)}"
+    assert results[0]["url"] == urls[0]
+
+
+def test_async_search_fetches_shared_urls_once(base_url):
+    urls = [f"{base_url}/articolo", f"{base_url}/articolo-2", f"{base_url}/articolo-3"]
+    _Handler.hits.clear()
+
+    async def run():
+        search_system = _fake_search_system(urls)
+        try:
+            return await search_system.aexecute_search(["query uno", "query due", "query tre"],
+                                                       max_filtered_results=2,
+                                                       max_results_per_query=3,
+                                                       include_raw_content=True)
+        finally:
+            await search_system.aclose()
+
+    results = asyncio.run(run())
+
+    assert len(results) == 2, "Numero di risultati non corretto"
+    for i in range(len(results) - 1):
+        assert results[i]['score'] >= results[i + 1]['score']
+    for result in results:
+        assert result["fetch_tier"] == "http" and len(result["full_content"].split()) > 30
+    assert all(hits == 1 for hits in _Handler.hits.values()), f"URL scaricati più volte: {dict(_Handler.hits)}"
+
+
+def test_content_cache_hit_and_revalidation(base_url, tmp_path):
+    url = f"{base_url}/articolo"
+    cache_path = str(tmp_path / "content_cache.sqlite")
+    _Handler.hits.clear()
+
+    configuration = Configuration(content_cache_enabled=True, content_cache_path=cache_path)
+    with SearchSystem("duckduckgo", configuration) as search_system:
+        assert search_system._fetch_raw_content(url).tier == "http"
+        cached = search_system._fetch_raw_content(url)
+        assert cached.tier == "cache" and "Bando ISI 2024" in cached.content
+        assert _Handler.hits["/articolo"] == 1, "La voce fresca in cache non deve generare richieste"
+
+    # TTL nullo: la voce è scaduta e viene rivalidata con If-None-Match (risposta 304)
+    configuration = Configuration(content_cache_enabled=True, content_cache_path=cache_path,
+                                  content_cache_ttl_hours=0)
+    with SearchSystem("duckduckgo", configuration) as search_system:
+        revalidated = search_system._fetch_raw_content(url)
+        assert revalidated.tier == "cache" and "Bando ISI 2024" in revalidated.content
+        assert search_system._content_cache.stats["revalidated"] == 1
+    assert _Handler.hits["/articolo"] == 2
+
+
+def test_content_cache_skips_unusable_content(base_url, tmp_path):
+    configuration = Configuration(content_cache_enabled=True, content_cache_path=str(tmp_path / "cache.sqlite"))
+    _Handler.hits.clear()
+    with SearchSystem("duckduckgo", configuration) as search_system:
+        for _ in range(2):
+            assert search_system._fetch_raw_content(f"{base_url}/vuoto.pdf").tier != "cache"
+    assert _Handler.hits["/vuoto.pdf"] == 2
+
+
+def test_content_cache_key_includes_page_range_and_budget(base_url, tmp_path):
+    cache_path = str(tmp_path / "content_cache.sqlite")
+    configuration = Configuration(content_cache_enabled=True, content_cache_path=cache_path)
+    with SearchSystem("duckduckgo", configuration) as search_system:
+        assert search_system._fetch_raw_content(f"{base_url}/manuale.pdf").tier != "cache"
+        ranged = search_system._fetch_raw_content(f"{base_url}/manuale.pdf#page=3")
+        assert ranged.tier != "cache" and "Pagina 3" in ranged.content and "Pagina 1." not in ranged.content
+        assert search_system._fetch_raw_content(f"{base_url}/manuale.pdf#page=3").tier == "cache"
+
+    # con un altro budget di caratteri il testo troncato in cache non si riusa
+    configuration = Configuration(content_cache_enabled=True, content_cache_path=cache_path,
+                                  max_tokens_per_source=50)
+    with SearchSystem("duckduckgo", configuration) as search_system:
+        assert search_system._fetch_raw_content(f"{base_url}/manuale.pdf").tier != "cache"
+
+
+def test_first_byte_timeout_and_search_deadline(base_url, caplog):
+    # cache negativa in memoria: il timeout della pagina lenta non deve escluderla dal passo di ricerca che segue
+    configuration = Configuration(fetch_first_byte_timeout=1, negative_cache_path=None)
+    with SearchSystem("duckduckgo", configuration) as search_system:
+        start = time.monotonic()
+        fetched = search_system._fetch_raw_content(f"{base_url}/lenta")
+        assert fetched.content is None and time.monotonic() - start < 2.5
+
+    # la scadenza del passo restituisce i risultati già scaricati senza attendere la pagina lenta
+    urls = [f"{base_url}/articolo", f"{base_url}/lenta"]
+    with _fake_search_system(urls) as search_system:
+        search_system._configuration = Configuration(search_deadline=2)
+        # avvio a freddo del pool di estrazione (spawn) fuori dalla misura: execute_search lo attende prima
+        # di far partire la scadenza, ma qui si misura solo il passo di ricerca
+        search_system._wait_for_extraction_pools()
+        fetch_raw_content = search_system._fetch_raw_content
+        finished = {}
+        search_system._fetch_raw_content = lambda url, *args: finished.setdefault(url, fetch_raw_content(url, *args))
+        start = time.monotonic()
+        results = search_system.execute_search(["query uno"], max_filtered_results=2,
+                                               max_results_per_query=2, include_raw_content=True)
+        # la pagina lenta risponde dopo 5 secondi
+        assert time.monotonic() - start < 4
+        # il fetch abbandonato della pagina lenta si ferma al primo controllo dopo la risposta, senza attendere
+        # close() (il SearchSystem resta in uso per i passi successivi), senza errori né voci nella cache negativa
+        while urls[1] not in finished and time.monotonic() - start < 15:
+            time.sleep(0.1)
+        assert finished[urls[1]].error == "abandoned"
+        assert search_system._negative_cache.blocked_reason(urls[1]) is None
+
+    fetched_urls = [r["url"] for r in results if r["full_content"]]
+    assert fetched_urls == [urls[0]]
+    assert not [record for record in caplog.records if "Failed to fetch" in record.getMessage()]
+
+
+def test_failed_urls_are_skipped_by_negative_cache(base_url):
+    urls = [f"{base_url}/mancante", f"{base_url}/articolo"]
+    _Handler.hits.clear()
+    with SearchSystem("duckduckgo") as search_system:
+        fetched = search_system._fetch_raw_content(urls[0])
+        assert fetched.content is None and fetched.error == "http_4xx"
+        # l'URL fallito non viene più messo in coda di fetch
+        assert search_system._fetch_order([{"url": url} for url in urls]) == [urls[1]]
+    assert _Handler.hits["/mancante"] == 1, "Una pagina 404 non deve passare dal browser"
+
+    # con la configurazione di default la cache negativa vale anche per la sessione successiva
+    with SearchSystem("duckduckgo") as search_system:
+        assert search_system._fetch_order([{"url": url} for url in urls]) == [urls[1]]
+
+
+def test_host_circuit_breaker(tmp_path):
+    path = str(tmp_path / "negative_cache.sqlite")
+    cache = NegativeCache(path, host_failure_threshold=2, host_cooldown_seconds=60)
+    cache.record_failure("https://lento.example/a", "timeout")
+    assert cache.blocked_reason("https://lento.example/b") is None
+    assert cache.host_failures("https://lento.example/b") == 1
+    cache.record_failure("https://lento.example/c", "http_5xx")
+    assert cache.blocked_reason("https://lento.example/b") == "host_circuit_open"
+    assert cache.blocked_reason("https://altro.example/a") is None
+
+    # lo stato viene riletto da una nuova sessione
+    reloaded = NegativeCache(path, host_failure_threshold=2, host_cooldown_seconds=60)
+    assert reloaded.blocked_reason("https://lento.example/a") == "url:timeout"
+    assert reloaded.blocked_reason("https://lento.example/b") == "host_circuit_open"
+
+    # un successo chiude il circuito
+    reloaded.record_success("https://lento.example/b")
+    assert reloaded.blocked_reason("https://lento.example/b") is None
+
+
+def test_session_registry_shares_sessions():
+    with SessionRegistry(pool_maxsize=4, host_pool_sizes={"www.inail.it": 2}) as sessions:
+        fetch = sessions.session("fetch", verify=False)
+        assert sessions.session("fetch") is fetch
+        assert sessions.session("tavily") is not fetch and sessions.session("tavily").verify
+        assert fetch.get_adapter("https://www.inail.it/bando")._pool_maxsize == 2
+        assert fetch.get_adapter("https://example.com/")._pool_maxsize == 4
+
+
+def test_host_scheduler_limits_and_interleaves():
+    scheduler = HostScheduler(max_per_host=1, min_interval=0.2, crawl_delay_provider=lambda url: None)
+    starts = []
+
+    def fetch(url):
+        with scheduler.slot(url):
+            starts.append((HostScheduler.host(url), time.monotonic()))
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=fetch, args=(url,))
+               for url in ("https://a.it/1", "https://a.it/2", "https://a.it/3", "https://b.it/1")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    a_starts = sorted(t for host, t in starts if host == "a.it")
+    assert all(later - earlier >= 0.19 for earlier, later in zip(a_starts, a_starts[1:]))
+    # l'host b.it non attende la coda di a.it
+    assert next(t for host, t in starts if host == "b.it") - a_starts[0] < 0.15
+    assert scheduler.stats["a.it"]["fetches"] == 3 and scheduler.stats["a.it"]["max_queued"] >= 2
+
+    # Retry-After rinvia il fetch successivo verso l'host, anche nel percorso asincrono
+    scheduler.defer("https://b.it/2", 0.3)
+
+    async def afetch():
+        start = time.monotonic()
+        async with scheduler.aslot("https://b.it/2"):
+            return time.monotonic() - start
+
+    assert asyncio.run(afetch()) >= 0.25
+
+    # uno slot che non può essere concesso entro la scadenza del fetch non viene atteso
+    scheduler.defer("https://c.it/1", 5)
+    start = time.monotonic()
+    with pytest.raises(FetchTimeout):
+        with scheduler.slot("https://c.it/1", deadline=time.monotonic() + 0.5):
+            pass
+    assert time.monotonic() - start < 0.1
+
+
+def test_queries_are_searched_concurrently_in_query_order():
+    threads = set()
+
+    class SlowEngine(_FakeSearchEngine):
+        def search(self, query, max_results=10, sites=None):
+            threads.add(threading.current_thread())
+            # la prima query è la più lenta: arriva per ultima
+            time.sleep(0.5 if query == "q0" else 0.2)
+            return super().search(query, max_results, sites)
+
+    search_system = SearchSystem("duckduckgo")
+    search_system._create_search_engine = lambda: SlowEngine([f"https://a.it/{k}" for k in range(3)])
+    try:
+        start = time.monotonic()
+        results = search_system._search_queries(search_system._create_search_engine(), ["q0", "q1", "q2"], 3,
+                                                None, set(), False, time.monotonic() + 10)
+        assert time.monotonic() - start < 0.9
+        assert [r["query"] for r in results] == ["q0"] * 3 + ["q1"] * 3 + ["q2"] * 3
+
+        # thread del pool condiviso dei motori, non di un executor del passo: i client per thread restano
+        assert all(thread.name.startswith("search") for thread in threads)
+    finally:
+        search_system.close()
+
+
+def test_engine_provided_content_skips_the_fetch(base_url):
+    class RawContentEngine(_FakeSearchEngine):
+        def search(self, query, max_results=10, sites=None):
+            results = super().search(query, max_results, sites)
+            results[0]["full_content"] = "Contenuto completo fornito dal motore di ricerca. " * 20
+            return results
+
+    urls = [f"{base_url}/articolo", f"{base_url}/articolo?altra=1"]
+    with SearchSystem("duckduckgo") as search_system:
+        search_system._create_search_engine = lambda: RawContentEngine(urls)
+        _Handler.hits.clear()
+        results = search_system.execute_search(["query uno"], max_filtered_results=1,
+                                               max_results_per_query=2, include_raw_content=True)
+        assert [(r["url"], r["fetch_tier"]) for r in results] == [(urls[0], "engine")]
+        assert not [path for path in _Handler.hits if path.startswith("/articolo")]
+
+        snippets = search_system.execute_search(["query uno"], max_filtered_results=2,
+                                                max_results_per_query=2, include_raw_content=False)
+        assert all(r["full_content"] == "" for r in snippets)
+
+
+def test_multi_engine_fuses_rankings_and_drops_late_engines():
+    class SlowEngine(_FakeSearchEngine):
+        def search(self, query, max_results=10, sites=None):
+            time.sleep(1)
+            return super().search(query, max_results, sites)
+
+    first = _FakeSearchEngine(["https://a.it/1", "https://a.it/2", "https://a.it/3"])
+    second = _FakeSearchEngine(["https://a.it/3", "https://a.it/2", "https://a.it/4"])
+    second.name = "Second"
+    slow = SlowEngine(["https://a.it/5"])
+    slow.name = "Slow"
+    multi = MultiSearchEngine([first, second, slow], engine_deadline=0.5)
+
+    start = time.monotonic()
+    results = multi.search("bando", max_results=3)
+    assert time.monotonic() - start < 0.9
+    # a.it/3 (3° + 1°) e a.it/2 (2° + 2°), restituiti da entrambi i motori, superano a.it/1 (solo 1°)
+    assert [r["url"] for r in results] == ["https://a.it/3", "https://a.it/2", "https://a.it/1"]
+    assert [r["position"] for r in results] == [1, 2, 3]
+    assert results[0]["search_engine"].startswith("Fake#3 (") and "Second#1 (" in results[0]["search_engine"]
+    assert multi.stats["Slow"]["timeouts"] == 1 and multi.stats["Fake"]["contributed"] == 3
+
+    # stessa fusione con asearch: i motori senza client async passano dall'adattatore a thread
+    start = time.monotonic()
+    aresults = asyncio.run(multi.asearch("bando", max_results=3))
+    assert time.monotonic() - start < 0.9
+    assert [r["url"] for r in aresults] == [r["url"] for r in results]
+    assert multi.stats["Slow"]["timeouts"] == 2
+
+
+def test_multi_engine_runs_engines_on_the_shared_executor():
+    threads = set()
+
+    class SlowEngine(_FakeSearchEngine):
+        def search(self, query, max_results=10, sites=None):
+            threads.add(threading.current_thread())
+            time.sleep(0.2)
+            return super().search(query, max_results, sites)
+
+    first = SlowEngine(["https://a.it/1"])
+    second = SlowEngine(["https://b.it/1"])
+    second.name = "Second"
+    multi = MultiSearchEngine([first, second], engine_deadline=5)
+    # più query dei worker condivisi: le ricerche multi che attendono i motori non devono lasciarli in coda
+    query_list = [f"q{k}" for k in range(SEARCH_EXECUTOR_WORKERS + 2)]
+    with SearchSystem("multi") as search_system:
+        results = search_system._search_queries(multi, query_list, 2, None, set(), False, time.monotonic() + 10)
+    assert len(results) == 2 * len(query_list)
+    assert all(not stats.get("timeouts") for stats in multi.stats.values())
+    # i client per thread dei motori (es. DDGS) restano nel pool condiviso
+    assert all(thread.name.startswith("search") for thread in threads)
+
+
+def test_multi_engine_keeps_raw_content_from_any_engine():
+    class RawContentEngine(_FakeSearchEngine):
+        def search(self, query, max_results=10, sites=None):
+            results = super().search(query, max_results, sites)
+            for r in results:
+                r["full_content"] = f"Testo completo di {r['url']}"
+            return results
+
+    first = _FakeSearchEngine(["https://a.it/1", "https://a.it/2"])
+    second = RawContentEngine(["https://a.it/2"])
+    second.name = "Raw"
+    results = MultiSearchEngine([first, second], engine_deadline=1).search("bando", max_results=2)
+    contents = {r["url"]: r["full_content"] for r in results}
+    assert contents == {"https://a.it/1": None, "https://a.it/2": "Testo completo di https://a.it/2"}
+
+
+def test_seen_urls_exclude_variants_of_the_same_page():
+    page = "https://www.inail.it/bando/"
+    variants = ["http://inail.it/bando", "https://www.inail.it/bando?utm_source=newsletter&utm_medium=email",
+                "https://www-inail-it.cdn.ampproject.org/c/s/www.inail.it/bando/amp/",
+                "https://inail.it/bando?amp=1#sezione"]
+    assert {dedup_url(url) for url in variants} == {dedup_url(page)}
+    assert dedup_url("https://inail.it/bando?id=2&lang=it") == dedup_url("https://inail.it/bando?lang=it&id=2")
+    assert dedup_url("https://inail.it/bando?id=2") != dedup_url("https://inail.it/bando?id=3")
+    assert dedup_url("https://inail.it/amp/convegno") != dedup_url("https://inail.it/convegno")
+
+    urls = variants + ["https://www.inail.it/faq"]
+    with _fake_search_system(urls) as search_system:
+        results = search_system.execute_search(["query uno"], max_filtered_results=5, max_results_per_query=5,
+                                               seen_urls={dedup_url(page)})
+    assert [r["url"] for r in results] == ["https://www.inail.it/faq"]
+
+
+def test_token_bucket_spaces_requests_after_burst(tmp_path):
+    bucket = TokenBucket("test", rate=10, burst=2)
+    waits = [bucket.acquire() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert 0.05 < waits[2] <= 0.1 and 0.05 < waits[3] <= 0.1
+    assert bucket.stats["acquired"] == 4 and bucket.stats["waited"] == 2
+
+    # con il file SQLite due limiter (come due processi) consumano lo stesso saldo
+    path = str(tmp_path / "rate_limits.sqlite")
+    first, second = TokenBucket("shared", rate=1, burst=1, path=path), TokenBucket("shared", rate=1, burst=1, path=path)
+    assert first.acquire() == 0.0
+    start = time.monotonic()
+    assert asyncio.run(second.aacquire()) > 0.8
+    assert time.monotonic() - start > 0.8
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__]))
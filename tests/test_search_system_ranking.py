@@ -0,0 +1,183 @@
+import json
+import os
+import random
+import uuid
+from collections import Counter
+from typing import List
+
+import pytest
+
+from ranking import rank_search_results
+from relevance import stem, tokenize
+from search_engines.search_engine_base import SearchEngResult
+
+
+def legacy_rank_search_results(results: List[SearchEngResult], top_n: int,
+                               include_raw_content: bool) -> List[SearchEngResult]:
+    """Il ranker pandas/scikit-learn sostituito da ranking.rank_search_results, tenuto come riferimento."""
+    import numpy as np
+    import pandas as pd
+    from sklearn.preprocessing import MinMaxScaler
+
+    df = pd.DataFrame(results)
+    df['desc_length'] = df['snippet'].str.len()
+
+    numeric_cols = ['position', 'desc_length']
+    if include_raw_content:
+        df['page_length'] = df['full_content'].str.len()
+        numeric_cols.append('page_length')
+
+    url_counts = Counter(df['url'])
+    df['url_frequency'] = df['url'].map(url_counts)
+
+    df_scaled = df.copy()
+    if not df[numeric_cols].empty:
+        df_scaled[numeric_cols] = MinMaxScaler().fit_transform(df[numeric_cols])
+
+    max_freq = df['url_frequency'].max()
+    df_scaled['url_frequency_norm'] = df['url_frequency'] / max_freq if max_freq > 0 else 0
+    df_scaled['position_score'] = 1 - df_scaled['position']
+    df_scaled['desc_length_score'] = 1 - 2 * np.abs(df_scaled['desc_length'] - 0.5)
+
+    if include_raw_content:
+        df_scaled['page_length_score'] = np.where(
+            df_scaled['page_length'] <= 0.7,
+            df_scaled['page_length'],
+            0.7 - 0.3 * (df_scaled['page_length'] - 0.7) / 0.3
+        )
+        df_scaled['final_score'] = (
+                0.4 * df_scaled['position_score'] +
+                0.2 * df_scaled['page_length_score'] +
+                0.15 * df_scaled['desc_length_score'] +
+                0.25 * df_scaled['url_frequency_norm']
+        )
+    else:
+        df_scaled['final_score'] = (
+                0.5 * df_scaled['position_score'] +
+                0.2 * df_scaled['desc_length_score'] +
+                0.3 * df_scaled['url_frequency_norm']
+        )
+
+    unique_urls = []
+    final_indices = []
+    for idx in df_scaled.sort_values('final_score', ascending=False).index:
+        url = df_scaled.loc[idx, 'url']
+        if url not in unique_urls:
+            unique_urls.append(url)
+            final_indices.append(idx)
+            if len(unique_urls) >= top_n:
+                break
+
+    search_results: List[SearchEngResult] = []
+    for idx in final_indices:
+        row = df.loc[idx]
+        result = SearchEngResult(**{key: row[key] for key in SearchEngResult.__annotations__})
+        result['score'] = df_scaled.loc[idx, 'final_score']
+        search_results.append(result)
+    search_results.sort(key=lambda x: x['score'], reverse=True)
+    return search_results
+
+
+def make_results(num_queries: int, per_query: int, num_urls: int, seed: int) -> List[SearchEngResult]:
+    """Risultati sintetici: più query che condividono in parte gli stessi URL, come in un passo di ricerca."""
+    rng = random.Random(seed)
+    results = []
+    for q in range(num_queries):
+        for position, url_id in enumerate(rng.sample(range(num_urls), per_query), 1):
+            results.append(SearchEngResult(
+                id=str(uuid.uuid4()), url=f"https://sito{url_id % 7}.it/pagina/{url_id}", title=f"Titolo {url_id}",
+                snippet="parola " * rng.randint(5, 60), full_content="testo " * rng.randint(0, 5000),
+                query=f"query {q}", num_source=None, position=position, search_engine="duckduckgo",
+                score=None, fetch_tier=None))
+    return results
+
+
+# punteggi del ranker pandas/scikit-learn registrati, per verificare la parità anche senza quelle dipendenze;
+# si rigenerano con `python -m tests.test_search_system_ranking` (richiede pandas e scikit-learn)
+LEGACY_SCORES_PATH = os.path.join(os.path.dirname(__file__), "data", "legacy_ranker_scores.json")
+PARITY_CASES = [(seed, include_raw_content) for seed in range(5) for include_raw_content in (False, True)]
+
+
+def parity_results(seed: int) -> List[SearchEngResult]:
+    return make_results(num_queries=3, per_query=8, num_urls=16, seed=seed)
+
+
+def legacy_scores(seed: int, include_raw_content: bool) -> dict:
+    """URL e punteggi del ranker di riferimento: tutti gli URL e il top 4."""
+    results = parity_results(seed)
+    top_n = len({r['url'] for r in results})
+    return {"scores": {r['url']: float(r['score'])
+                       for r in legacy_rank_search_results(results, top_n, include_raw_content)},
+            "top_4": [r['url'] for r in legacy_rank_search_results(results, 4, include_raw_content)]}
+
+
+def assert_matches_legacy(seed: int, include_raw_content: bool, expected: dict) -> None:
+    results = parity_results(seed)
+
+    # tutti gli URL: stesso insieme, con lo stesso punteggio al bit per ogni URL
+    ranked = rank_search_results(results, len(expected["scores"]), include_raw_content)
+    assert {r['url']: r['score'] for r in ranked} == expected["scores"]
+    assert [r['score'] for r in ranked] == sorted(expected["scores"].values(), reverse=True)
+
+    # con un taglio gli URL selezionati coincidono, salvo parità di punteggio sul confine
+    ranked = rank_search_results(results, 4, include_raw_content)
+    if len({r['score'] for r in ranked}) == len(ranked):
+        assert [r['url'] for r in ranked] == expected["top_4"]
+
+
+@pytest.mark.parametrize("seed, include_raw_content", PARITY_CASES)
+def test_ranker_matches_recorded_legacy_scores(seed, include_raw_content):
+    with open(LEGACY_SCORES_PATH, encoding="utf-8") as f:
+        recorded = json.load(f)[f"{seed}-{include_raw_content}"]
+    assert_matches_legacy(seed, include_raw_content, recorded)
+
+
+@pytest.mark.parametrize("seed, include_raw_content", PARITY_CASES)
+def test_ranker_matches_legacy_scores(seed, include_raw_content):
+    pytest.importorskip("pandas")
+    pytest.importorskip("sklearn")
+    expected = legacy_scores(seed, include_raw_content)
+    assert_matches_legacy(seed, include_raw_content, expected)
+    # i punteggi registrati sono ancora quelli del ranker di riferimento
+    with open(LEGACY_SCORES_PATH, encoding="utf-8") as f:
+        assert json.load(f)[f"{seed}-{include_raw_content}"] == expected
+
+
+def test_ranker_keeps_the_best_row_per_url():
+    results = make_results(num_queries=3, per_query=8, num_urls=10, seed=1)
+    ranked = rank_search_results(results, 100, include_raw_content=False)
+    assert len(ranked) == len({r['url'] for r in results})
+    assert all(isinstance(r['score'], float) for r in ranked)
+    assert rank_search_results([], 4, include_raw_content=False) == []
+
+
+def test_italian_tokenizer_drops_stopwords_and_stems_inflections():
+    assert tokenize("Il bando dell'INAIL per le imprese") == ["band", "inail", "impres"]
+    assert {stem(word) for word in ("bando", "bandi")} == {"band"}
+    assert stem("rischio") == stem("rischi")
+    assert stem("finanziamento") == stem("finanziato")
+
+
+def test_relevance_promotes_on_topic_results():
+    def result(url, position, snippet, query):
+        return SearchEngResult(id=str(uuid.uuid4()), url=url, title="Pagina", snippet=snippet, full_content="",
+                               query=query, num_source=None, position=position, search_engine="duckduckgo",
+                               score=None, fetch_tier=None)
+
+    filler = "notizie varie di cronaca sport meteo e spettacoli dalla città"
+    results = [result("https://a.it/off", 1, filler, "bando isi"),
+               result("https://a.it/off2", 2, filler + " ancora", "bando isi"),
+               result("https://a.it/on", 3, "Il bando ISI finanzia le imprese per la sicurezza sul lavoro",
+                      "bando isi")]
+    research_query = "Come funziona il bando ISI per la sicurezza delle imprese?"
+
+    assert rank_search_results(results, 1, False, research_query=research_query)[0]["url"] == "https://a.it/off"
+    assert rank_search_results(results, 1, False, research_query=research_query,
+                               relevance_weight=0.5)[0]["url"] == "https://a.it/on"
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(LEGACY_SCORES_PATH), exist_ok=True)
+    with open(LEGACY_SCORES_PATH, "w", encoding="utf-8") as f:
+        json.dump({f"{seed}-{include_raw_content}": legacy_scores(seed, include_raw_content)
+                   for seed, include_raw_content in PARITY_CASES}, f, indent=1)
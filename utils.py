@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import re
 
 
@@ -15,6 +16,61 @@ def strip_thinking_tokens(text: str) -> str:
     return text
 
 
+def canonical_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    # porta di default e frammento non identificano una risorsa diversa
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+# parametri di tracciamento che non cambiano la pagina restituita
+_TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "_ga", "ref_src"}
+# parametri che chiedono la versione AMP della pagina
+_AMP_PARAMS = {("amp", ""), ("amp", "1"), ("amp", "true"), ("outputtype", "amp")}
+_AMP_CACHE_RE = re.compile(r"^/[a-z]/(?:s/)?(.+)$")
+
+
+def dedup_url(url: str) -> str:
+    """Chiave per riconoscere la stessa pagina sotto URL diversi, più aggressiva di canonical_url.
+
+    Ignora lo schema (http/https), il prefisso www., la porta di default, lo slash finale, il frammento,
+    i parametri utm_* e di tracciamento e le varianti AMP (cache cdn.ampproject.org, host amp., segmento
+    finale /amp, suffisso .amp.html, ?amp=1); i parametri rimanenti sono ordinati. Non è un URL da scaricare.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    path = parts.path
+
+    # cache AMP di Google: https://www-esempio-it.cdn.ampproject.org/c/s/www.esempio.it/pagina
+    if host.endswith(".cdn.ampproject.org"):
+        match = _AMP_CACHE_RE.match(path)
+        if match:
+            return dedup_url("https://" + match.group(1) + (f"?{parts.query}" if parts.query else ""))
+
+    for prefix in ("www.", "amp."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    segments = [segment for segment in path.split("/") if segment]
+    # solo il segmento finale: /amp/convegno e /convegno possono essere pagine diverse
+    if segments and segments[-1].lower() == "amp":
+        segments.pop()
+    if segments and segments[-1].lower().endswith(".amp.html"):
+        segments[-1] = segments[-1][:-len(".amp.html")] + ".html"
+    path = "/".join(segments)
+
+    params = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                    if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+                    and (key.lower(), value.lower()) not in _AMP_PARAMS)
+    query = urlencode(params)
+    return f"{host}/{path}" + (f"?{query}" if query else "")
+
+
 def linkify_sources(text: str, sources: List[dict]) -> Tuple[str, List[dict]]:
     referenced_nums = set(int(num) for num in re.findall(r'\[(\d+)\]', text))
     filtered_sources = [s for s in sources if s['num_source'] in referenced_nums]